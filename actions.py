@@ -0,0 +1,155 @@
+import threading
+
+
+class ActionQueue(threading.Thread):
+    '''
+    Runs start/stop/delete actions for a TorrentUI on its own worker thread, so the
+    skin never waits on the daemon.
+
+    The expected state is applied to the torrent's ListItem as soon as an action is
+    queued and rolled back if the daemon rejects the action. Actions queued for a
+    torrent that has not been served yet are coalesced, only the last one is sent.
+
+    Other daemon calls the skin must not wait on, like loading a file list, can be
+    queued with `put_call`. They run on the same thread, before queued actions.
+
+    Arguments:
+        ui: The TorrentUI whose `run_action` method carries out the actions
+    '''
+    # Transfer status shown on the ListItem while an action is in flight.
+    expected_status = {
+        'start': 'Downloading',
+        'stop': 'Paused',
+        'delete': 'Removing'
+    }
+
+    taglines = {
+        'start': 'Starting...',
+        'stop': 'Pausing...',
+        'delete': 'Removing...'
+    }
+
+
+    def __init__(self, ui):
+        super(ActionQueue, self).__init__()
+        self.setDaemon(True)
+        self.ui = ui
+        self.condition = threading.Condition()
+        # Torrent id -> pending action dict, served in the order of `self.order`.
+        self.pending = {}
+        self.order = []
+        self.running = None
+        # (function, args) calls queued with `put_call`.
+        self.calls = []
+
+
+    def put(self, action, id, item=None, **kwargs):
+        '''
+        Queues `action` ('start', 'stop' or 'delete') for the torrent `id`. Extra
+        keyword arguments are passed on to the TorrentUI method. `item` is the
+        torrent's ListItem, if any, and gets the optimistic update.
+        '''
+        if action not in self.expected_status:
+            raise ValueError("Unknown torrent action: %s" % action)
+        self.condition.acquire()
+        try:
+            entry = self.pending.get(id)
+            if entry is None:
+                entry = {'saved': item and self.save_item(item)}
+                self.pending[id] = entry
+                self.order.append(id)
+            elif entry['action'] == 'delete':
+                # Nothing to coalesce into once the torrent is on its way out.
+                return
+            entry['action'] = action
+            entry['kwargs'] = kwargs
+            entry['item'] = item or entry.get('item')
+
+            saved = entry['saved']
+            if saved and action != 'delete' and \
+                    saved['transfer_status'] == self.expected_status[action]:
+                # The torrent is already in the requested state, drop the action.
+                del self.pending[id]
+                self.order.remove(id)
+                self.restore_item(entry['item'], saved)
+            elif entry['item']:
+                entry['item'].SetProperty('transfer_status', self.expected_status[action])
+                entry['item'].SetTagLine(self.taglines[action])
+            self.condition.notify()
+        finally:
+            self.condition.release()
+
+
+    def put_call(self, function, *args):
+        '''
+        Queues `function(*args)` to run on the worker thread. Failures are logged.
+        '''
+        self.condition.acquire()
+        try:
+            self.calls.append((function, args))
+            self.condition.notify()
+        finally:
+            self.condition.release()
+
+
+    def run_call(self, function, args):
+        try:
+            function(*args)
+        except Exception, e:
+            print "Queued call to %s failed: %s" % (function.__name__, e)
+
+
+    def is_pending(self, id):
+        '''
+        Returns True while an action for the torrent `id` has not been confirmed by
+        the daemon. The poll loop leaves those ListItems alone.
+        '''
+        return id in self.pending or id == self.running
+
+
+    def run(self):
+        while True:
+            self.condition.acquire()
+            try:
+                while not self.order and not self.calls:
+                    self.condition.wait()
+                call = self.calls and self.calls.pop(0)
+                if not call:
+                    id = self.order.pop(0)
+                    entry = self.pending.pop(id)
+                    self.running = id
+            finally:
+                self.condition.release()
+            if call:
+                self.run_call(*call)
+                continue
+
+            try:
+                self.ui.run_action(entry['action'], id, **entry['kwargs'])
+                failed = False
+            except Exception, e:
+                print "Torrent %s action on %s failed: %s" % (entry['action'], id, e)
+                failed = True
+
+            self.condition.acquire()
+            try:
+                self.running = None
+                # A newer action for the same torrent owns the ListItem already.
+                if failed and id not in self.pending:
+                    self.restore_item(entry['item'], entry['saved'])
+            finally:
+                self.condition.release()
+
+
+    def save_item(self, item):
+        return {
+            'transfer_status': item.GetProperty('transfer_status'),
+            'tagline': item.GetTagLine()
+        }
+
+
+    def restore_item(self, item, saved):
+        if not item or not saved:
+            return
+        item.SetProperty('transfer_status', saved['transfer_status'])
+        item.SetTagLine(saved['tagline'])
@@ -0,0 +1,201 @@
+import time
+
+
+class BandwidthProfile(object):
+    '''
+    A set of speed limits, in bytes per second. None means unlimited.
+
+    Arguments:
+        download: Global download limit
+        upload: Global upload limit
+        torrents: A dict of torrent id -> (download, upload) limits
+    '''
+    def __init__(self, download=None, upload=None, torrents=None):
+        self.download = download
+        self.upload = upload
+        self.torrents = torrents or {}
+
+
+    def __repr__(self):
+        return 'BandwidthProfile(%r, %r, %r)' % (self.download, self.upload, self.torrents)
+
+
+def parse_time(value):
+    '''
+    Returns the minute of the day of a 'HH:MM' string.
+    '''
+    hours, minutes = value.strip().split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+def parse_rates(value):
+    '''
+    Parses a 'download/upload' pair of KB/s values into a BandwidthProfile. An empty
+    value or '-' is unlimited.
+    '''
+    rates = []
+    for rate in (value.split('/') + [''])[:2]:
+        rate = rate.strip()
+        if rate in ('', '-'):
+            rates.append(None)
+        else:
+            rates.append(int(float(rate) * 1024))
+    return BandwidthProfile(rates[0], rates[1])
+
+
+def parse_profile(value):
+    '''
+    Parses global 'download/upload' KB/s limits, optionally followed by ','
+    separated 'torrent id:download/upload' per-torrent limits, into a
+    BandwidthProfile.
+    '''
+    parts = value.split(',')
+    profile = parse_rates(parts[0])
+    for part in parts[1:]:
+        if not part.strip():
+            continue
+        # Aggregated torrent ids contain ':' themselves, rates never do.
+        id, rates = part.rsplit(':', 1)
+        limits = parse_rates(rates)
+        profile.torrents[id.strip()] = (limits.download, limits.upload)
+    return profile
+
+
+class BandwidthScheduler(object):
+    '''
+    Pushes speed limits to a TorrentUI's daemon following a time-of-day schedule,
+    with a separate profile while media is playing.
+
+    `update` is called on every poll and works out the profile in effect. Limits are
+    only sent when the effective values changed since they were last pushed: the
+    global limits in one call, the per-torrent ones in one batch with just the
+    torrents whose limits changed. A failed push is retried on the next poll,
+    unless the daemon has no per-torrent limits: those are then left alone.
+
+    Arguments:
+        ui: The TorrentUI whose `set_speed_limits` and `set_torrent_speed_limits`
+        methods are used
+        default: The profile outside every scheduled period, unlimited by default
+    '''
+    def __init__(self, ui, default=None):
+        self.ui = ui
+        self.default = default or BandwidthProfile()
+        # (first minute, last minute, profile) tuples, first match wins.
+        self.periods = []
+        self.playback = None
+        # The global and per-torrent limits last pushed to the daemon.
+        self.applied = None
+        self.applied_torrents = {}
+        # Cleared once the daemon turns out to have no per-torrent limits.
+        self.torrent_limits = True
+
+
+    @classmethod
+    def from_config(cls, ui, value):
+        '''
+        Creates a scheduler from the 'bandwidth_schedule' config value, ';'
+        separated entries like '08:00-18:00=500/50' (KB/s down/up during that
+        period), 'playback=-/20' (while media plays) or 'default=1000/100'.
+        Per-torrent limits follow the global ones, like
+        'default=1000/100,<torrent id>:200/-,<torrent id>:-/10'.
+        '''
+        scheduler = cls(ui)
+        for entry in value.split(';'):
+            if not entry.strip():
+                continue
+            when, rates = entry.split('=', 1)
+            when = when.strip().lower()
+            if when == 'playback':
+                scheduler.playback = parse_profile(rates)
+            elif when == 'default':
+                scheduler.default = parse_profile(rates)
+            else:
+                start, end = when.split('-', 1)
+                scheduler.add_period(start, end, parse_profile(rates))
+        return scheduler
+
+
+    def is_enabled(self):
+        return bool(self.periods or self.playback or self.applied or self.applied_torrents or
+                    self.default.download is not None or self.default.upload is not None or
+                    self.default.torrents)
+
+
+    def add_period(self, start, end, profile):
+        '''
+        Uses `profile` from `start` up to `end`, both 'HH:MM'. Periods ending before
+        they start run over midnight.
+        '''
+        self.periods.append((parse_time(start), parse_time(end), profile))
+
+
+    def set_playback_profile(self, profile):
+        '''
+        Uses `profile` while media is playing, whatever the time. None turns this off.
+        '''
+        self.playback = profile
+
+
+    def get_profile(self, playing=False, now=None):
+        '''
+        Returns the profile in effect at `now`, a time.time() value.
+        '''
+        if playing and self.playback:
+            return self.playback
+        local = time.localtime(now)
+        minute = local.tm_hour * 60 + local.tm_min
+        for start, end, profile in self.periods:
+            if start <= end:
+                if start <= minute < end:
+                    return profile
+            elif minute >= start or minute < end:
+                return profile
+        return self.default
+
+
+    def update(self, torrent_ids, playing=False, now=None):
+        '''
+        Pushes the limits of the profile in effect if they differ from the ones in
+        place. `torrent_ids` are the torrents of the current snapshot, per-torrent
+        limits of other torrents are ignored.
+        '''
+        if not self.is_enabled():
+            return
+        profile = self.get_profile(playing, now)
+
+        limits = (profile.download, profile.upload)
+        if limits != self.applied:
+            try:
+                self.ui.call_connection('set_speed_limits', profile.download, profile.upload)
+                self.applied = limits
+            except Exception, e:
+                print "Setting speed limits failed: %s" % e
+
+        if not self.torrent_limits:
+            return
+        wanted = {}
+        for id in torrent_ids:
+            limits = profile.torrents.get(id)
+            if limits is None and id in self.applied_torrents:
+                limits = (None, None)
+            if limits is not None and self.applied_torrents.get(id, (None, None)) != limits:
+                wanted[id] = limits
+        if wanted:
+            try:
+                self.ui.call_connection('set_torrent_speed_limits', wanted)
+            except NotImplementedError, e:
+                print "Not setting torrent speed limits: %s" % e
+                self.torrent_limits = False
+                self.applied_torrents = {}
+                return
+            except Exception, e:
+                print "Setting torrent speed limits failed: %s" % e
+                return
+            for id, limits in wanted.items():
+                if limits == (None, None):
+                    self.applied_torrents.pop(id, None)
+                else:
+                    self.applied_torrents[id] = limits
+        for id in self.applied_torrents.keys():
+            if id not in torrent_ids:
+                del self.applied_torrents[id]
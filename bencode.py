@@ -0,0 +1,113 @@
+import hashlib
+
+
+class BencodeError(Exception): pass
+
+
+def decode_int(data, pos):
+    end = data.index('e', pos)
+    return int(data[pos + 1:end]), end + 1
+
+
+def decode_string(data, pos):
+    colon = data.index(':', pos)
+    start = colon + 1
+    end = start + int(data[pos:colon])
+    if end > len(data):
+        raise BencodeError("String runs past the end of the data at %d" % pos)
+    return data[start:end], end
+
+
+def decode_list(data, pos):
+    values = []
+    pos += 1
+    while data[pos] != 'e':
+        value, pos = decode_value(data, pos)
+        values.append(value)
+    return values, pos + 1
+
+
+def decode_dict(data, pos):
+    values = {}
+    pos += 1
+    while data[pos] != 'e':
+        key, pos = decode_string(data, pos)
+        values[key], pos = decode_value(data, pos)
+    return values, pos + 1
+
+
+DECODERS = {'i': decode_int, 'l': decode_list, 'd': decode_dict}
+
+
+def decode_value(data, pos):
+    '''
+    Decodes the value starting at `pos` of `data`. Returns the (value, end
+    position) pair.
+    '''
+    try:
+        return DECODERS[data[pos]](data, pos)
+    except KeyError:
+        if not data[pos].isdigit():
+            raise BencodeError("Unexpected %r at %d" % (data[pos], pos))
+        return decode_string(data, pos)
+
+
+def decode(data):
+    '''
+    Decodes a bencoded string into ints, strings, lists and dicts.
+    '''
+    try:
+        value, end = decode_value(data, 0)
+    except (IndexError, ValueError), e:
+        raise BencodeError("Malformed bencoded data: %s" % e)
+    if end != len(data):
+        raise BencodeError("Trailing data at %d" % end)
+    return value
+
+
+def decode_torrent(data):
+    '''
+    Decodes the contents of a .torrent file. Returns the (metainfo dict, info hash)
+    pair, the info hash being the lowercase hex SHA1 of the bencoded 'info' dict as
+    it appears in `data`.
+    '''
+    if not data.startswith('d'):
+        raise BencodeError("A torrent file holds a dictionary")
+    metainfo = {}
+    info_span = None
+    pos = 1
+    try:
+        while data[pos] != 'e':
+            key, start = decode_string(data, pos)
+            metainfo[key], pos = decode_value(data, start)
+            if key == 'info':
+                info_span = (start, pos)
+    except (IndexError, ValueError), e:
+        raise BencodeError("Malformed torrent file: %s" % e)
+    if info_span is None or not isinstance(metainfo['info'], dict):
+        raise BencodeError("The torrent file has no info dictionary")
+    return metainfo, hashlib.sha1(data[info_span[0]:info_span[1]]).hexdigest()
+
+
+def parse_torrent(data):
+    '''
+    Reads what the list needs from the contents of a .torrent file without a
+    daemon. Returns a dict with 'info_hash', 'name', 'size_bytes' and 'files', a
+    list of (path, length) pairs.
+    '''
+    metainfo, info_hash = decode_torrent(data)
+    info = metainfo['info']
+    name = info.get('name', info_hash)
+    try:
+        if 'files' in info:
+            files = [('/'.join([name] + file['path']), file['length']) for file in info['files']]
+        else:
+            files = [(name, info['length'])]
+    except (KeyError, TypeError), e:
+        raise BencodeError("Malformed file list: %s" % e)
+    return {
+        'info_hash': info_hash,
+        'name': name,
+        'size_bytes': sum([length for path, length in files]),
+        'files': files
+    }
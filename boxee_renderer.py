@@ -0,0 +1,147 @@
+import os
+import mc
+from renderer import Renderer
+
+try:
+    import xbmcgui
+except ImportError:
+    xbmcgui = None
+
+try:
+    import xbmc
+except ImportError:
+    xbmc = None
+
+
+class BoxeeRenderer(Renderer):
+    '''
+    Renderer drawing a TorrentUI in the Boxee main window.
+
+    Arguments:
+        window_id: Id of the main window
+    '''
+    def __init__(self, window_id=14002):
+        super(BoxeeRenderer, self).__init__()
+        self.window_id = window_id
+        self.config = mc.GetApp().GetLocalConfig()
+        self.window = mc.GetWindow(window_id)
+        self.torrent_list = self.window.GetList(100)
+        self.file_list = self.window.GetList(4100)
+        self.status = self.window.GetLabel(105)
+        self.debug_overlay = self.window.GetLabel(106)
+        self.stale_notice = self.window.GetLabel(107)
+
+
+    def get_setting(self, name):
+        return self.config.GetValue(name)
+
+
+    def set_setting(self, name, value):
+        self.config.SetValue(name, value)
+
+
+    def get_data_dir(self):
+        # In the user profile, the temp directory is cleared on restarts.
+        if xbmc is not None:
+            profile = xbmc.translatePath('special://profile')
+        else:
+            profile = os.path.expanduser('~')
+        return os.path.join(profile, 'torrentui')
+
+
+    def create_item(self):
+        return mc.ListItem(mc.ListItem.MEDIA_FILE)
+
+
+    def create_items(self):
+        return mc.ListItems()
+
+
+    def get_items(self):
+        return self.torrent_list.GetItems()
+
+
+    def get_focused(self):
+        return self.torrent_list.GetFocusedItem()
+
+
+    def set_items(self, items, keep_focus=True):
+        # When you call SetItems() on a list, it loses it's focus and you end up at
+        # the top again.
+        selected = None
+        if keep_focus:
+            try:
+                selected = self.torrent_list.GetFocusedItem()
+            except:
+                pass
+        self.torrent_list.SetItems(items)
+        if selected is not None:
+            try:
+                self.torrent_list.SetFocusedItem(selected)
+            except:
+                pass
+
+
+    def set_file_items(self, items):
+        self.file_list.SetItems(items)
+
+
+    def set_rates(self, download, upload):
+        self.window.GetControl(2000).SetVisible(True)
+        self.window.GetLabel(2001).SetLabel(download)
+        self.window.GetLabel(2002).SetLabel(upload)
+
+
+    def set_header(self, text):
+        self.window.GetLabel(101).SetLabel(text)
+
+
+    def set_sort_label(self, text):
+        self.window.GetLabel(104).SetLabel(text)
+
+
+    def set_loading(self, loading):
+        self.status.SetVisible(loading)
+        self.window.GetControl(3000).SetVisible(loading)
+
+
+    def set_stale(self, stale):
+        self.stale_notice.SetVisible(stale)
+
+
+    def is_visible(self):
+        if xbmcgui is None:
+            return True
+        return xbmcgui.getCurrentWindowId() == self.window_id
+
+
+    def is_playing(self):
+        return mc.GetPlayer().IsPlaying()
+
+
+    def is_alive(self):
+        # The list control is unreachable once its window was closed.
+        try:
+            self.torrent_list.GetItems()
+        except:
+            return False
+        return True
+
+
+    def set_stream_status(self, text):
+        mc.ShowDialogNotification(text)
+
+
+    def play(self, path):
+        item = mc.ListItem(mc.ListItem.MEDIA_VIDEO_OTHER)
+        item.SetLabel(os.path.basename(path))
+        item.SetPath(path)
+        mc.GetPlayer().Play(item)
+
+
+    def set_debug_text(self, text):
+        if text is None:
+            self.debug_overlay.SetVisible(False)
+        else:
+            self.debug_overlay.SetLabel(text)
+            self.debug_overlay.SetVisible(True)
@@ -0,0 +1,328 @@
+#!/usr/bin/env python
+import socket, ssl, struct, threading, zlib
+import rencode
+from instrumentation import STATS
+
+
+class DelugeClientFailure(Exception): pass
+
+
+class DelugeRPCError(Exception): pass
+
+
+# Message types sent by the daemon.
+RPC_RESPONSE = 1
+RPC_ERROR = 2
+RPC_EVENT = 3
+
+# Bytes read from the socket at a time.
+CHUNK_SIZE = 16384
+
+# Deluge 2 message header: protocol version, payload length.
+PROTOCOL_VERSION = 1
+MESSAGE_HEADER = struct.Struct('!BI')
+
+
+def encode_message(calls, protocol=2):
+    '''
+    Returns the wire form of one message of (request id, method, args, kwargs)
+    calls.
+    '''
+    data = zlib.compress(rencode.dumps(tuple(calls)))
+    if protocol >= 2:
+        data = MESSAGE_HEADER.pack(PROTOCOL_VERSION, len(data)) + data
+    return data
+
+
+def get_daemon_info(host, port=58846, timeout=None, protocol=2):
+    '''
+    Returns the version the Deluge daemon at host:port reports for daemon.info,
+    which answers without logging in. Raises DelugeClientFailure when whatever
+    listens there does not answer like a Deluge daemon.
+    '''
+    sock = ssl.wrap_socket(socket.create_connection((host, int(port)), timeout))
+    try:
+        sock.sendall(encode_message([(1, 'daemon.info', (), {})], protocol))
+        data = ''
+        decoder = zlib.decompressobj()
+        decoded = ''
+        while True:
+            chunk = sock.recv(CHUNK_SIZE)
+            if not chunk:
+                raise DelugeClientFailure("Connection closed without an answer to daemon.info")
+            if protocol >= 2:
+                data += chunk
+                if len(data) < MESSAGE_HEADER.size:
+                    continue
+                version, length = MESSAGE_HEADER.unpack_from(data)
+                if version != PROTOCOL_VERSION:
+                    raise DelugeClientFailure("Unknown protocol version %d" % version)
+                if len(data) < MESSAGE_HEADER.size + length:
+                    continue
+                message = rencode.loads(zlib.decompress(data[MESSAGE_HEADER.size:]))
+                break
+            decoded += decoder.decompress(chunk)
+            try:
+                message = rencode.loads(decoded)
+                break
+            except rencode.RencodeError:
+                continue
+    finally:
+        sock.close()
+    if len(message) < 3 or message[:2] != (RPC_RESPONSE, 1) or not isinstance(message[2], basestring):
+        raise DelugeClientFailure("Not an answer to daemon.info: %r" % (message,))
+    return message[2]
+
+
+class DelugeRequest(object):
+    '''
+    A request waiting for the daemon's answer, see `DelugeClient.send`.
+    '''
+    def __init__(self, id, method, started):
+        self.id = id
+        self.method = method
+        self.started = started
+        self.sent = 0
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+    def finish(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.done.set()
+
+
+    def wait(self, timeout=None):
+        '''
+        Blocks until the answer came in and returns it. Raises DelugeRPCError when
+        the daemon failed the request.
+        '''
+        self.done.wait(timeout)
+        if not self.done.isSet():
+            raise DelugeClientFailure("No answer to %s within %s seconds" % (self.method, timeout))
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class DelugeClient(object):
+    '''
+    Client for the Deluge daemon's native RPC: rencoded, zlib compressed messages
+    over one persistent TLS connection.
+
+    Requests are multiplexed on that connection. `send` writes any number of calls
+    in one message and returns right away, a reader thread matches the answers to
+    them by request id and passes the events the daemon pushes to the handlers
+    registered with `subscribe`.
+
+    Arguments:
+        host: Host name of the daemon
+        port: Daemon port
+        username: Daemon user name
+        password: Daemon password
+        timeout: Seconds to wait for each answer, None blocks
+        protocol: 2 for Deluge 2 daemons, which frame every message with a version
+        and length header, 1 for Deluge 1.3 ones, which send bare zlib streams
+    '''
+    def __init__(self, host='localhost', port=58846, username='', password='', timeout=None, protocol=2):
+        self.host = host
+        self.port = int(port)
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.protocol = protocol
+        self.socket = None
+        self.send_lock = threading.Lock()
+        self.lock = threading.Lock()
+        self.next_id = 0
+        # Request id -> DelugeRequest waiting for its answer.
+        self.pending = {}
+        # Event name -> list of handlers.
+        self.handlers = {}
+        self.connect()
+
+
+    def connect(self):
+        '''
+        Opens the connection, logs in and registers the event interest again.
+        '''
+        self.close()
+        sock = socket.create_connection((self.host, self.port), self.timeout)
+        # The daemon's certificate is self-signed.
+        self.socket = ssl.wrap_socket(sock)
+        self.socket.settimeout(None)
+        reader = threading.Thread(target=self.read_messages, args=(self.socket,))
+        reader.setDaemon(True)
+        reader.start()
+
+        if self.protocol >= 2:
+            self.call('daemon.login', self.username, self.password, client_version='2.0')
+        else:
+            self.call('daemon.login', self.username, self.password)
+        if self.handlers:
+            self.call('daemon.set_event_interest', self.handlers.keys())
+
+
+    def close(self):
+        if self.socket is not None:
+            try:
+                self.socket.close()
+            except socket.error:
+                pass
+            self.socket = None
+
+
+    def is_connected(self):
+        return self.socket is not None
+
+
+    def send(self, calls):
+        '''
+        Sends (method, args, kwargs) calls in a single message without waiting for
+        the answers. Returns a DelugeRequest per call.
+        '''
+        if self.socket is None:
+            raise DelugeClientFailure("Not connected to %s:%s" % (self.host, self.port))
+        started = STATS.start()
+        requests = []
+        message = []
+        self.lock.acquire()
+        try:
+            for method, args, kwargs in calls:
+                self.next_id += 1
+                request = self.pending[self.next_id] = DelugeRequest(self.next_id, method, started)
+                requests.append(request)
+                message.append((self.next_id, method, tuple(args), kwargs))
+        finally:
+            self.lock.release()
+
+        data = encode_message(message, self.protocol)
+        requests[0].sent = len(data)
+        self.send_lock.acquire()
+        try:
+            try:
+                self.socket.sendall(data)
+            except (socket.error, AttributeError), e:
+                self.fail_pending(DelugeClientFailure("Sending to Deluge failed: %s" % e))
+                self.close()
+                raise DelugeClientFailure("Sending to Deluge failed: %s" % e)
+        finally:
+            self.send_lock.release()
+        return requests
+
+
+    def call(self, method, *args, **kwargs):
+        '''
+        Calls one method and waits for its result.
+        '''
+        return self.send([(method, args, kwargs)])[0].wait(self.timeout)
+
+
+    def call_many(self, calls):
+        '''
+        Sends (method, args, kwargs) calls together and waits for all results.
+        '''
+        return [request.wait(self.timeout) for request in self.send(calls)]
+
+
+    def subscribe(self, event, handler):
+        '''
+        Calls `handler(*args)` for every `event` the daemon pushes, like
+        'TorrentStateChangedEvent'.
+        '''
+        new = event not in self.handlers
+        self.handlers.setdefault(event, []).append(handler)
+        if new and self.socket is not None:
+            self.call('daemon.set_event_interest', [event])
+
+
+    def read_messages(self, sock):
+        '''
+        Reads and dispatches messages until the connection closes. Runs in the
+        reader thread.
+        '''
+        buffer = ''
+        # Deluge 1.3 state: the decompressor of the current message, its output so
+        # far and the bytes it was fed.
+        decoder = zlib.decompressobj()
+        decoded = ''
+        size = 0
+        try:
+            while True:
+                chunk = sock.recv(CHUNK_SIZE)
+                if not chunk:
+                    raise DelugeClientFailure("Deluge closed the connection")
+                buffer += chunk
+                while buffer:
+                    if self.protocol >= 2:
+                        # Version, payload length, zlib payload.
+                        if len(buffer) < MESSAGE_HEADER.size:
+                            break
+                        version, length = MESSAGE_HEADER.unpack_from(buffer)
+                        if version != PROTOCOL_VERSION:
+                            raise DelugeClientFailure("Unknown protocol version %d" % version)
+                        end = MESSAGE_HEADER.size + length
+                        if len(buffer) < end:
+                            break
+                        message = rencode.loads(zlib.decompress(buffer[MESSAGE_HEADER.size:end]))
+                        buffer = buffer[end:]
+                        self.dispatch(message, end)
+                        continue
+
+                    # Zlib streams back to back, without lengths. A message is
+                    # complete once its stream ends or its data decodes.
+                    decoded += decoder.decompress(buffer)
+                    size += len(buffer) - len(decoder.unused_data)
+                    buffer = decoder.unused_data
+                    try:
+                        message = rencode.loads(decoded)
+                    except rencode.RencodeError:
+                        if buffer:
+                            raise
+                        break
+                    self.dispatch(message, size)
+                    decoder = zlib.decompressobj()
+                    decoded = ''
+                    size = 0
+        except Exception, e:
+            if self.socket is sock:
+                print "Deluge connection lost: %s" % e
+                self.socket = None
+            self.fail_pending(DelugeClientFailure("Deluge connection lost: %s" % e))
+
+
+    def dispatch(self, message, size):
+        if message[0] == RPC_EVENT:
+            for handler in self.handlers.get(message[1], []):
+                try:
+                    handler(*message[2])
+                except Exception, e:
+                    print "Deluge event handler for %s failed: %s" % (message[1], e)
+            return
+
+        self.lock.acquire()
+        try:
+            request = self.pending.pop(message[1], None)
+        finally:
+            self.lock.release()
+        if request is None:
+            return
+        if message[0] == RPC_ERROR:
+            STATS.record('deluge', request.method, request.started, request.sent, size, error=True)
+            request.finish(error=DelugeRPCError('%s: %s' % (message[2], message[3])))
+        else:
+            STATS.record('deluge', request.method, request.started, request.sent, size)
+            request.finish(message[2])
+
+
+    def fail_pending(self, error):
+        self.lock.acquire()
+        try:
+            pending = self.pending.values()
+            self.pending = {}
+        finally:
+            self.lock.release()
+        for request in pending:
+            request.finish(error=error)
@@ -0,0 +1,303 @@
+import base64, posixpath, threading, time, urlparse
+from torrent_ui import TorrentUI
+from deluge_client import DelugeClient
+
+
+class DelugeUI(TorrentUI):
+    '''
+    TorrentUI subclass for the Deluge daemon.
+
+    Works over one connection to the daemon that stays open. The first poll
+    fetches the `keys` of every torrent, later ones only ask for the values that
+    changed since the previous poll, sent in the same message as the request for
+    the session rates. Added, removed and state changed torrents are pushed by the
+    daemon: the events update the torrent table right away and wake the poll loop,
+    so the list follows them without waiting for the poll interval.
+    '''
+    # The only status keys fetched, all the list needs.
+    keys = ['name', 'state', 'total_wanted', 'total_done', 'progress', 'download_payload_rate',
+            'upload_payload_rate', 'num_peers', 'num_seeds', 'eta', 'all_time_download',
+            'total_uploaded', 'ratio', 'label', 'tracker_host']
+
+    states = {
+        'Downloading': 'Downloading',
+        'Checking': 'Downloading',
+        'Allocating': 'Downloading',
+        'Seeding': 'Seeding',
+        'Paused': 'Paused',
+        'Queued': 'Paused'
+    }
+
+    # File priority values by protocol version, Deluge 2 changed them.
+    file_priorities = {
+        1: {0: 'skip', 1: 'normal', 2: 'high', 5: 'high', 7: 'high'},
+        2: {0: 'skip', 1: 'low', 2: 'low', 3: 'low', 4: 'normal', 5: 'high', 6: 'high', 7: 'high'}
+    }
+    file_priority_values = {
+        1: {'skip': 0, 'low': 1, 'normal': 1, 'high': 7},
+        2: {'skip': 0, 'low': 1, 'normal': 4, 'high': 7}
+    }
+
+    # Completed state in the 'pieces' status.
+    piece_completed = 3
+
+
+    def __init__(self, connection, renderer=None, backend=False):
+        super(DelugeUI, self).__init__(connection, renderer, backend)
+        # Torrent id -> status values received so far.
+        self.table = {}
+        self.table_lock = threading.Lock()
+        # When every torrent was last fetched, 0 forces a full fetch.
+        self.fetched_all_at = 0
+        connection.subscribe('TorrentAddedEvent', self.on_torrent_added)
+        connection.subscribe('TorrentRemovedEvent', self.on_torrent_removed)
+        connection.subscribe('TorrentStateChangedEvent', self.on_torrent_state_changed)
+        connection.subscribe('TorrentFinishedEvent', self.on_torrent_finished)
+
+
+    # Event handlers, called from the connection's reader thread. They must not
+    # wait for answers from the daemon.
+    def on_torrent_added(self, id, *args):
+        # The next changes fetch includes the new torrent in full.
+        self.wake_up()
+
+
+    def on_torrent_removed(self, id):
+        self.table_lock.acquire()
+        try:
+            self.table.pop(id, None)
+        finally:
+            self.table_lock.release()
+        self.wake_up()
+
+
+    def on_torrent_state_changed(self, id, state):
+        self.table_lock.acquire()
+        try:
+            if id in self.table:
+                self.table[id]['state'] = state
+        finally:
+            self.table_lock.release()
+        self.wake_up()
+
+
+    def on_torrent_finished(self, id):
+        self.wake_up()
+
+
+    def get_status_name(self, state):
+        return self.states.get(state, 'Unknown')
+
+
+    def get_snapshot(self):
+        if not self.connection.is_connected():
+            self.connection.connect()
+            self.fetched_all_at = 0
+        now = time.time()
+        full = now - self.fetched_all_at >= self.full_refresh_interval
+        torrents_request, session_request = self.connection.send([
+            ('core.get_torrents_status', ({}, self.keys), {'diff': not full}),
+            ('core.get_session_status', (['payload_download_rate', 'payload_upload_rate'],), {})
+        ])
+        changes = torrents_request.wait(self.connection.timeout)
+        session = session_request.wait(self.connection.timeout)
+
+        self.table_lock.acquire()
+        try:
+            if full:
+                self.table = {}
+                self.fetched_all_at = now
+            for id, values in changes.items():
+                self.table.setdefault(id, {}).update(values)
+            torrents = [self.format_torrent(id, values) for id, values in self.table.items()]
+        finally:
+            self.table_lock.release()
+        return torrents, self.format_status(int(session['payload_download_rate']),
+                                            int(session['payload_upload_rate']))
+
+
+    def get_torrents(self):
+        return self.get_snapshot()[0]
+
+
+    def get_details(self, ids):
+        # The table is as fresh as the summary the ids come from.
+        self.table_lock.acquire()
+        try:
+            return [self.format_torrent(id, self.table[id]) for id in ids if id in self.table]
+        finally:
+            self.table_lock.release()
+
+
+    def format_torrent(self, id, values):
+        total = values.get('total_wanted', 0)
+        left = max(0, total - values.get('total_done', 0))
+
+        estimated_time = ''
+        if values.get('eta', 0) > 0:
+            estimated_time = self.format_time(values['eta'])
+
+        return {
+            'id': str(id),
+            'label': str(values.get('name', '')),
+            'status': self.get_status_name(values.get('state')),
+            'size_total': self.format_filesize(total),
+            'size_downloaded': self.format_filesize(total - left),
+            'size_uploaded': self.format_filesize(values.get('total_uploaded', 0)),
+            'percent_done': float(values.get('progress', 0)),
+            'estimated_time': estimated_time,
+            'peers_connected': values.get('num_peers', 0) + values.get('num_seeds', 0),
+            'peers_incoming': values.get('num_seeds', 0),
+            'peers_outgoing': values.get('num_peers', 0),
+            'rate_download': self.format_filesize(values.get('download_payload_rate', 0)),
+            'rate_upload': self.format_filesize(values.get('upload_payload_rate', 0)),
+            'rate_download_bytes': int(values.get('download_payload_rate', 0)),
+            'rate_upload_bytes': int(values.get('upload_payload_rate', 0)),
+            'size_left_bytes': left,
+            'ratio': str(round(values.get('ratio', 0), 3)),
+            'category': str(values.get('label', '')),
+            'tracker': str(values.get('tracker_host', '')),
+            'downloaded_bytes': int(values.get('all_time_download', 0)),
+            'uploaded_bytes': int(values.get('total_uploaded', 0))
+        }
+
+
+    def get_ids(self):
+        self.table_lock.acquire()
+        try:
+            return self.table.keys()
+        finally:
+            self.table_lock.release()
+
+
+    def get_files(self, id):
+        status = self.connection.call('core.get_torrent_status', id,
+            ['files', 'file_progress', 'file_priorities'])
+        priorities = self.file_priorities[self.connection.protocol]
+        files = []
+        for file_data, progress, priority in zip(status['files'], status['file_progress'],
+                                                 status['file_priorities']):
+            files.append(self.format_file(file_data['index'], str(file_data['path']), file_data['size'],
+                int(file_data['size'] * progress), priorities.get(priority, 'normal')))
+        return files
+
+
+    def set_file_priorities(self, id, priorities):
+        # Deluge only takes the priorities of all files at once.
+        values = list(self.connection.call('core.get_torrent_status', id,
+            ['file_priorities'])['file_priorities'])
+        for index, priority in priorities.items():
+            values[index] = self.file_priority_values[self.connection.protocol][priority]
+        self.connection.call('core.set_torrent_options', [id], {'file_priorities': values})
+
+
+    def set_sequential(self, id, index, enabled=True):
+        # Deluge 1.3 only knows the first/last piece option and ignores the other.
+        self.connection.call('core.set_torrent_options', [id], {
+            'sequential_download': enabled,
+            'prioritize_first_last_pieces': enabled
+        })
+        return True
+
+
+    def get_file_pieces(self, id, index):
+        status = self.connection.call('core.get_torrent_status', id, ['pieces', 'piece_length', 'files'])
+        states = status['pieces']
+        bitfield = [0] * ((len(states) + 7) / 8)
+        for piece, state in enumerate(states):
+            if state == self.piece_completed:
+                bitfield[piece >> 3] |= 0x80 >> (piece & 7)
+        file_data = status['files'][index]
+        return ''.join(map(chr, bitfield)), status['piece_length'], file_data['offset'], file_data['size']
+
+
+    def get_file_path(self, id, index):
+        status = self.connection.call('core.get_torrent_status', id, ['save_path', 'files'])
+        return posixpath.join(status['save_path'], status['files'][index]['path'])
+
+
+    def start_torrent(self, id=False):
+        self.start_torrents(id and [id] or self.get_ids())
+
+
+    def stop_torrent(self, id=False):
+        self.stop_torrents(id and [id] or self.get_ids())
+
+
+    def delete_torrent(self, id, files=False):
+        self.delete_torrents(id and [id] or self.get_ids(), files)
+
+
+    def start_torrents(self, ids):
+        # Deluge 2 renamed the list forms.
+        if ids:
+            self.connection.call(self.connection.protocol >= 2 and 'core.resume_torrents' or
+                                 'core.resume_torrent', list(ids))
+
+
+    def stop_torrents(self, ids):
+        if ids:
+            self.connection.call(self.connection.protocol >= 2 and 'core.pause_torrents' or
+                                 'core.pause_torrent', list(ids))
+
+
+    def delete_torrents(self, ids, files=False):
+        # All removals travel in one message.
+        if ids:
+            self.connection.call_many([('core.remove_torrent', (id, bool(files)), {}) for id in ids])
+
+
+    def add_torrents(self, torrents):
+        if torrents:
+            self.connection.call_many([
+                ('core.add_torrent_file', ('%d.torrent' % index, base64.b64encode(data), {}), {})
+                for index, data in enumerate(torrents)
+            ])
+
+
+    def set_priority(self, ids, priority):
+        # Only the queue position can be changed.
+        if priority == 'high':
+            self.connection.call('core.queue_top', list(ids))
+        elif priority == 'low':
+            self.connection.call('core.queue_bottom', list(ids))
+
+
+    def get_speed_option(self, limit):
+        # Deluge limits are in KiB/s, -1 is unlimited.
+        if limit is None:
+            return -1
+        return limit / 1024.0
+
+
+    def set_speed_limits(self, download=None, upload=None):
+        self.connection.call('core.set_config', {
+            'max_download_speed': self.get_speed_option(download),
+            'max_upload_speed': self.get_speed_option(upload)
+        })
+
+
+    def set_torrent_speed_limits(self, limits):
+        # One set_torrent_options per distinct pair of limits, all in one message.
+        groups = {}
+        for id, (download, upload) in limits.items():
+            groups.setdefault((download, upload), []).append(id)
+        if groups:
+            self.connection.call_many([('core.set_torrent_options', (ids, {
+                'max_download_speed': self.get_speed_option(download),
+                'max_upload_speed': self.get_speed_option(upload)
+            }), {}) for (download, upload), ids in groups.items()])
+
+
+    @classmethod
+    def connect(cls, url, username='', password='', **options):
+        '''
+        Connects to 'deluge://host:port', or 'deluge1://host:port' for Deluge 1.3
+        daemons.
+        '''
+        scheme, netloc = urlparse.urlsplit(url)[:2]
+        if not netloc:
+            netloc = url
+        host, port = (netloc.split(':', 1) + ['58846'])[:2]
+        return cls(DelugeClient(host, port, username, password, protocol=scheme == 'deluge1' and 1 or 2),
+                   **options)
@@ -0,0 +1,194 @@
+import re, time, threading, urlparse, Queue
+
+
+# Addresses tried for each client kind on top of the client's 'default_url'.
+DEFAULT_URLS = {
+    'transmission': ['http://localhost:9091'],
+    'rtorrent': ['scgi://localhost:5000'],
+    'utorrent': ['http://localhost:8080'],
+    'qbittorrent': ['http://localhost:8080'],
+    'deluge': ['deluge://localhost:58846', 'deluge1://localhost:58846'],
+}
+
+
+# The client libraries are imported by the probes, so only the ones probed load.
+def probe_transmission(url, timeout):
+    from transmission_client import TransmissionClient
+    # The constructor already does a test call and raises if nobody answers.
+    TransmissionClient(url, timeout=timeout)
+
+
+def probe_rtorrent(url, timeout):
+    from rtorrent_client import RTorrentXMLRPCClient
+    RTorrentXMLRPCClient(url, timeout=timeout).system.client_version()
+
+
+def probe_utorrent(url, timeout):
+    from utorrent_client import uTorrent
+    netloc = urlparse.urlsplit(url)[1]
+    host, port = (netloc.split(':', 1) + ['8080'])[:2]
+    connection = uTorrent(host, port, timeout=timeout)
+    try:
+        # Other WebUIs share the port, only uTorrent serves the token page or asks
+        # for its own realm when the default login is refused.
+        connection.request('GET', '/gui/token.html',
+                           headers={'Authorization': 'Basic ' + connection.webui_identity()})
+        response = connection.getresponse()
+        body = response.read()
+    finally:
+        connection.close()
+    if response.status == 200 and "id='token'" in body.replace('"', "'"):
+        return
+    if response.status == 401 and 'utorrent' in (response.getheader('www-authenticate') or '').lower():
+        return
+    raise Exception('Not a uTorrent WebUI response: %s' % response.status)
+
+
+def is_qbittorrent_response(status, body, cookie):
+    '''
+    Returns True if the answer to /api/v2/app/webapiVersion comes from qBittorrent:
+    the API version when logged in, or when logged out a 403 with qBittorrent's
+    'Forbidden' page or its session cookie.
+
+    Arguments:
+        status: The HTTP status
+        body: The response body
+        cookie: The Set-Cookie header, None when missing
+    '''
+    if status == 200:
+        return re.match(r'^\d+\.\d+(\.\d+)*$', body.strip()) is not None
+    if status == 403:
+        return body.strip() == 'Forbidden' or re.search(r'\b(SID|QBT_SID_\d+)=', cookie or '') is not None
+    return False
+
+
+def probe_qbittorrent(url, timeout):
+    import urllib2
+    # Other web servers answer any path too, so the answer must look like qBittorrent's.
+    try:
+        response = urllib2.urlopen('%s/api/v2/app/webapiVersion' % url.rstrip('/'), timeout=timeout)
+    except urllib2.HTTPError, e:
+        if e.code != 403:
+            raise
+        response = e
+    status = response.getcode()
+    body = response.read(256)
+    if not is_qbittorrent_response(status, body, response.info().getheader('set-cookie')):
+        raise Exception('Not a qBittorrent WebUI response: %s' % status)
+
+
+def probe_deluge(url, timeout):
+    from deluge_client import get_daemon_info
+    scheme, netloc = urlparse.urlsplit(url)[:2]
+    host, port = ((netloc or url).split(':', 1) + ['58846'])[:2]
+    # daemon.info answers before logging in, which needs the credentials.
+    get_daemon_info(host, port, timeout, protocol=scheme == 'deluge1' and 1 or 2)
+
+
+PROBES = {
+    'transmission': probe_transmission,
+    'rtorrent': probe_rtorrent,
+    'utorrent': probe_utorrent,
+    'qbittorrent': probe_qbittorrent,
+    'deluge': probe_deluge,
+}
+
+
+def get_candidates(clients, preferred=None):
+    '''
+    Returns a list of (name, client, url) tuples to probe, built from a
+    `TORRENT_CLIENTS` style dict and `DEFAULT_URLS`. The `preferred` (name, url)
+    tuple, if any, comes first.
+    '''
+    candidates = []
+    for name, client in clients.items():
+        urls = [client['default_url']] + DEFAULT_URLS.get(name.lower(), [])
+        for url in urls:
+            if (name, client, url) not in candidates:
+                candidates.append((name, client, url))
+    if preferred:
+        for candidate in candidates:
+            if (candidate[0], candidate[2]) == tuple(preferred):
+                candidates.remove(candidate)
+                candidates.insert(0, candidate)
+                break
+        else:
+            if preferred[0] in clients:
+                candidates.insert(0, (preferred[0], clients[preferred[0]], preferred[1]))
+    return candidates
+
+
+def probe(candidate, timeout, results):
+    '''
+    Probes one (name, client, url) candidate and puts a result dict on the
+    `results` queue, or None when the daemon did not answer.
+    '''
+    name, client, url = candidate
+    started = time.time()
+    try:
+        PROBES[name.lower()](url, timeout)
+    except Exception, e:
+        print "Probe of %s at %s failed: %s" % (name, url, e)
+        results.put(None)
+        return
+    results.put({
+        'name': name,
+        'client': client,
+        'url': url,
+        'latency': time.time() - started,
+    })
+
+
+def probe_all(candidates, timeout, first=False):
+    '''
+    Probes all candidates in parallel and returns the healthy ones, fastest first.
+    Gives up on the stragglers after `timeout` seconds. With `first`, returns as
+    soon as one candidate answers.
+    '''
+    results = Queue.Queue()
+    for candidate in candidates:
+        thread = threading.Thread(target=probe, args=(candidate, timeout, results))
+        # Probes that hang past the deadline must not keep the app alive.
+        thread.setDaemon(True)
+        thread.start()
+
+    found = []
+    pending = len(candidates)
+    deadline = time.time() + timeout
+    while pending:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            break
+        try:
+            result = results.get(True, remaining)
+        except Queue.Empty:
+            break
+        pending -= 1
+        if result:
+            found.append(result)
+            if first:
+                break
+    found.sort(key=lambda result: result['latency'])
+    return found
+
+
+def detect_clients(clients, timeout=2.0, first=False, preferred=None):
+    '''
+    Looks for running torrent clients.
+
+    Arguments:
+        clients: A `TORRENT_CLIENTS` style dict of client name to client info
+        timeout: Seconds to wait for the daemons to answer
+        first: Return as soon as one client is found instead of ranking all of them
+        preferred: The last known-good (name, url), probed on its own before the rest
+
+    Returns a list of dicts with 'name', 'client', 'url' and 'latency' keys, fastest
+    first.
+    '''
+    candidates = get_candidates(clients, preferred)
+    if preferred and candidates and first:
+        found = probe_all(candidates[:1], timeout, first=True)
+        if found:
+            return found
+        candidates = candidates[1:]
+    return probe_all(candidates, timeout, first)
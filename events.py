@@ -0,0 +1,145 @@
+import threading
+
+
+# Event types, the 'type' of the event dicts passed to subscribers.
+ADDED = 'added'
+REMOVED = 'removed'
+STATE_CHANGED = 'state_changed'
+COMPLETED = 'completed'
+PROGRESS = 'progress'
+RATE_CHANGED = 'rate_changed'
+
+EVENT_TYPES = (ADDED, REMOVED, STATE_CHANGED, COMPLETED, PROGRESS, RATE_CHANGED)
+
+
+class EventBus(object):
+    '''
+    Turns the snapshots of a TorrentUI's poll loop into change events for
+    subscribers, so they do not need to fetch and compare torrents themselves.
+
+    Every published snapshot is diffed against the previous one once, and each
+    event is passed to the subscribers whose filters match it. Events are dicts with
+    'type', 'id', 'torrent' (the current torrent dict, the last known one for
+    REMOVED) and 'previous' (the torrent dict of the previous snapshot, None for
+    ADDED) keys, plus:
+        STATE_CHANGED: 'status' and 'previous_status'
+        PROGRESS: 'threshold', the percentage crossed
+        RATE_CHANGED: 'rate_download' and 'rate_upload' in bytes per second
+
+    The first snapshot is the baseline and raises no events. Nothing is diffed
+    while there are no subscribers.
+
+    Arguments:
+        thresholds: Percentages raising a PROGRESS event when crossed
+        rate_change: Relative rate change raising a RATE_CHANGED event
+        min_rate_change: Smallest absolute rate change, in bytes per second, that
+        counts
+    '''
+    def __init__(self, thresholds=(25, 50, 75), rate_change=0.5, min_rate_change=10240):
+        self.thresholds = thresholds
+        self.rate_change = rate_change
+        self.min_rate_change = min_rate_change
+        self.lock = threading.Lock()
+        self.subscribers = []
+        # Torrent id -> torrent dict of the last published snapshot.
+        self.previous = None
+
+
+    def subscribe(self, callback, types=None, ids=None, test=None):
+        '''
+        Calls `callback(event)` for every event of the given `types` concerning one
+        of the torrent `ids` for which `test(event)` is true. Any filter left at None
+        matches everything. Returns the subscription to pass to `unsubscribe`.
+        '''
+        subscription = (
+            callback,
+            types is not None and set(types) or None,
+            ids is not None and set(ids) or None,
+            test
+        )
+        self.lock.acquire()
+        try:
+            self.subscribers = self.subscribers + [subscription]
+        finally:
+            self.lock.release()
+        return subscription
+
+
+    def unsubscribe(self, subscription):
+        self.lock.acquire()
+        try:
+            self.subscribers = [entry for entry in self.subscribers if entry is not subscription]
+        finally:
+            self.lock.release()
+
+
+    def publish(self, torrents):
+        '''
+        Diffs a snapshot, a list of torrent dicts, against the previous one and
+        passes the events to the matching subscribers. Returns the events.
+        '''
+        current = dict([(torrent['id'], torrent) for torrent in torrents])
+        previous = self.previous
+        self.previous = current
+        subscribers = self.subscribers
+        if previous is None or not subscribers:
+            return []
+
+        events = self.diff(previous, current)
+        for event in events:
+            for callback, types, ids, test in subscribers:
+                if types is not None and event['type'] not in types:
+                    continue
+                if ids is not None and event['id'] not in ids:
+                    continue
+                try:
+                    if test is None or test(event):
+                        callback(event)
+                except Exception, e:
+                    print "Torrent event subscriber %s failed: %s" % (callback, e)
+        return events
+
+
+    def diff(self, previous, current):
+        '''
+        Returns the events between two {id: torrent} snapshots.
+        '''
+        events = []
+        for id, torrent in current.items():
+            old = previous.get(id)
+            if old is None:
+                events.append(self.create_event(ADDED, torrent, None))
+                continue
+
+            if torrent['status'] != old['status']:
+                events.append(self.create_event(STATE_CHANGED, torrent, old,
+                    status=torrent['status'], previous_status=old['status']))
+
+            done, old_done = torrent['percent_done'], old['percent_done']
+            if old_done < 100 <= done:
+                events.append(self.create_event(COMPLETED, torrent, old))
+            for threshold in self.thresholds:
+                if old_done < threshold <= done:
+                    events.append(self.create_event(PROGRESS, torrent, old, threshold=threshold))
+
+            if self.rate_changed(old['rate_download_bytes'], torrent['rate_download_bytes']) or \
+                    self.rate_changed(old['rate_upload_bytes'], torrent['rate_upload_bytes']):
+                events.append(self.create_event(RATE_CHANGED, torrent, old,
+                    rate_download=torrent['rate_download_bytes'],
+                    rate_upload=torrent['rate_upload_bytes']))
+
+        for id, old in previous.items():
+            if id not in current:
+                events.append(self.create_event(REMOVED, old, old))
+        return events
+
+
+    def rate_changed(self, old, new):
+        change = abs(new - old)
+        return change >= self.min_rate_change and change >= self.rate_change * max(old, new)
+
+
+    def create_event(self, type, torrent, previous, **extra):
+        event = {'type': type, 'id': torrent['id'], 'torrent': torrent, 'previous': previous}
+        event.update(extra)
+        return event
@@ -0,0 +1,164 @@
+import threading
+
+
+class FileCache(object):
+    '''
+    Lazily loaded, cached file lists for the torrents of a TorrentUI.
+
+    A torrent's file list is only fetched the first time it is asked for. After that
+    the cached list is returned as long as the torrent's progress has not changed,
+    and only the per-file progress is fetched again when it has.
+
+    File priority changes are collected and sent to the daemon in one batch per
+    torrent, `delay` seconds after the last change.
+
+    Arguments:
+        ui: The TorrentUI providing `get_files`, `get_file_progress` and
+        `set_file_priorities`
+    '''
+    def __init__(self, ui, delay=2.0):
+        self.ui = ui
+        self.delay = delay
+        self.lock = threading.RLock()
+        # Torrent id -> {'files': [...], 'percent_done': <float>}
+        self.entries = {}
+        # Torrent id -> {file index: priority} waiting to be sent, and being sent.
+        self.pending = {}
+        self.sending = {}
+        self.timers = {}
+
+
+    def get(self, id, percent_done=None):
+        '''
+        Returns the file list of the torrent `id`, see `TorrentUI.get_files`.
+        `percent_done` is the torrent's current progress, the per-file progress is
+        refreshed when it differs from the progress the cache was filled at.
+        
+        Talks to the daemon on a miss, so call it off the UI thread. The cache is
+        not locked while waiting for the daemon.
+        '''
+        self.lock.acquire()
+        try:
+            entry = self.entries.get(id)
+            stale = entry is not None and percent_done is not None and \
+                percent_done != entry['percent_done']
+        finally:
+            self.lock.release()
+        
+        if entry is None:
+            files = self.ui.call_connection('get_files', id)
+        elif stale:
+            progress = self.ui.call_connection('get_file_progress', id, entry['files'])
+        
+        self.lock.acquire()
+        try:
+            if entry is None:
+                entry = self.entries.setdefault(id, {'files': files, 'percent_done': percent_done})
+            elif stale:
+                for file, done in zip(entry['files'], progress):
+                    file['done_bytes'] = done
+                entry['percent_done'] = percent_done
+            return self.apply_pending(id, entry)
+        finally:
+            self.lock.release()
+
+
+    def get_cached(self, id):
+        '''
+        Returns the cached file list of the torrent `id` as it is, or None when it
+        was not loaded yet. Never talks to the daemon.
+        '''
+        self.lock.acquire()
+        try:
+            entry = self.entries.get(id)
+            if entry is None:
+                return None
+            return self.apply_pending(id, entry)
+        finally:
+            self.lock.release()
+
+
+    def apply_pending(self, id, entry):
+        # Show the changes the daemon may not have made yet, a list fetched while
+        # they were sent can predate them.
+        for changes in (self.sending.get(id, {}), self.pending.get(id, {})):
+            for index, priority in changes.items():
+                entry['files'][index]['priority'] = priority
+        return entry['files']
+
+
+    def invalidate(self, id=None):
+        '''
+        Drops the cached file list of the torrent `id`, or of all torrents.
+        '''
+        self.lock.acquire()
+        try:
+            if id is None:
+                self.entries = {}
+            elif id in self.entries:
+                del self.entries[id]
+        finally:
+            self.lock.release()
+
+
+    def prune(self, ids):
+        '''
+        Drops the cached file lists of torrents that are not in `ids` any more.
+        '''
+        self.lock.acquire()
+        try:
+            for id in self.entries.keys():
+                if id not in ids:
+                    del self.entries[id]
+        finally:
+            self.lock.release()
+
+
+    def set_priority(self, id, index, priority):
+        '''
+        Queues a priority change ('skip', 'low', 'normal' or 'high') for file
+        `index` of the torrent `id`.
+        '''
+        self.lock.acquire()
+        try:
+            self.pending.setdefault(id, {})[index] = priority
+            if id in self.entries:
+                self.entries[id]['files'][index]['priority'] = priority
+            timer = self.timers.get(id)
+            if timer:
+                timer.cancel()
+            timer = self.timers[id] = threading.Timer(self.delay, self.flush, (id,))
+            timer.setDaemon(True)
+            timer.start()
+        finally:
+            self.lock.release()
+
+
+    def flush(self, id):
+        '''
+        Sends the queued priority changes of the torrent `id` in one batch. The
+        cached file list is dropped if the daemon rejects them.
+        '''
+        self.lock.acquire()
+        try:
+            priorities = self.pending.pop(id, None)
+            self.timers.pop(id, None)
+            if priorities:
+                self.sending[id] = priorities
+        finally:
+            self.lock.release()
+        if not priorities:
+            return
+        try:
+            try:
+                self.ui.call_connection('set_file_priorities', id, priorities)
+            except Exception, e:
+                print "Setting file priorities of %s failed: %s" % (id, e)
+                self.invalidate(id)
+        finally:
+            self.lock.acquire()
+            try:
+                if self.sending.get(id) is priorities:
+                    del self.sending[id]
+            finally:
+                self.lock.release()
@@ -0,0 +1,47 @@
+import zlib
+
+
+# Sent with every request of the HTTP based client transports.
+ACCEPT_ENCODING = 'gzip, deflate'
+
+# Bytes read from the socket at a time while decompressing.
+CHUNK_SIZE = 16384
+
+
+def read_response(response, encoding=None):
+    '''
+    Reads the body of an httplib/urllib2 response, decompressing it chunk by chunk
+    as it arrives when the server used gzip or deflate. Returns a (body, wire_bytes)
+    tuple, `wire_bytes` being the size before decompression.
+
+    Arguments:
+        response: The response object, anything with a read(size) method
+        encoding: The response's Content-Encoding header, if any
+    '''
+    encoding = (encoding or '').strip().lower()
+    if encoding not in ('gzip', 'x-gzip', 'deflate'):
+        data = response.read()
+        return data, len(data)
+
+    if encoding == 'deflate':
+        decoder = zlib.decompressobj()
+    else:
+        # The extra 16 makes zlib expect a gzip header and trailer.
+        decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    parts = []
+    wire_bytes = 0
+    while True:
+        chunk = response.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        try:
+            parts.append(decoder.decompress(chunk))
+        except zlib.error:
+            if encoding != 'deflate' or wire_bytes:
+                raise
+            # Some servers send raw deflate data without the zlib header.
+            decoder = zlib.decompressobj(-zlib.MAX_WBITS)
+            parts.append(decoder.decompress(chunk))
+        wire_bytes += len(chunk)
+    parts.append(decoder.flush())
+    return ''.join(parts), wire_bytes
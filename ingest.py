@@ -0,0 +1,130 @@
+import os, time
+from bencode import BencodeError, parse_torrent
+
+
+class Ingester(object):
+    '''
+    Adds .torrent files to a TorrentUI's daemon, skipping the ones it already has.
+
+    Every file is parsed locally first. Files whose info hash is already in the
+    last snapshot, or earlier in the same batch, are dropped before anything is
+    sent. The new ones are added in one `add_torrents` batch.
+
+    With a `watch_folder`, `update` adds the .torrent files dropped in it. It is
+    called on every poll and only lists the folder once its modification time
+    changed. Files dropped in the same tick of the file system's clock as the last
+    listing do not change it, so the folder is also listed while the last listing
+    began within `granularity` seconds of the modification time. Handled files are
+    renamed with an '.added', '.duplicate' or
+    '.invalid' suffix. Files of a batch the daemon did not take are left in place
+    and tried again on the next poll.
+
+    Arguments:
+        ui: The TorrentUI whose `add_torrents` and `get_info_hashes` are used
+        watch_folder: The folder to take .torrent files from, None for no folder
+    '''
+    # Seconds between two distinct modification times, FAT only keeps even seconds.
+    granularity = 2.0
+
+
+    def __init__(self, ui, watch_folder=None):
+        self.ui = ui
+        self.watch_folder = watch_folder
+        # Modification time of the watch folder when it was last listed.
+        self.mtime = None
+        # When the last listing began.
+        self.listed_at = None
+
+
+    @classmethod
+    def from_config(cls, ui, get_setting):
+        '''
+        Creates an ingester watching the 'watch_folder' config value, read with
+        `get_setting`.
+        '''
+        return cls(ui, get_setting('watch_folder') or None)
+
+
+    def is_enabled(self):
+        return self.watch_folder is not None
+
+
+    def update(self):
+        '''
+        Adds the .torrent files in the watch folder when it changed. Returns the
+        parsed torrents that were added.
+        '''
+        if not self.is_enabled():
+            return []
+        try:
+            mtime = os.stat(self.watch_folder).st_mtime
+            if mtime == self.mtime and self.listed_at - mtime >= self.granularity:
+                return []
+            self.listed_at = time.time()
+            names = [name for name in os.listdir(self.watch_folder)
+                     if name.lower().endswith('.torrent')]
+        except OSError, e:
+            print "Listing watch folder %s failed: %s" % (self.watch_folder, e)
+            return []
+        names.sort()
+
+        added = self.ingest([os.path.join(self.watch_folder, name) for name in names])
+        if added is None:
+            # Retry on the next poll.
+            self.mtime = None
+            return []
+        # Renaming the files changed the folder.
+        try:
+            self.mtime = os.stat(self.watch_folder).st_mtime
+        except OSError:
+            self.mtime = None
+        return added
+
+
+    def ingest(self, paths, rename=True):
+        '''
+        Adds the .torrent files in `paths` that are new to the daemon. Returns the
+        parsed torrents that were added, see `bencode.parse_torrent`, or None when
+        the daemon did not take them. With `rename` the files are renamed after the
+        outcome.
+        '''
+        known = self.ui.get_info_hashes()
+        batch = []
+        for path in paths:
+            try:
+                f = open(path, 'rb')
+                try:
+                    data = f.read()
+                finally:
+                    f.close()
+                torrent = parse_torrent(data)
+            except (IOError, BencodeError), e:
+                print "Skipping invalid torrent file %s: %s" % (path, e)
+                if rename:
+                    self.rename(path, '.invalid')
+                continue
+            if torrent['info_hash'] in known:
+                if rename:
+                    self.rename(path, '.duplicate')
+                continue
+            known.add(torrent['info_hash'])
+            batch.append((path, data, torrent))
+
+        if not batch:
+            return []
+        try:
+            self.ui.call_connection('add_torrents', [data for path, data, torrent in batch])
+        except Exception, e:
+            print "Adding torrents failed: %s" % e
+            return None
+        if rename:
+            for path, data, torrent in batch:
+                self.rename(path, '.added')
+        return [torrent for path, data, torrent in batch]
+
+
+    def rename(self, path, suffix):
+        try:
+            os.rename(path, path + suffix)
+        except OSError, e:
+            print "Renaming %s failed: %s" % (path, e)
@@ -0,0 +1,135 @@
+import time, threading
+
+
+class RPCStats(object):
+    '''
+    Collects per-method statistics for the requests the torrent client transports
+    send to their daemons: call counts, a latency histogram, request/response byte
+    sizes and error counts. Response sizes are kept both as sent over the wire and
+    after decompression.
+
+    Recording is switched off by default. While disabled the transports only pay for
+    a single attribute check per request, see `start`.
+    '''
+    # Upper bounds of the latency histogram buckets, in milliseconds. Anything slower
+    # than the last bound lands in an extra overflow bucket.
+    buckets = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.methods = {}
+
+
+    def enable(self):
+        self.enabled = True
+
+
+    def disable(self):
+        self.enabled = False
+
+
+    def reset(self):
+        self.lock.acquire()
+        try:
+            self.methods = {}
+        finally:
+            self.lock.release()
+
+
+    def start(self):
+        '''
+        Returns a start time for a request, or None when recording is disabled.
+        Transports pass the value back to `record` once the request is done.
+        '''
+        if self.enabled:
+            return time.time()
+        return None
+
+
+    def record(self, client, method, started, sent=0, received=0, error=False, decoded=None):
+        '''
+        Records one request. `started` is the value returned by `start`, nothing
+        is recorded if it is None. `received` is the response size on the wire and
+        `decoded` its size after decompression, the same as `received` if not given.
+        '''
+        if started is None:
+            return
+        if decoded is None:
+            decoded = received
+        elapsed = (time.time() - started) * 1000.0
+        bucket = len(self.buckets)
+        for index, bound in enumerate(self.buckets):
+            if elapsed <= bound:
+                bucket = index
+                break
+        key = (client, method)
+        self.lock.acquire()
+        try:
+            entry = self.methods.get(key)
+            if entry is None:
+                entry = self.methods[key] = {
+                    'client': client,
+                    'method': method,
+                    'calls': 0,
+                    'errors': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'bytes_sent': 0,
+                    'bytes_received': 0,
+                    'bytes_decoded': 0,
+                    'histogram': [0] * (len(self.buckets) + 1),
+                }
+            entry['calls'] += 1
+            entry['total_ms'] += elapsed
+            entry['max_ms'] = max(entry['max_ms'], elapsed)
+            entry['bytes_sent'] += sent
+            entry['bytes_received'] += received
+            entry['bytes_decoded'] += decoded
+            entry['histogram'][bucket] += 1
+            if error:
+                entry['errors'] += 1
+        finally:
+            self.lock.release()
+
+
+    def get_stats(self):
+        '''
+        Returns a list of per-method stat dicts, slowest total time first. Each dict
+        has an extra 'avg_ms' key.
+        '''
+        self.lock.acquire()
+        try:
+            stats = []
+            for entry in self.methods.values():
+                entry = dict(entry)
+                entry['histogram'] = list(entry['histogram'])
+                entry['avg_ms'] = entry['total_ms'] / entry['calls']
+                stats.append(entry)
+        finally:
+            self.lock.release()
+        stats.sort(key=lambda entry: entry['total_ms'], reverse=True)
+        return stats
+
+
+    def summary(self, limit=3):
+        '''
+        Formats the `limit` most expensive methods as a short string suitable for a
+        one line on-screen overlay.
+        '''
+        parts = []
+        for entry in self.get_stats()[:limit]:
+            parts.append('%s %s: %sx avg %.0fms max %.0fms %s err' % (
+                entry['client'],
+                entry['method'],
+                entry['calls'],
+                entry['avg_ms'],
+                entry['max_ms'],
+                entry['errors']
+            ))
+        return ' | '.join(parts)
+
+
+# Shared by every client transport.
+STATS = RPCStats()
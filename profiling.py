@@ -0,0 +1,146 @@
+import os, time, cProfile, pstats, cStringIO
+
+
+# Profile phases: name -> test of a pstats function key (file name, line, function
+# name). Time spent in a matching function counts towards the phase, unless it was
+# called from another function of the same phase.
+def is_decode(key):
+    filename, line, name = key
+    if name in ('loads', 'read_response', 'decode', 'decode_torrent'):
+        return True
+    return filename == '~' and ('zlib' in name or 'decompress' in name or 'marshal' in name)
+
+
+def is_format(key):
+    return key[2].startswith('format_')
+
+
+def is_render(key):
+    filename, line, name = key
+    return filename.endswith('renderer.py') or (filename == '~' and 'mc.' in name)
+
+
+PHASES = (('decode', is_decode), ('format', is_format), ('render (renderer and mc calls)', is_render))
+
+
+class PollProfiler(object):
+    '''
+    Profiles a number of a TorrentUI's poll cycles on demand, while the UI keeps
+    running.
+
+    `start` arms it for the next `cycles` cycles. Each cycle runs under cProfile
+    and the poll loop marks the end of its fetch, diff and render steps with
+    `mark`. After the last cycle the raw stats are dumped to a .prof file and a
+    report to a .txt file next to it: wall clock time per step, the time spent
+    decoding responses, formatting torrents and in the renderer according to the
+    profile, and the functions sorted by cumulative time.
+
+    While not armed, `begin_cycle`, `mark` and `end_cycle` only check a flag.
+
+    Arguments:
+        directory: Where reports are written
+    '''
+    def __init__(self, directory):
+        self.directory = directory
+        self.running = False
+        self.remaining = 0
+        self.cycles = 0
+        self.profile = None
+        self.steps = {}
+        self.last_mark = None
+
+
+    def start(self, cycles=5):
+        '''
+        Profiles the next `cycles` poll cycles.
+        '''
+        if self.running:
+            return
+        self.profile = cProfile.Profile()
+        self.steps = {}
+        self.cycles = self.remaining = max(1, int(cycles))
+        self.running = True
+
+
+    def begin_cycle(self):
+        if not self.running:
+            return
+        self.last_mark = time.time()
+        self.profile.enable()
+
+
+    def mark(self, step):
+        '''
+        Ends the poll step `step`, adding the time since the previous mark to it.
+        '''
+        if not self.running or self.last_mark is None:
+            return
+        now = time.time()
+        self.steps[step] = self.steps.get(step, 0.0) + now - self.last_mark
+        self.last_mark = now
+
+
+    def end_cycle(self):
+        '''
+        Ends a cycle. Returns the path of the report once the last one is done.
+        '''
+        if not self.running or self.last_mark is None:
+            return None
+        self.profile.disable()
+        self.last_mark = None
+        self.remaining -= 1
+        if self.remaining > 0:
+            return None
+        self.running = False
+        try:
+            return self.write_report()
+        except (IOError, OSError), e:
+            print "Could not write the poll profile: %s" % e
+            return None
+
+
+    def get_phase_time(self, stats, test):
+        '''
+        Returns the seconds spent in functions passing `test`, not counting calls
+        between them twice.
+        '''
+        total = 0.0
+        for key, (cc, nc, tt, ct, callers) in stats.stats.items():
+            if not test(key):
+                continue
+            if not callers:
+                total += ct
+            for caller, values in callers.items():
+                if not test(caller):
+                    # cProfile keeps (calls, primitive calls, own time, cumulative
+                    # time) per caller.
+                    total += values[3]
+        return total
+
+
+    def write_report(self):
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        base = os.path.join(self.directory, time.strftime('poll-%Y%m%d-%H%M%S'))
+        self.profile.dump_stats(base + '.prof')
+
+        output = cStringIO.StringIO()
+        stats = pstats.Stats(self.profile, stream=output)
+        output.write("Poll profile of %d cycles\n\n" % self.cycles)
+        output.write("Wall clock per cycle:\n")
+        for step in ('fetch', 'diff', 'render'):
+            if step in self.steps:
+                output.write("    %-32s %8.1f ms\n" % (step, self.steps[step] * 1000 / self.cycles))
+        output.write("\nProfiled per cycle:\n")
+        for name, test in PHASES:
+            output.write("    %-32s %8.1f ms\n" % (name, self.get_phase_time(stats, test) * 1000 / self.cycles))
+        output.write("\n")
+        stats.sort_stats('cumulative').print_stats(60)
+
+        report_file = open(base + '.txt', 'w')
+        try:
+            report_file.write(output.getvalue())
+        finally:
+            report_file.close()
+        print "Poll profile written to %s.txt" % base
+        return base + '.txt'
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+try:
+    import simplejson as json
+except ImportError:
+    import json
+import urllib, urllib2, cookielib
+from instrumentation import STATS
+from http_compression import ACCEPT_ENCODING, read_response
+
+
+class QBittorrentClientFailure(Exception):
+    # The HTTP status when the WebUI refused the request.
+    code = None
+
+
+class QBittorrentClient(object):
+    '''
+    Client for the qBittorrent Web API (v2). The session cookie from `login` is
+    kept for all later requests, and renewed once a request is refused for an
+    expired session.
+
+    Arguments:
+        url: Address of the WebUI, like 'http://localhost:8080'
+        username: WebUI user name
+        password: WebUI password
+        timeout: Seconds to wait on every request, None blocks
+    '''
+    def __init__(self, url='http://localhost:8080', username='admin', password='', timeout=None):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.opener = urllib2.build_opener(urllib2.HTTPCookieProcessor(cookielib.CookieJar()))
+        self.username = username
+        self.password = password
+        self.login()
+
+
+    def request(self, path, params=None, data=None, content_type=None, relogin=True):
+        '''
+        Calls the API method at `path`, a GET unless there are `data` or `params` to
+        POST. Returns the decoded JSON response, or the raw text when it is not JSON.
+        With `relogin`, a request refused with a 403 logs in again and is retried
+        once.
+        '''
+        url = '%s/api/v2/%s' % (self.url, path)
+        if data is None and params is not None:
+            data = urllib.urlencode(params)
+            content_type = 'application/x-www-form-urlencoded'
+        request = urllib2.Request(url, data)
+        # Requests without a matching Referer are refused as cross-site.
+        request.add_header('Referer', self.url)
+        request.add_header('Accept-Encoding', ACCEPT_ENCODING)
+        if content_type:
+            request.add_header('Content-Type', content_type)
+
+        sent = len(url) + len(data or '')
+        started = STATS.start()
+        try:
+            response = self.opener.open(request, timeout=self.timeout)
+            body, received = read_response(response, response.info().getheader('Content-Encoding'))
+        except urllib2.HTTPError, e:
+            STATS.record('qbittorrent', path, started, sent, error=True)
+            if e.code == 403 and relogin and path != 'auth/login':
+                # The session expired or the WebUI restarted.
+                self.login()
+                return self.request(path, data=data, content_type=content_type, relogin=False)
+            failure = QBittorrentClientFailure('HTTPError: %s' % e.code)
+            failure.code = e.code
+            raise failure
+        except:
+            STATS.record('qbittorrent', path, started, sent, error=True)
+            raise
+        STATS.record('qbittorrent', path, started, sent, received, decoded=len(body))
+
+        if body[:1] in ('{', '['):
+            return json.loads(body)
+        return body
+
+
+    def login(self):
+        if self.request('auth/login', {'username': self.username, 'password': self.password}) != 'Ok.':
+            raise QBittorrentClientFailure("qBittorrent rejected the login for %s" % self.username)
+
+
+    def sync_maindata(self, rid=0):
+        '''
+        Returns the changes since the response with id `rid`, everything for 0.
+        '''
+        return self.request('sync/maindata?rid=%d' % rid)
+
+
+    def torrents_action(self, action, hashes, **params):
+        '''
+        Runs a torrents/<action> method on the `hashes` list, or on all torrents
+        when it is 'all'.
+        '''
+        if hashes != 'all':
+            hashes = '|'.join(hashes)
+        params['hashes'] = hashes
+        return self.request('torrents/%s' % action, params)
+
+
+    def torrents_start(self, hashes):
+        # qBittorrent 5 renamed resume to start, older versions answer 404 for it.
+        try:
+            return self.torrents_action('start', hashes)
+        except QBittorrentClientFailure, e:
+            if e.code != 404:
+                raise
+            return self.torrents_action('resume', hashes)
+
+
+    def torrents_stop(self, hashes):
+        try:
+            return self.torrents_action('stop', hashes)
+        except QBittorrentClientFailure, e:
+            if e.code != 404:
+                raise
+            return self.torrents_action('pause', hashes)
+
+
+    def torrents_properties(self, torrent_hash):
+        return self.request('torrents/properties?hash=%s' % torrent_hash)
+
+
+    def torrents_files(self, torrent_hash):
+        return self.request('torrents/files?hash=%s' % torrent_hash)
+
+
+    def torrents_piece_states(self, torrent_hash):
+        '''
+        Returns one state per piece: 0 missing, 1 downloading, 2 downloaded.
+        '''
+        return self.request('torrents/pieceStates?hash=%s' % torrent_hash)
+
+
+    def torrents_file_prio(self, torrent_hash, indexes, priority):
+        return self.request('torrents/filePrio', {
+            'hash': torrent_hash,
+            'id': '|'.join([str(index) for index in indexes]),
+            'priority': priority
+        })
+
+
+    def transfer_set_limits(self, download, upload):
+        '''
+        Sets the global limits in bytes per second, 0 is unlimited.
+        '''
+        self.request('transfer/setDownloadLimit', {'limit': download})
+        self.request('transfer/setUploadLimit', {'limit': upload})
+
+
+    def torrents_add(self, torrents):
+        '''
+        Uploads the .torrent file contents in the `torrents` list in one request.
+        '''
+        boundary = '---------------------------22385145923439'
+        parts = []
+        for index, torrent in enumerate(torrents):
+            parts.append('--%s\r\n'
+                         'Content-Disposition: form-data; name="torrents"; filename="%d.torrent"\r\n'
+                         'Content-Type: application/x-bittorrent\r\n\r\n%s\r\n' % (boundary, index, torrent))
+        parts.append('--%s--\r\n' % boundary)
+        return self.request('torrents/add', data=''.join(parts),
+                            content_type='multipart/form-data; boundary=%s' % boundary)
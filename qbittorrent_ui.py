@@ -0,0 +1,236 @@
+import posixpath
+from torrent_ui import TorrentUI, TorrentUIError
+from qbittorrent_client import QBittorrentClient
+
+
+class QBittorrentUI(TorrentUI):
+    '''
+    TorrentUI subclass for the qBittorrent client.
+
+    Polls sync/maindata, which only returns the torrent and server state fields
+    that changed since the previous response id. The changes are merged into a
+    local table of every torrent's fields, snapshots are built from that table.
+    '''
+    # qBittorrent torrent states.
+    states = {
+        'downloading': 'Downloading',
+        'forcedDL': 'Downloading',
+        'stalledDL': 'Downloading',
+        'metaDL': 'Downloading',
+        'forcedMetaDL': 'Downloading',
+        'queuedDL': 'Downloading',
+        'checkingDL': 'Downloading',
+        'allocating': 'Downloading',
+        'uploading': 'Seeding',
+        'forcedUP': 'Seeding',
+        'stalledUP': 'Seeding',
+        'queuedUP': 'Seeding',
+        'checkingUP': 'Seeding',
+        'pausedDL': 'Paused',
+        'pausedUP': 'Paused',
+        'stoppedDL': 'Paused',
+        'stoppedUP': 'Paused'
+    }
+
+    # File priorities of torrents/files. qBittorrent has no low file priority.
+    file_priorities = {0: 'skip', 1: 'normal', 6: 'high', 7: 'high'}
+    file_priority_values = {'skip': 0, 'low': 1, 'normal': 1, 'high': 6}
+
+    # eta of torrents that will not finish.
+    infinite_eta = 8640000
+
+
+    def __init__(self, connection, renderer=None, backend=False):
+        super(QBittorrentUI, self).__init__(connection, renderer, backend)
+        # Id of the last sync/maindata response, 0 asks for everything.
+        self.rid = 0
+        # Torrent hash -> all fields received for it so far.
+        self.table = {}
+        self.server_state = {}
+
+
+    def sync(self):
+        '''
+        Fetches the changes since the last sync and merges them into the table.
+        '''
+        data = self.connection.sync_maindata(self.rid)
+        if data.get('full_update'):
+            self.table = {}
+        for hash, fields in data.get('torrents', {}).items():
+            self.table.setdefault(hash, {}).update(fields)
+        for hash in data.get('torrents_removed', []):
+            self.table.pop(hash, None)
+        self.server_state.update(data.get('server_state', {}))
+        self.rid = data['rid']
+
+
+    def get_status_name(self, state):
+        return self.states.get(state, 'Unknown')
+
+
+    def get_snapshot(self):
+        self.sync()
+        torrents = [self.format_torrent(hash, torrent_data) for hash, torrent_data in self.table.items()]
+        return torrents, self.format_status(self.server_state.get('dl_info_speed', 0),
+                                            self.server_state.get('up_info_speed', 0))
+
+
+    def get_torrents(self):
+        return self.get_snapshot()[0]
+
+
+    def get_details(self, ids):
+        # The table is as fresh as the summary the ids come from.
+        return [self.format_torrent(id, self.table[id]) for id in ids if id in self.table]
+
+
+    def format_torrent(self, hash, torrent_data):
+        total = torrent_data.get('size', 0)
+        left = torrent_data.get('amount_left', 0)
+
+        estimated_time = ''
+        eta = torrent_data.get('eta', self.infinite_eta)
+        if 0 < eta < self.infinite_eta:
+            estimated_time = self.format_time(eta)
+
+        return {
+            'id': str(hash),
+            'label': torrent_data.get('name', '').encode('utf-8'),
+            'status': self.get_status_name(torrent_data.get('state')),
+            'size_total': self.format_filesize(total),
+            'size_downloaded': self.format_filesize(total - left),
+            'size_uploaded': self.format_filesize(torrent_data.get('uploaded', 0)),
+            'percent_done': torrent_data.get('progress', 0) * 100,
+            'estimated_time': estimated_time,
+            'peers_connected': torrent_data.get('num_seeds', 0) + torrent_data.get('num_leechs', 0),
+            'peers_incoming': torrent_data.get('num_seeds', 0),
+            'peers_outgoing': torrent_data.get('num_leechs', 0),
+            'rate_download': self.format_filesize(torrent_data.get('dlspeed', 0)),
+            'rate_upload': self.format_filesize(torrent_data.get('upspeed', 0)),
+            'rate_download_bytes': torrent_data.get('dlspeed', 0),
+            'rate_upload_bytes': torrent_data.get('upspeed', 0),
+            'size_left_bytes': left,
+            'ratio': str(round(torrent_data.get('ratio', 0), 3)),
+            'category': torrent_data.get('category', '').encode('utf-8'),
+            'tracker': self.get_tracker_host([torrent_data.get('tracker', '')]),
+            'downloaded_bytes': torrent_data.get('downloaded', 0),
+            'uploaded_bytes': torrent_data.get('uploaded', 0)
+        }
+
+
+    def check_response(self, response):
+        '''
+        Raises TorrentUIError when qBittorrent refused a request.
+        '''
+        if response == 'Fails.':
+            raise TorrentUIError("qBittorrent refused the request.")
+        return response
+
+
+    def get_files(self, id):
+        files = []
+        for index, file_data in enumerate(self.connection.torrents_files(id)):
+            files.append(self.format_file(index, file_data['name'].encode('utf-8'), file_data['size'],
+                int(file_data['size'] * file_data['progress']),
+                self.file_priorities.get(file_data['priority'], 'normal')))
+        return files
+
+
+    def set_file_priorities(self, id, priorities):
+        # One request per distinct priority, each covering all its files.
+        indexes = {}
+        for index, priority in priorities.items():
+            indexes.setdefault(self.file_priority_values[priority], []).append(index)
+        for value, files in indexes.items():
+            self.check_response(self.connection.torrents_file_prio(id, files, value))
+
+
+    def set_sequential(self, id, index, enabled=True):
+        # Both are toggles, only flip the ones that differ. The table is updated
+        # right away, a toggle right after this must not go by the last sync.
+        torrent_data = self.table.get(id, {})
+        for field, action in (('seq_dl', 'toggleSequentialDownload'),
+                              ('f_l_piece_prio', 'toggleFirstLastPiecePrio')):
+            if bool(torrent_data.get(field)) != enabled:
+                self.check_response(self.connection.torrents_action(action, [id]))
+                torrent_data[field] = enabled
+        return True
+
+
+    def get_file_pieces(self, id, index):
+        states = self.connection.torrents_piece_states(id)
+        piece_size = self.connection.torrents_properties(id)['piece_size']
+        sizes = [file_data['size'] for file_data in self.connection.torrents_files(id)]
+        bitfield = [0] * ((len(states) + 7) / 8)
+        for piece, state in enumerate(states):
+            if state == 2:
+                bitfield[piece >> 3] |= 0x80 >> (piece & 7)
+        return ''.join(map(chr, bitfield)), piece_size, sum(sizes[:index]), sizes[index]
+
+
+    def get_file_path(self, id, index):
+        save_path = self.connection.torrents_properties(id)['save_path']
+        name = self.connection.torrents_files(id)[index]['name']
+        return posixpath.join(save_path, name).encode('utf-8')
+
+
+    def start_torrent(self, id=False):
+        self.start_torrents(id and [id] or 'all')
+
+
+    def stop_torrent(self, id=False):
+        self.stop_torrents(id and [id] or 'all')
+
+
+    def delete_torrent(self, id, files=False):
+        self.delete_torrents(id and [id] or 'all', files)
+
+
+    def start_torrents(self, ids):
+        if ids:
+            self.check_response(self.connection.torrents_start(ids))
+
+
+    def stop_torrents(self, ids):
+        if ids:
+            self.check_response(self.connection.torrents_stop(ids))
+
+
+    def delete_torrents(self, ids, files=False):
+        if ids:
+            self.check_response(self.connection.torrents_action('delete', ids,
+                deleteFiles=files and 'true' or 'false'))
+
+
+    def add_torrents(self, torrents):
+        if torrents:
+            self.check_response(self.connection.torrents_add(torrents))
+
+
+    def set_priority(self, ids, priority):
+        # Only the queue position can be changed, and only with queueing enabled.
+        if priority == 'high':
+            self.check_response(self.connection.torrents_action('topPrio', ids))
+        elif priority == 'low':
+            self.check_response(self.connection.torrents_action('bottomPrio', ids))
+
+
+    def set_speed_limits(self, download=None, upload=None):
+        # Limits are in bytes per second, 0 is unlimited.
+        self.connection.transfer_set_limits(download or 0, upload or 0)
+
+
+    def set_torrent_speed_limits(self, limits):
+        # One request per distinct limit and direction.
+        for direction, position in (('setDownloadLimit', 0), ('setUploadLimit', 1)):
+            groups = {}
+            for id, pair in limits.items():
+                groups.setdefault(pair[position] or 0, []).append(id)
+            for limit, ids in groups.items():
+                self.check_response(self.connection.torrents_action(direction, ids, limit=limit))
+
+
+    @classmethod
+    def connect(cls, url, username='', password='', **options):
+        # The WebUI's default account is 'admin'.
+        return cls(QBittorrentClient(url, username or 'admin', password), **options)
@@ -0,0 +1,182 @@
+import time
+
+
+# Queue order of the torrent priorities, torrents without one count as 'normal'.
+PRIORITY_ORDER = {'high': 0, 'normal': 1, 'low': 2}
+
+
+class QueueManager(object):
+    '''
+    Keeps a TorrentUI's daemon busy with torrents that actually transfer, working
+    on the snapshots of the poll loop.
+
+    A download is stalled while it has no connected peers or downloads slower than
+    `stall_rate`. Once it has been stalled for `grace` seconds it is paused and
+    queued. At most `max_downloads` torrents download and `max_seeds` seed at a
+    time, the slowest ones over the limit are paused and queued too. Free slots are
+    filled from the queue in the order of the torrents' 'priority', high first.
+    Within a priority, torrents that stalled the fewest times go first, then the
+    ones waiting longest. A stalled torrent is only retried after another `grace`
+    seconds.
+
+    The manager only ever starts torrents it paused itself, torrents paused by the
+    user are left alone. Starts and stops are sent in one batch each per poll.
+
+    Arguments:
+        ui: The TorrentUI whose `start_torrents` and `stop_torrents` are used
+        max_downloads: Most torrents downloading at once, None for no limit
+        max_seeds: Most torrents seeding at once, None for no limit
+        grace: Seconds a download may stall, and a stalled one waits, before the
+        manager acts on it. None never pauses stalled downloads.
+        stall_rate: Download rate, in bytes per second, below which a torrent counts
+        as stalled
+    '''
+    def __init__(self, ui, max_downloads=None, max_seeds=None, grace=None, stall_rate=1024):
+        self.ui = ui
+        self.max_downloads = max_downloads
+        self.max_seeds = max_seeds
+        self.grace = grace
+        self.stall_rate = stall_rate
+        # Torrent id -> time it started stalling, or was started by the manager.
+        self.stalled_since = {}
+        self.started_at = {}
+        # Torrent id -> number of times it was paused for stalling.
+        self.stalls = {}
+        # Torrent id -> {'queued_at': <time>, 'retry_at': <time>, 'seed': <bool>,
+        # 'priority': <string>} for the torrents the manager paused.
+        self.queued = {}
+
+
+    @classmethod
+    def from_config(cls, ui, get_setting):
+        '''
+        Creates a manager from the 'queue_max_downloads', 'queue_max_seeds' and
+        'queue_stall_grace' config values, read with `get_setting`. Missing or empty
+        values are None, '0' is a limit of 0.
+        '''
+        values = []
+        for name in ('queue_max_downloads', 'queue_max_seeds', 'queue_stall_grace'):
+            value = get_setting(name)
+            if value is None or value == '':
+                values.append(None)
+            else:
+                values.append(int(value))
+        return cls(ui, *values)
+
+
+    def is_enabled(self):
+        return self.max_downloads is not None or self.max_seeds is not None or \
+            self.grace is not None or bool(self.queued)
+
+
+    def is_stalled(self, torrent):
+        return torrent.get('peers_connected', 1) == 0 or \
+            torrent['rate_download_bytes'] < self.stall_rate
+
+
+    def update(self, torrents, now=None):
+        '''
+        Works out the torrents to pause and start from a snapshot and sends the
+        actions. Returns the (started ids, stopped ids) lists.
+        '''
+        if not self.is_enabled():
+            return [], []
+        if now is None:
+            now = time.time()
+
+        current = {}
+        downloading = []
+        seeding = []
+        for torrent in torrents:
+            id = torrent['id']
+            current[id] = True
+            if self.ui.actions.is_pending(id):
+                continue
+            if torrent['status'] == 'Downloading':
+                downloading.append(torrent)
+            elif torrent['status'] == 'Seeding':
+                seeding.append(torrent)
+            if torrent['status'] != 'Paused':
+                # Running again, whether the manager or the user started it.
+                self.queued.pop(id, None)
+            elif id in self.queued:
+                # Priorities may change while queued.
+                self.queued[id]['priority'] = torrent.get('priority', 'normal')
+        for state in (self.stalled_since, self.started_at, self.stalls, self.queued):
+            for id in state.keys():
+                if id not in current:
+                    del state[id]
+
+        stop = []
+        active = []
+        for torrent in downloading:
+            id = torrent['id']
+            if not self.is_stalled(torrent):
+                self.stalled_since.pop(id, None)
+                active.append(torrent)
+                continue
+            since = max(self.stalled_since.setdefault(id, now), self.started_at.get(id, 0))
+            if self.grace is not None and now - since >= self.grace:
+                stop.append(torrent)
+                self.queue(torrent, now, stalled=True)
+            else:
+                active.append(torrent)
+
+        # Over the limits, the slowest torrents make room.
+        active.sort(key=lambda torrent: torrent['rate_download_bytes'], reverse=True)
+        if self.max_downloads is not None:
+            for torrent in active[self.max_downloads:]:
+                stop.append(torrent)
+                self.queue(torrent, now)
+            active = active[:self.max_downloads]
+        seeding.sort(key=lambda torrent: torrent['rate_upload_bytes'], reverse=True)
+        if self.max_seeds is not None:
+            for torrent in seeding[self.max_seeds:]:
+                stop.append(torrent)
+                self.queue(torrent, now, seed=True)
+            seeding = seeding[:self.max_seeds]
+
+        start = []
+        stopping = dict([(torrent['id'], True) for torrent in stop])
+        candidates = [(PRIORITY_ORDER.get(entry['priority'], 1), self.stalls.get(id, 0),
+                       entry['queued_at'], id, entry)
+                      for id, entry in self.queued.items()
+                      if id not in stopping and entry['retry_at'] <= now]
+        candidates.sort()
+        free_downloads = free_seeds = len(candidates)
+        if self.max_downloads is not None:
+            free_downloads = self.max_downloads - len(active)
+        if self.max_seeds is not None:
+            free_seeds = self.max_seeds - len(seeding)
+        for order, stalls, queued_at, id, entry in candidates:
+            if entry['seed'] and free_seeds > 0:
+                free_seeds -= 1
+            elif not entry['seed'] and free_downloads > 0:
+                free_downloads -= 1
+            else:
+                continue
+            start.append(id)
+
+        stop_ids = [torrent['id'] for torrent in stop]
+        try:
+            if stop_ids:
+                self.ui.call_connection('stop_torrents', stop_ids)
+            if start:
+                self.ui.call_connection('start_torrents', start)
+        except Exception, e:
+            print "Queue manager actions failed: %s" % e
+            return [], []
+        for id in start:
+            self.started_at[id] = now
+            self.stalled_since.pop(id, None)
+        return start, stop_ids
+
+
+    def queue(self, torrent, now, stalled=False, seed=False):
+        id = torrent['id']
+        entry = self.queued.setdefault(id, {'queued_at': now, 'retry_at': now, 'seed': seed})
+        entry['priority'] = torrent.get('priority', 'normal')
+        if stalled:
+            self.stalls[id] = self.stalls.get(id, 0) + 1
+            entry['retry_at'] = now + self.grace
+        self.stalled_since.pop(id, None)
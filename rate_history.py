@@ -0,0 +1,117 @@
+from array import array
+
+
+class RateHistory(object):
+    '''
+    Keeps the last `samples` download and upload rates of every torrent in ring
+    buffers inside one preallocated block of doubles, so the memory used per torrent
+    is fixed and no per-sample objects are created.
+
+    Each torrent gets a slot of 2 * `samples` doubles, download rates first. Slots of
+    removed torrents are reused, the block only grows when all slots are taken.
+
+    Arguments:
+        samples: Number of rate samples kept per torrent
+        slots: Number of torrents to preallocate room for
+    '''
+    def __init__(self, samples=24, slots=64):
+        self.samples = samples
+        self.slots = {}
+        self.free = []
+        self.rates = array('d')
+        # Number of samples stored and next write position, per slot.
+        self.counts = array('l')
+        self.positions = array('l')
+        self.grow(slots)
+
+
+    def grow(self, slots):
+        start = len(self.counts)
+        self.rates.extend([0.0] * (slots * 2 * self.samples))
+        self.counts.extend([0] * slots)
+        self.positions.extend([0] * slots)
+        self.free.extend(range(start + slots - 1, start - 1, -1))
+
+
+    def get_slot(self, id):
+        slot = self.slots.get(id)
+        if slot is None:
+            if not self.free:
+                self.grow(len(self.counts))
+            slot = self.slots[id] = self.free.pop()
+            self.counts[slot] = 0
+            self.positions[slot] = 0
+        return slot
+
+
+    def add(self, id, rate_download, rate_upload):
+        '''
+        Records one download and upload rate sample, in bytes per second.
+        '''
+        slot = self.get_slot(id)
+        position = self.positions[slot]
+        offset = slot * 2 * self.samples
+        self.rates[offset + position] = rate_download
+        self.rates[offset + self.samples + position] = rate_upload
+        self.positions[slot] = (position + 1) % self.samples
+        if self.counts[slot] < self.samples:
+            self.counts[slot] += 1
+
+
+    def remove(self, id):
+        slot = self.slots.pop(id, None)
+        if slot is not None:
+            self.free.append(slot)
+
+
+    def prune(self, ids):
+        '''
+        Frees the slots of torrents that are not in `ids` any more.
+        '''
+        for id in self.slots.keys():
+            if id not in ids:
+                self.remove(id)
+
+
+    def get_rates(self, id):
+        '''
+        Returns the (download, upload) rate samples of a torrent as two lists, oldest
+        first. Meant for drawing sparklines.
+        '''
+        slot = self.slots.get(id)
+        if slot is None:
+            return [], []
+        count = self.counts[slot]
+        start = (self.positions[slot] - count) % self.samples
+        offset = slot * 2 * self.samples
+        order = [(start + index) % self.samples for index in range(count)]
+        download = [self.rates[offset + index] for index in order]
+        upload = [self.rates[offset + self.samples + index] for index in order]
+        return download, upload
+
+
+    def get_smoothed(self, id):
+        '''
+        Returns the (download, upload) rates of a torrent averaged over its samples,
+        newer samples weighing more. Both are 0 for unknown torrents.
+        '''
+        download, upload = self.get_rates(id)
+        if not download:
+            return 0.0, 0.0
+        weights = range(1, len(download) + 1)
+        total = float(sum(weights))
+        return (
+            sum([rate * weight for rate, weight in zip(download, weights)]) / total,
+            sum([rate * weight for rate, weight in zip(upload, weights)]) / total
+        )
+
+
+    def get_eta(self, id, bytes_left):
+        '''
+        Returns the estimated seconds until `bytes_left` are downloaded at the
+        smoothed download rate, or None while the torrent is not downloading.
+        '''
+        rate = self.get_smoothed(id)[0]
+        if rate < 1:
+            return None
+        return int(bytes_left / rate)
@@ -0,0 +1,177 @@
+import struct
+
+
+# rencode type codes, as used by Deluge's RPC.
+CHR_LIST = 59
+CHR_DICT = 60
+CHR_INT = 61
+CHR_INT1 = 62
+CHR_INT2 = 63
+CHR_INT4 = 64
+CHR_INT8 = 65
+CHR_FLOAT32 = 66
+CHR_FLOAT64 = 44
+CHR_TRUE = 67
+CHR_FALSE = 68
+CHR_NONE = 69
+CHR_TERM = 127
+
+# Small values carry their size, or value, in the type byte.
+INT_POS_FIXED_START = 0
+INT_POS_FIXED_COUNT = 44
+INT_NEG_FIXED_START = 70
+INT_NEG_FIXED_COUNT = 32
+DICT_FIXED_START = 102
+DICT_FIXED_COUNT = 25
+STR_FIXED_START = 128
+STR_FIXED_COUNT = 64
+LIST_FIXED_START = STR_FIXED_START + STR_FIXED_COUNT
+LIST_FIXED_COUNT = 64
+
+# Fixed size types: type code -> (struct format, size).
+PACKED = {
+    CHR_INT1: ('!b', 1),
+    CHR_INT2: ('!h', 2),
+    CHR_INT4: ('!l', 4),
+    CHR_INT8: ('!q', 8),
+    CHR_FLOAT32: ('!f', 4),
+    CHR_FLOAT64: ('!d', 8),
+}
+
+CONSTANTS = {CHR_TRUE: True, CHR_FALSE: False, CHR_NONE: None}
+
+
+class RencodeError(Exception): pass
+
+
+def decode_value(data, pos):
+    '''
+    Decodes the value starting at `pos` of `data`. Returns the (value, end
+    position) pair.
+    '''
+    code = ord(data[pos])
+    if code < INT_POS_FIXED_START + INT_POS_FIXED_COUNT:
+        return code, pos + 1
+    if STR_FIXED_START <= code < STR_FIXED_START + STR_FIXED_COUNT:
+        end = pos + 1 + code - STR_FIXED_START
+        return data[pos + 1:end], end
+    if code >= LIST_FIXED_START:
+        values = []
+        pos += 1
+        for index in xrange(code - LIST_FIXED_START):
+            value, pos = decode_value(data, pos)
+            values.append(value)
+        return tuple(values), pos
+    if DICT_FIXED_START <= code < DICT_FIXED_START + DICT_FIXED_COUNT:
+        values = {}
+        pos += 1
+        for index in xrange(code - DICT_FIXED_START):
+            key, pos = decode_value(data, pos)
+            values[key], pos = decode_value(data, pos)
+        return values, pos
+    if INT_NEG_FIXED_START <= code < INT_NEG_FIXED_START + INT_NEG_FIXED_COUNT:
+        return INT_NEG_FIXED_START - 1 - code, pos + 1
+    if code in PACKED:
+        format, size = PACKED[code]
+        return struct.unpack(format, data[pos + 1:pos + 1 + size])[0], pos + 1 + size
+    if code in CONSTANTS:
+        return CONSTANTS[code], pos + 1
+    if code == CHR_INT:
+        end = data.index(chr(CHR_TERM), pos)
+        return int(data[pos + 1:end]), end + 1
+    if code == CHR_LIST:
+        values = []
+        pos += 1
+        while ord(data[pos]) != CHR_TERM:
+            value, pos = decode_value(data, pos)
+            values.append(value)
+        return tuple(values), pos + 1
+    if code == CHR_DICT:
+        values = {}
+        pos += 1
+        while ord(data[pos]) != CHR_TERM:
+            key, pos = decode_value(data, pos)
+            values[key], pos = decode_value(data, pos)
+        return values, pos + 1
+    if 48 <= code <= 57:
+        colon = data.index(':', pos)
+        end = colon + 1 + int(data[pos:colon])
+        return data[colon + 1:end], end
+    raise RencodeError("Unknown type code %d at %d" % (code, pos))
+
+
+def loads(data):
+    '''
+    Decodes a rencoded string. Lists come back as tuples, strings as byte strings.
+    '''
+    try:
+        value, end = decode_value(data, 0)
+    except (IndexError, ValueError, struct.error), e:
+        raise RencodeError("Malformed rencoded data: %s" % e)
+    if end != len(data):
+        raise RencodeError("Trailing data at %d" % end)
+    return value
+
+
+def encode_value(value, parts):
+    if value is True:
+        parts.append(chr(CHR_TRUE))
+    elif value is False:
+        parts.append(chr(CHR_FALSE))
+    elif value is None:
+        parts.append(chr(CHR_NONE))
+    elif isinstance(value, (int, long)):
+        if 0 <= value < INT_POS_FIXED_COUNT:
+            parts.append(chr(INT_POS_FIXED_START + value))
+        elif -INT_NEG_FIXED_COUNT <= value < 0:
+            parts.append(chr(INT_NEG_FIXED_START - 1 - value))
+        elif -128 <= value < 128:
+            parts.append(chr(CHR_INT1) + struct.pack('!b', value))
+        elif -32768 <= value < 32768:
+            parts.append(chr(CHR_INT2) + struct.pack('!h', value))
+        elif -2147483648 <= value < 2147483648:
+            parts.append(chr(CHR_INT4) + struct.pack('!l', value))
+        elif -9223372036854775808 <= value < 9223372036854775808:
+            parts.append(chr(CHR_INT8) + struct.pack('!q', value))
+        else:
+            parts.append('%c%d%c' % (CHR_INT, value, CHR_TERM))
+    elif isinstance(value, float):
+        parts.append(chr(CHR_FLOAT64) + struct.pack('!d', value))
+    elif isinstance(value, basestring):
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+        if len(value) < STR_FIXED_COUNT:
+            parts.append(chr(STR_FIXED_START + len(value)) + value)
+        else:
+            parts.append('%d:%s' % (len(value), value))
+    elif isinstance(value, (list, tuple)):
+        if len(value) < LIST_FIXED_COUNT:
+            parts.append(chr(LIST_FIXED_START + len(value)))
+            for item in value:
+                encode_value(item, parts)
+        else:
+            parts.append(chr(CHR_LIST))
+            for item in value:
+                encode_value(item, parts)
+            parts.append(chr(CHR_TERM))
+    elif isinstance(value, dict):
+        if len(value) < DICT_FIXED_COUNT:
+            parts.append(chr(DICT_FIXED_START + len(value)))
+        else:
+            parts.append(chr(CHR_DICT))
+        for key, item in value.items():
+            encode_value(key, parts)
+            encode_value(item, parts)
+        if len(value) >= DICT_FIXED_COUNT:
+            parts.append(chr(CHR_TERM))
+    else:
+        raise RencodeError("Can not rencode %r" % (value,))
+
+
+def dumps(value):
+    '''
+    Rencodes ints, floats, strings, lists, tuples, dicts, booleans and None.
+    '''
+    parts = []
+    encode_value(value, parts)
+    return ''.join(parts)
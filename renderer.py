@@ -0,0 +1,180 @@
+import os
+
+
+class ListItem(object):
+    '''
+    Stand-in for `mc.ListItem` holding the same label, property and description
+    values in memory.
+    '''
+    def __init__(self):
+        self.label = ''
+        self.description = ''
+        self.tagline = ''
+        self.properties = {}
+
+
+    def SetLabel(self, label):
+        self.label = label
+
+
+    def GetLabel(self):
+        return self.label
+
+
+    def SetDescription(self, description):
+        self.description = description
+
+
+    def GetDescription(self):
+        return self.description
+
+
+    def SetTagLine(self, tagline):
+        self.tagline = tagline
+
+
+    def GetTagLine(self):
+        return self.tagline
+
+
+    def SetProperty(self, name, value):
+        self.properties[name] = value
+
+
+    def GetProperty(self, name):
+        return self.properties.get(name, '')
+
+
+class Renderer(object):
+    '''
+    Everything a TorrentUI shows or reads from the screen goes through a renderer.
+    This one keeps the list in memory and draws nothing, so the engine can run,
+    be benchmarked or be profiled outside Boxee. `BoxeeRenderer` draws the real
+    window.
+
+    Arguments:
+        settings: A dict of config values, see `get_setting`
+    '''
+    def __init__(self, settings=None):
+        self.settings = settings or {}
+        self.items = []
+        self.file_items = []
+        self.focused = 0
+        self.closed = False
+
+
+    def get_setting(self, name):
+        '''
+        Returns the config value `name` as a string, '' when it is not set.
+        '''
+        return self.settings.get(name, '')
+
+
+    def set_setting(self, name, value):
+        self.settings[name] = value
+
+
+    def get_data_dir(self):
+        '''
+        Returns the directory files kept between runs are written to.
+        '''
+        return os.path.join(os.path.expanduser('~'), '.torrentui')
+
+
+    def create_item(self):
+        return ListItem()
+
+
+    def create_items(self):
+        return []
+
+
+    def get_items(self):
+        return self.items
+
+
+    def get_focused(self):
+        return self.focused
+
+
+    def set_items(self, items, keep_focus=True):
+        '''
+        Replaces the torrent list. The focused row is kept when `keep_focus` is set.
+        '''
+        self.items = items
+        if not keep_focus:
+            self.focused = 0
+
+
+    def set_file_items(self, items):
+        self.file_items = items
+
+
+    def set_rates(self, download, upload):
+        pass
+
+
+    def set_header(self, text):
+        pass
+
+
+    def set_sort_label(self, text):
+        pass
+
+
+    def set_loading(self, loading):
+        pass
+
+
+    def set_stale(self, stale):
+        pass
+
+
+    def is_visible(self):
+        '''
+        Returns True while the torrent list is on screen.
+        '''
+        return True
+
+
+    def is_playing(self):
+        '''
+        Returns True while media is playing.
+        '''
+        return False
+
+
+    def is_alive(self):
+        '''
+        Returns False once the list is gone for good, like when its window was
+        closed, and the poll loop should stop. Hidden lists are still alive.
+        '''
+        return not self.closed
+
+
+    def close(self):
+        '''
+        Makes the list gone, see `is_alive`.
+        '''
+        self.closed = True
+
+
+    def set_stream_status(self, text):
+        '''
+        Tells the user how buffering a file for playback is going.
+        '''
+        pass
+
+
+    def play(self, path):
+        '''
+        Plays the media file at `path`.
+        '''
+        pass
+
+
+    def set_debug_text(self, text):
+        '''
+        Shows `text` on the debug overlay, or hides the overlay when it is None.
+        '''
+        pass
@@ -32,13 +32,18 @@
 #
 # Contact:  Glenn Washburn <crass@berlios.de>
 
-import sys, cStringIO as StringIO
+import sys, shlex, cStringIO as StringIO
 import xmlrpclib, urllib, urlparse, socket
+from instrumentation import STATS
+from traffic import RECORDER
 
 # this allows us to parse scgi urls just like http ones
 from urlparse import uses_netloc
 uses_netloc.append('scgi')
 
+# Calls sent per system.multicall in batch mode.
+BATCH_SIZE = 200
+
 def do_scgi_xmlrpc_request(host, methodname, params=()):
     """
         Send an xmlrpc request over scgi to host.
@@ -48,7 +53,7 @@ def do_scgi_xmlrpc_request(host, methodname, params=()):
         returns:    xmlrpc response
     """
     xmlreq = xmlrpclib.dumps(params, methodname)
-    xmlresp = SCGIRequest(host).send(xmlreq)
+    xmlresp = SCGIRequest(host).send(xmlreq, methodname)
     #~ print xmlresp
     
     return xmlresp
@@ -75,8 +80,9 @@ class SCGIRequest(object):
         SCGIRequest('scgi:///tmp/rtorrent.sock').send(data)
     """
     
-    def __init__(self, url):
+    def __init__(self, url, timeout=None):
         self.url=url
+        self.timeout=timeout
         self.resp_headers=[]
     
     def __send(self, scgireq):
@@ -91,10 +97,12 @@ class SCGIRequest(object):
             #~ print addrinfo
             
             sock = socket.socket(*addrinfo[0][:3])
+            sock.settimeout(self.timeout)
             sock.connect(addrinfo[0][4])
         else:
             # if no host then assume unix domain socket
             sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
             sock.connect(path)
         
         sock.send(scgireq)
@@ -106,10 +114,18 @@ class SCGIRequest(object):
         sock.close()
         return resp
     
-    def send(self, data):
+    def send(self, data, methodname='scgi'):
         "Send data over scgi to url and get response"
-        scgiresp = self.__send(self.add_required_scgi_headers(data))
+        started = STATS.start()
+        captured = RECORDER.start()
+        try:
+            scgiresp = self.__send(self.add_required_scgi_headers(data))
+        except:
+            STATS.record('rtorrent', methodname, started, len(data), error=True)
+            raise
         resp, self.resp_headers = self.get_scgi_resp(scgiresp)
+        STATS.record('rtorrent', methodname, started, len(data), len(scgiresp))
+        RECORDER.record(captured, 'rtorrent', methodname, data, scgiresp)
         return resp
     
     @staticmethod
@@ -166,16 +182,17 @@ class RTorrentXMLRPCClient(object):
             print "%s has a ratio of over 0.5"%(rtc.d.get_name(infohash))
     """
     
-    def __init__(self, url, methodname=''):
+    def __init__(self, url, methodname='', timeout=None):
         self.url = url
         self.methodname = methodname
+        self.timeout = timeout
     
     def __call__(self, *args):
         #~ print "%s%r"%(self.methodname, args)
         scheme, netloc, path, query, frag = urlparse.urlsplit(self.url)
         xmlreq = xmlrpclib.dumps(args, self.methodname)
         if scheme == 'scgi':
-            xmlresp = SCGIRequest(self.url).send(xmlreq)
+            xmlresp = SCGIRequest(self.url, self.timeout).send(xmlreq, self.methodname)
             return xmlrpclib.loads(xmlresp)[0][0]
             #~ return do_scgi_xmlrpc_request_py(self.url, self.methodname, args)
         elif scheme == 'http':
@@ -187,7 +204,7 @@ class RTorrentXMLRPCClient(object):
     
     def __getattr__(self, attr):
         methodname = self.methodname and '.'.join([self.methodname,attr]) or attr
-        return RTorrentXMLRPCClient(self.url, methodname)
+        return RTorrentXMLRPCClient(self.url, methodname, self.timeout)
 
 def convert_params_to_native(params):
     "Parse xmlrpc-c command line arg syntax"
@@ -213,12 +230,82 @@ def convert_params_to_native(params):
     
     return tuple(cparams)
 
+def parse_batch_line(line):
+    "Parse a 'method arg...' batch line, returns None for blank and # lines"
+    words = shlex.split(line, comments=True)
+    if not words:
+        return None
+    return words[0], convert_params_to_native(words[1:])
+
+def gen_batch_chunks(lines, size=BATCH_SIZE):
+    "Group the calls of batch lines into lists of at most size calls"
+    chunk = []
+    for line in lines:
+        call = parse_batch_line(line)
+        if call is None:
+            continue
+        chunk.append(call)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def do_scgi_xmlrpc_batch(host, lines, size=BATCH_SIZE, output=sys.stdout):
+    """
+        Run many xmlrpc calls over scgi, size calls per system.multicall.
+        host:       scgi://host:port/path
+        lines:      iterable of 'method arg...' lines, args in the
+                    convert_params_to_native syntax, quoted like a shell
+        size:       calls per request
+        output:     file the results are written to as they come in, one
+                    line per call in order: the python value, or the fault
+        returns:    number of failed calls
+    """
+    failed = 0
+    for chunk in gen_batch_chunks(lines, size):
+        calls = [{'methodName': methodname, 'params': list(params)}
+                 for methodname, params in chunk]
+        results = do_scgi_xmlrpc_request_py(host, 'system.multicall', (calls,))
+        for result in results:
+            if isinstance(result, dict):
+                failed += 1
+                result = xmlrpclib.Fault(result.get('faultCode'), result.get('faultString'))
+            else:
+                result = result[0]
+            output.write('%r\n'%(result,))
+        output.flush()
+    return failed
+
 def main(argv):
+    """
+        rtorrent_client.py [-p] host method [arg...]
+        rtorrent_client.py -b [-n size] host [file]
+        
+        -p prints the result as a python value instead of xml. -b runs the
+        'method arg...' lines of file, or stdin, in batches of size calls and
+        prints one result per line.
+    """
     output_python=False
+    batch=False
+    size=BATCH_SIZE
     
-    if argv[0] == '-p':
-        output_python=True
-        argv.pop(0)
+    while argv and argv[0] in ('-p', '-b', '-n'):
+        option = argv.pop(0)
+        if option == '-p':
+            output_python=True
+        elif option == '-b':
+            batch=True
+        else:
+            size = int(argv.pop(0))
+    
+    if batch:
+        host = argv[0]
+        if len(argv) > 1 and argv[1] != '-':
+            lines = open(argv[1])
+        else:
+            lines = sys.stdin
+        return do_scgi_xmlrpc_batch(host, lines, size) and 1 or 0
     
     host, methodname = argv[:2]
     
@@ -232,4 +319,4 @@ def main(argv):
         print xmlrpclib.loads(respxml)[0][0]
 
 if __name__ == "__main__":
-    main(sys.argv[1:])
+    sys.exit(main(sys.argv[1:]))
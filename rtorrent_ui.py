@@ -0,0 +1,270 @@
+import binascii, posixpath, xmlrpclib
+from torrent_ui import TorrentUI, TorrentUIError
+from rtorrent_client import RTorrentXMLRPCClient
+
+
+class rTorrentUI(TorrentUI):
+    '''
+    TorrentUI subclass for the rTorrent client.
+    '''
+    # Values of d.set_priority, 0 would turn the torrent off.
+    priorities = {'low': 1, 'normal': 2, 'high': 3}
+    torrent_priorities = {0: 'low', 1: 'low', 2: 'normal', 3: 'high'}
+    
+    # Values of f.get_priority/f.set_priority. rTorrent has no low file priority.
+    file_priorities = {0: 'skip', 1: 'normal', 2: 'high'}
+    file_priority_values = {'skip': 0, 'low': 1, 'normal': 1, 'high': 2}
+    
+    # Fields fetched for every torrent with one d.multicall over the main view. The
+    # first `summary_size` of them are enough for `get_summary_snapshot`.
+    fields = (
+        'd.get_hash=',
+        'd.get_name=',
+        'd.get_state=',
+        'd.get_complete=',
+        'd.get_size_bytes=',
+        'd.get_left_bytes=',
+        'd.get_down_rate=',
+        'd.get_up_rate=',
+        'd.get_up_total=',
+        'd.get_bytes_done=',
+        'd.get_peers_connected=',
+        'd.get_peers_complete=',
+        'd.get_peers_accounted=',
+        'd.get_ratio=',
+        'd.get_custom1=',
+        'd.get_priority='
+    )
+    summary_size = 10
+    
+    
+    def fetch_main_view(self, fields):
+        # The torrent list and the global rates share one system.multicall.
+        results = self.multicall([
+            ('d.multicall', ['main'] + list(fields)),
+            ('get_down_rate', []),
+            ('get_up_rate', [])
+        ])
+        return results[0], self.format_status(results[1], results[2])
+        
+        
+    def get_status_name(self, state, complete):
+        if not state:
+            return 'Paused'
+        elif complete:
+            return 'Seeding'
+        return 'Downloading'
+        
+        
+    def get_percent_done(self, total, left):
+        if total:
+            return (float(total - left)*100.00)/float(total)
+        return 0.0
+    
+    
+    def get_snapshot(self):
+        rows, status = self.fetch_main_view(self.fields)
+        return [self.format_torrent(row) for row in rows], status
+        
+        
+    def get_summary_snapshot(self):
+        rows, status = self.fetch_main_view(self.fields[:self.summary_size])
+        torrents = []
+        for infohash, name, state, complete, total, left, down_rate, up_rate, up_total, bytes_done in rows:
+            torrents.append(self.format_summary(
+                str(infohash),
+                str(name),
+                self.get_status_name(state, complete),
+                self.get_percent_done(total, left),
+                down_rate,
+                up_rate,
+                bytes_done,
+                up_total
+            ))
+        return torrents, status
+        
+        
+    def get_details(self, ids):
+        methods = [field.rstrip('=') for field in self.fields]
+        results = self.multicall([(method, [id]) for id in ids for method in methods])
+        count = len(methods)
+        return [self.format_torrent(results[index:index + count])
+                for index in range(0, len(results), count)]
+        
+        
+    def format_torrent(self, row):
+        (infohash, name, state, complete, total, left, down_rate, up_rate, up_total, bytes_done,
+         peers_connected, peers_complete, peers_accounted, ratio, category, priority) = row
+        
+        return {
+            'id': str(infohash),
+            'label': str(name),
+            'status': self.get_status_name(state, complete),
+            'size_total': self.format_filesize(total),
+            'size_downloaded': self.format_filesize(total - left),
+            'size_uploaded': self.format_filesize(up_total),
+            'percent_done': self.get_percent_done(total, left),
+            'estimated_time': '',
+            'peers_connected': peers_connected,
+            'peers_incoming': peers_complete,
+            'peers_outgoing': peers_accounted,
+            'rate_download': self.format_filesize(down_rate),
+            'rate_upload': self.format_filesize(up_rate),
+            'rate_download_bytes': down_rate,
+            'rate_upload_bytes': up_rate,
+            'size_left_bytes': left,
+            'ratio': str(ratio / 1000.0),
+            # The label ruTorrent and most other frontends keep in custom1.
+            'category': category,
+            'priority': self.torrent_priorities.get(priority, 'normal'),
+            'downloaded_bytes': bytes_done,
+            'uploaded_bytes': up_total
+        }
+
+         
+    def get_torrents(self):
+        return self.get_snapshot()[0]
+        
+        
+    def multicall(self, calls):
+        '''
+        Runs (method, params) pairs in a single system.multicall and returns their
+        results. Raises TorrentUIError if rTorrent rejected any of them.
+        '''
+        results = self.connection.system.multicall([
+            {'methodName': method, 'params': list(params)} for method, params in calls
+        ])
+        for result in results:
+            if isinstance(result, dict):
+                raise TorrentUIError(result.get('faultString'))
+        return [result[0] for result in results]
+        
+        
+    def get_ids(self):
+        return self.connection.download_list('main')
+        
+        
+    def get_file_done(self, size, completed_chunks, size_chunks):
+        # rTorrent counts file progress in chunks.
+        if not size_chunks:
+            return size
+        return min(size, size * completed_chunks / size_chunks)
+        
+        
+    def get_files(self, id):
+        rows = self.connection.f.multicall(id, '', 'f.get_path=', 'f.get_size_bytes=',
+            'f.get_completed_chunks=', 'f.get_size_chunks=', 'f.get_priority=')
+        files = []
+        for index, (path, size, completed_chunks, size_chunks, priority) in enumerate(rows):
+            files.append(self.format_file(index, path, size,
+                self.get_file_done(size, completed_chunks, size_chunks),
+                self.file_priorities.get(priority, 'normal')))
+        return files
+        
+        
+    def get_file_progress(self, id, files):
+        rows = self.connection.f.multicall(id, '', 'f.get_completed_chunks=', 'f.get_size_chunks=')
+        return [self.get_file_done(file['size_bytes'], completed_chunks, size_chunks)
+                for file, (completed_chunks, size_chunks) in zip(files, rows)]
+        
+        
+    def set_file_priorities(self, id, priorities):
+        calls = []
+        for index, priority in priorities.items():
+            calls.append(('f.set_priority', [id, index, self.file_priority_values[priority]]))
+        # Priorities only take effect once the torrent's priorities are updated.
+        calls.append(('d.update_priorities', [id]))
+        self.multicall(calls)
+        
+        
+    def set_sequential(self, id, index, enabled=True):
+        # rTorrent has no sequential download, fetching the first and last chunks of
+        # the file first is the closest.
+        try:
+            self.multicall([
+                ('f.set_prioritize_first', [id, index, int(enabled)]),
+                ('f.set_prioritize_last', [id, index, int(enabled)]),
+                ('d.update_priorities', [id])
+            ])
+        except TorrentUIError:
+            return False
+        return True
+        
+        
+    def get_file_pieces(self, id, index):
+        bitfield, chunk_size, offset, size = self.multicall([
+            ('d.get_bitfield', [id]),
+            ('d.get_chunk_size', [id]),
+            ('f.get_offset', [id, index]),
+            ('f.get_size_bytes', [id, index])
+        ])
+        # The bitfield comes hex encoded.
+        return binascii.unhexlify(bitfield), chunk_size, offset, size
+        
+        
+    def get_file_path(self, id, index):
+        directory, path = self.multicall([
+            ('d.get_directory', [id]),
+            ('f.get_path', [id, index])
+        ])
+        # The directory of a single file torrent is the one holding its file.
+        return posixpath.join(directory, path)
+        
+        
+    def start_torrent(self, id=False):
+        self.start_torrents(id and [id] or self.get_ids())
+        
+        
+    def stop_torrent(self, id=False):
+        self.stop_torrents(id and [id] or self.get_ids())
+        
+        
+    def delete_torrent(self, id, files=False):
+        self.delete_torrents(id and [id] or self.get_ids(), files)
+        
+        
+    def start_torrents(self, ids):
+        if ids:
+            self.multicall([('d.start', [id]) for id in ids])
+        
+        
+    def stop_torrents(self, ids):
+        if ids:
+            self.multicall([('d.stop', [id]) for id in ids])
+        
+        
+    def delete_torrents(self, ids, files=False):
+        if files:
+            raise TorrentUIError("rTorrent can not delete downloaded files.")
+        if ids:
+            self.multicall([('d.erase', [id]) for id in ids])
+        
+        
+    def add_torrents(self, torrents):
+        if torrents:
+            self.multicall([('load_raw_start', [xmlrpclib.Binary(data)]) for data in torrents])
+        
+        
+    def set_priority(self, ids, priority):
+        if ids:
+            self.multicall([('d.set_priority', [id, self.priorities[priority]]) for id in ids])
+        
+        
+    def set_speed_limits(self, download=None, upload=None):
+        # rTorrent takes bytes per second, 0 is unlimited.
+        self.multicall([
+            ('set_download_rate', [download or 0]),
+            ('set_upload_rate', [upload or 0])
+        ])
+        
+        
+    def set_torrent_speed_limits(self, limits):
+        # Per-torrent limits need throttle groups, which can only be changed on
+        # stopped torrents.
+        if limits:
+            raise NotImplementedError("rTorrent has no per-torrent speed limits.")
+        
+        
+    @classmethod
+    def connect(cls, url, username='', password='', **options):
+        return cls(RTorrentXMLRPCClient(url), **options)
@@ -0,0 +1,160 @@
+import re, threading
+
+
+# Facets the index keeps value -> torrent id sets for, see `TorrentIndex.get_facet`.
+FACETS = ('status', 'category', 'tracker')
+
+TOKEN_PATTERN = re.compile(r'[^\w]+', re.UNICODE)
+
+
+def tokenize(text):
+    '''
+    Splits a torrent name or search query into lowercase word tokens.
+    '''
+    return [token for token in TOKEN_PATTERN.split(text.lower()) if token]
+
+
+class TorrentIndex(object):
+    '''
+    Search index over the torrents of a TorrentUI, updated from each snapshot.
+
+    Every name token is stored under all of its prefixes up to `prefix_length`
+    characters, so a query is a few dict lookups and set intersections no matter how
+    many torrents there are. Facets map each value to the set of torrent ids having
+    it, their sizes are the facet counts.
+
+    Only torrents whose name or facet values changed since the last snapshot are
+    reindexed. Values missing from a torrent dict, as in summaries, keep their last
+    known value.
+
+    Arguments:
+        prefix_length: Longest prefix indexed. Longer query tokens are looked up by
+        this prefix and the candidates checked against the full token.
+    '''
+    def __init__(self, prefix_length=10):
+        self.prefix_length = prefix_length
+        self.lock = threading.Lock()
+        # Prefix -> set of torrent ids with a name token starting with it.
+        self.prefixes = {}
+        # Torrent id -> (name, tokens) last indexed.
+        self.names = {}
+        # Facet -> value -> set of torrent ids.
+        self.facets = dict([(facet, {}) for facet in FACETS])
+        # Torrent id -> {facet: value} last indexed.
+        self.values = {}
+
+
+    def update(self, torrents):
+        '''
+        Brings the index up to date with a snapshot, a list of torrent dicts as
+        returned by `TorrentUI.get_torrents`. Torrents not in it are dropped.
+        '''
+        self.lock.acquire()
+        try:
+            ids = {}
+            for torrent in torrents:
+                id = torrent['id']
+                ids[id] = True
+                indexed = self.names.get(id)
+                if indexed is None or indexed[0] != torrent['label']:
+                    self.index_name(id, torrent['label'])
+                values = self.values.setdefault(id, {})
+                for facet in FACETS:
+                    value = torrent.get(facet, values.get(facet, ''))
+                    if values.get(facet) != value:
+                        self.set_facet(id, facet, value)
+            for id in self.names.keys():
+                if id not in ids:
+                    self.remove(id)
+        finally:
+            self.lock.release()
+
+
+    def index_name(self, id, name):
+        if id in self.names:
+            self.unindex_name(id)
+        tokens = tokenize(name)
+        for token in tokens:
+            for length in range(1, min(len(token), self.prefix_length) + 1):
+                self.prefixes.setdefault(token[:length], set()).add(id)
+        self.names[id] = (name, tokens)
+
+
+    def unindex_name(self, id):
+        name, tokens = self.names.pop(id)
+        for token in tokens:
+            for length in range(1, min(len(token), self.prefix_length) + 1):
+                ids = self.prefixes.get(token[:length])
+                if ids is not None:
+                    ids.discard(id)
+                    if not ids:
+                        del self.prefixes[token[:length]]
+
+
+    def set_facet(self, id, facet, value):
+        values = self.values.setdefault(id, {})
+        if facet in values:
+            members = self.facets[facet].get(values[facet])
+            if members is not None:
+                members.discard(id)
+                if not members:
+                    del self.facets[facet][values[facet]]
+        values[facet] = value
+        self.facets[facet].setdefault(value, set()).add(id)
+
+
+    def remove(self, id):
+        if id in self.names:
+            self.unindex_name(id)
+        for facet, value in self.values.pop(id, {}).items():
+            members = self.facets[facet].get(value)
+            if members is not None:
+                members.discard(id)
+                if not members:
+                    del self.facets[facet][value]
+
+
+    def search(self, query='', **filters):
+        '''
+        Returns the set of torrent ids whose name has a token starting with each
+        token of `query` and whose facets match `filters`, e.g.
+        search('ubuntu', status='Seeding'). An empty query matches every torrent.
+        '''
+        self.lock.acquire()
+        try:
+            candidates = []
+            long_tokens = []
+            for token in tokenize(query):
+                candidates.append(self.prefixes.get(token[:self.prefix_length], set()))
+                if len(token) > self.prefix_length:
+                    long_tokens.append(token)
+            for facet, value in filters.items():
+                candidates.append(self.facets[facet].get(value, set()))
+            if not candidates:
+                return set(self.names.keys())
+            candidates.sort(key=len)
+            result = set(candidates[0])
+            for ids in candidates[1:]:
+                result &= ids
+                if not result:
+                    break
+            for token in long_tokens:
+                result = set([id for id in result
+                              if [name_token for name_token in self.names[id][1]
+                                  if name_token.startswith(token)]])
+            return result
+        finally:
+            self.lock.release()
+
+
+    def get_facet(self, facet):
+        '''
+        Returns the (value, count) pairs of a facet, largest count first.
+        '''
+        self.lock.acquire()
+        try:
+            counts = [(value, len(ids)) for value, ids in self.facets[facet].items()]
+        finally:
+            self.lock.release()
+        counts.sort(key=lambda count: (-count[1], count[0]))
+        return counts
@@ -0,0 +1,104 @@
+import os, marshal, time
+
+
+class SnapshotCache(object):
+    '''
+    Keeps the last rendered (torrents, status) snapshot in a compact marshal file,
+    so the list can be drawn at startup before the daemon has answered. Snapshots
+    are written at most once every `interval` seconds and only when they changed,
+    `flush` writes the one held back.
+
+    Arguments:
+        path: The file the snapshot is kept in
+        interval: Least seconds between two writes
+    '''
+    # Bumped whenever the torrent dict layout changes, older files are ignored.
+    version = 1
+
+
+    def __init__(self, path, interval=60.0):
+        self.path = path
+        self.interval = interval
+        # The marshalled snapshot last written, and when.
+        self.saved = None
+        self.saved_at = None
+        # The marshalled snapshot held back by the interval, if any.
+        self.pending = None
+
+
+    def save(self, torrents, status, now=None):
+        '''
+        Writes the snapshot, or keeps it for a later `save` or `flush` when the last
+        write was less than `interval` seconds ago.
+        '''
+        if now is None:
+            now = time.time()
+        # Marshalled, as torrent dicts may change in place after this call.
+        try:
+            data = marshal.dumps((self.version, torrents, status))
+        except ValueError, e:
+            print "Could not save the torrent snapshot: %s" % e
+            return
+        if data == self.saved:
+            self.pending = None
+            return
+        if self.saved_at is not None and 0 <= now - self.saved_at < self.interval:
+            self.pending = data
+            return
+        self.write(data)
+        self.saved_at = now
+
+
+    def flush(self):
+        '''
+        Writes the snapshot held back by the interval, if any.
+        '''
+        if self.pending is not None:
+            self.write(self.pending)
+            self.saved_at = time.time()
+
+
+    def write(self, data):
+        '''
+        Writes a marshalled snapshot to a temporary file first and renames it over
+        the old one, so a crash never leaves a half written snapshot behind.
+        '''
+        self.pending = None
+        directory = os.path.dirname(self.path)
+        temp_path = '%s.tmp' % self.path
+        try:
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            snapshot_file = open(temp_path, 'wb')
+            try:
+                snapshot_file.write(data)
+            finally:
+                snapshot_file.close()
+            # Windows does not rename over an existing file.
+            if os.name == 'nt' and os.path.exists(self.path):
+                os.remove(self.path)
+            os.rename(temp_path, self.path)
+            self.saved = data
+        except (IOError, OSError), e:
+            print "Could not save the torrent snapshot: %s" % e
+
+
+    def load(self):
+        '''
+        Returns the saved (torrents, status) snapshot, or None if there is no usable
+        one.
+        '''
+        try:
+            snapshot_file = open(self.path, 'rb')
+        except IOError:
+            return None
+        try:
+            try:
+                version, torrents, status = marshal.load(snapshot_file)
+            except (EOFError, ValueError, TypeError):
+                return None
+        finally:
+            snapshot_file.close()
+        if version != self.version:
+            return None
+        return torrents, status
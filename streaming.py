@@ -0,0 +1,232 @@
+import time
+
+
+class StreamError(Exception): pass
+
+
+def has_piece(bitfield, index):
+    '''
+    Returns True if piece `index` is set in `bitfield`, a string with one bit per
+    piece, the most significant bit of the first byte being piece 0.
+    '''
+    return bool(ord(bitfield[index >> 3]) & (0x80 >> (index & 7)))
+
+
+def contiguous_prefix(bitfield, piece_size, offset, length):
+    '''
+    Returns how many bytes from the start of a file are downloaded without a gap.
+    The file is `length` bytes at byte `offset` of the torrent, `bitfield` holds the
+    torrent's downloaded pieces of `piece_size` bytes.
+    '''
+    if not length:
+        return 0
+    end = offset + length
+    piece = offset // piece_size
+    while piece * piece_size < end and piece < len(bitfield) * 8 and has_piece(bitfield, piece):
+        piece += 1
+    return max(0, min(end, piece * piece_size) - offset)
+
+
+class StreamSession(object):
+    '''
+    A file of a torrent being downloaded for playback.
+    '''
+    def __init__(self, id, index, name, size, priorities):
+        self.id = id
+        self.index = index
+        self.name = name
+        self.size = size
+        # The priorities of the torrent's files before the stream started.
+        self.priorities = priorities
+        self.sequential = False
+        # Where the player opens the file, see `TorrentUI.get_stream_path`.
+        self.path = None
+        self.prefix = 0
+        self.ready = False
+        self.stopped = False
+
+
+class StreamManager(object):
+    '''
+    Lets a TorrentUI play a file while its torrent is still downloading.
+
+    `start` puts the file at high priority and skips the other files of the
+    torrent, and asks the daemon to fetch it in order, or at least its first and
+    last pieces first, where it can. `update` follows the downloaded bytes at the
+    start of the file without a gap, the file is ready to play once they cover the
+    buffer. Daemons reporting no piece information only have the file ready once
+    it is complete. `stop` undoes what `start` changed, `play` calls it once the
+    player is done with the file.
+
+    The player opens the file by the path `TorrentUI.get_stream_path` maps the
+    daemon's path to. Files of remote daemons can only be streamed when their
+    download directory is mapped to a share with the 'stream_path_map' config
+    value, without it `play` refuses them.
+
+    Arguments:
+        ui: The TorrentUI whose daemon downloads the files
+        buffer_bytes: Bytes at the start of a file needed before playback starts
+        check_interval: Seconds between two progress checks while buffering or
+        playing
+        start_timeout: Seconds the player may take to start playing the file before
+        the stream is stopped
+    '''
+    def __init__(self, ui, buffer_bytes=16 * 1024 * 1024, check_interval=2.0, start_timeout=60.0):
+        self.ui = ui
+        self.buffer_bytes = buffer_bytes
+        self.check_interval = check_interval
+        self.start_timeout = start_timeout
+        # Torrent id -> StreamSession of its stream.
+        self.sessions = {}
+
+
+    @classmethod
+    def from_config(cls, ui, get_setting):
+        '''
+        Creates a manager with the 'stream_buffer_mb' config value, read with
+        `get_setting`, as its buffer size.
+        '''
+        value = get_setting('stream_buffer_mb')
+        if value:
+            return cls(ui, int(float(value) * 1024 * 1024))
+        return cls(ui)
+
+
+    def pick_file(self, files):
+        '''
+        Returns the index of the file to play when none is given, the largest one.
+        '''
+        largest = max(files, key=lambda file: file['size_bytes'])
+        return largest['index']
+
+
+    def start(self, id, index=None):
+        '''
+        Starts streaming file `index` of the torrent `id`, the largest file when it is
+        None, and returns its StreamSession. Raises StreamError, before changing
+        anything, when the player could not reach the file.
+        '''
+        self.stop(id)
+        files = self.ui.call_connection('get_files', id)
+        if index is None:
+            index = self.pick_file(files)
+        target = files[index]
+        session = StreamSession(id, index, target['name'], target['size_bytes'],
+            dict([(file['index'], file['priority']) for file in files]))
+        session.path = self.ui.call_connection('get_stream_path', id, index)
+        if session.path is None:
+            raise StreamError("Can not play %s from here, set stream_path_map to the daemon's share"
+                              % target['name'])
+
+        self.sessions[id] = session
+
+        priorities = dict([(file['index'], 'skip') for file in files])
+        priorities[index] = 'high'
+        self.ui.call_connection('set_file_priorities', id, priorities)
+        self.ui.files.invalidate(id)
+        session.sequential = self.ui.call_connection('set_sequential', id, index)
+        self.ui.call_connection('start_torrents', [id])
+        return session
+
+
+    def update(self, session):
+        '''
+        Refreshes the downloaded prefix of a session's file and whether it is ready
+        to play.
+        '''
+        pieces = self.ui.call_connection('get_file_pieces', session.id, session.index)
+        if pieces is not None:
+            session.prefix = contiguous_prefix(*pieces)
+        else:
+            file = self.ui.call_connection('get_files', session.id)[session.index]
+            session.prefix = file['done_bytes'] == file['size_bytes'] and file['size_bytes'] or 0
+        session.ready = session.prefix >= min(self.buffer_bytes, session.size)
+        return session
+
+
+    def stop(self, id, restore=True):
+        '''
+        Stops the stream of the torrent `id`, if any. With `restore` the file
+        priorities from before the stream are put back and the download order is
+        the usual one again.
+        '''
+        session = self.sessions.pop(id, None)
+        if session is None:
+            return
+        session.stopped = True
+        if restore:
+            self.ui.call_connection('set_file_priorities', id, session.priorities)
+            self.ui.files.invalidate(id)
+            if session.sequential:
+                self.ui.call_connection('set_sequential', id, session.index, False)
+
+
+    def finish(self, session):
+        '''
+        Stops a session from its `play` thread, unless it was stopped already.
+        '''
+        if session.stopped:
+            return
+        try:
+            self.stop(session.id)
+        except Exception, e:
+            print "Stopping stream of %s failed: %s" % (session.id, e)
+
+
+    def wait_for_playback(self, session):
+        '''
+        Waits until the player started and then stopped playing, or did not start
+        within `start_timeout` seconds.
+        '''
+        started = time.time()
+        renderer = self.ui.renderer
+        while not session.stopped and not renderer.is_playing():
+            if time.time() - started >= self.start_timeout:
+                return
+            time.sleep(self.check_interval)
+        while not session.stopped and renderer.is_playing():
+            time.sleep(self.check_interval)
+
+
+    def play(self, id, index=None):
+        '''
+        Starts a stream and waits until enough of the file is downloaded, then has the
+        renderer play it and stops the stream once playback is over. Meant to run in
+        its own thread, see `TorrentUI.play_now`.
+        '''
+        try:
+            session = self.start(id, index)
+        except StreamError, e:
+            self.ui.renderer.set_stream_status(str(e))
+            return
+        except Exception, e:
+            print "Starting stream of %s failed: %s" % (id, e)
+            self.ui.renderer.set_stream_status("Can not stream this torrent")
+            # Whatever `start` changed before it failed is undone.
+            session = self.sessions.get(id)
+            if session is not None:
+                self.finish(session)
+            return
+
+        shown = None
+        while not session.stopped:
+            try:
+                self.update(session)
+            except Exception, e:
+                print "Checking stream of %s failed: %s" % (id, e)
+            if session.ready:
+                break
+            if id not in self.ui.torrents_by_id:
+                self.stop(id, restore=False)
+                return
+            percent = session.prefix * 100 / max(1, min(self.buffer_bytes, session.size))
+            if percent / 10 != shown:
+                shown = percent / 10
+                self.ui.renderer.set_stream_status("Buffering %s: %s%%" % (session.name, percent))
+            time.sleep(self.check_interval)
+        if session.stopped:
+            return
+
+        self.ui.renderer.play(session.path)
+        self.wait_for_playback(session)
+        self.finish(session)
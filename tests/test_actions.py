@@ -0,0 +1,118 @@
+import threading, time, unittest
+from actions import ActionQueue
+from renderer import ListItem
+
+
+class FakeUI(object):
+    '''
+    Records the actions run, failing the ones in `failing`. Each action waits for
+    `gate` when it is set.
+    '''
+    def __init__(self):
+        self.actions = []
+        self.failing = set()
+        self.gate = None
+
+
+    def run_action(self, action, id, **kwargs):
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.actions.append((action, id, kwargs))
+        if action in self.failing:
+            raise Exception('refused')
+
+
+def make_item(status='Paused', tagline='Paused'):
+    item = ListItem()
+    item.SetProperty('transfer_status', status)
+    item.SetTagLine(tagline)
+    return item
+
+
+class ActionQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.ui = FakeUI()
+        self.queue = ActionQueue(self.ui)
+
+
+    def run_queue(self):
+        self.queue.start()
+        self.wait_for_queue()
+
+
+    def wait_for_queue(self):
+        deadline = time.time() + 5
+        while (self.queue.order or self.queue.running is not None) and time.time() < deadline:
+            time.sleep(0.01)
+
+
+    def test_actions_are_applied_to_the_item(self):
+        item = make_item()
+        self.queue.put('start', '1', item)
+        self.assertTrue(self.queue.is_pending('1'))
+        self.assertEqual(item.GetProperty('transfer_status'), 'Downloading')
+        self.assertEqual(item.GetTagLine(), 'Starting...')
+        self.run_queue()
+        self.assertEqual(self.ui.actions, [('start', '1', {})])
+        self.assertFalse(self.queue.is_pending('1'))
+
+
+    def test_actions_are_coalesced(self):
+        item = make_item('Downloading', '')
+        self.queue.put('stop', '1', item)
+        self.queue.put('delete', '1', files=True)
+        # Nothing replaces a delete.
+        self.queue.put('start', '1')
+        self.queue.put('stop', '2')
+        self.assertEqual(self.queue.order, ['1', '2'])
+        self.assertEqual(item.GetProperty('transfer_status'), 'Removing')
+        self.run_queue()
+        self.assertEqual(self.ui.actions, [('delete', '1', {'files': True}), ('stop', '2', {})])
+
+
+    def test_no_ops_are_dropped(self):
+        item = make_item()
+        self.queue.put('start', '1', item)
+        # Back to the state the torrent was in.
+        self.queue.put('stop', '1', item)
+        self.assertFalse(self.queue.is_pending('1'))
+        self.assertEqual((item.GetProperty('transfer_status'), item.GetTagLine()), ('Paused', 'Paused'))
+        self.assertRaises(ValueError, self.queue.put, 'pause', '1', item)
+
+
+    def test_failures_are_rolled_back(self):
+        self.ui.failing.add('start')
+        item = make_item()
+        self.queue.put('start', '1', item)
+        self.run_queue()
+        self.assertEqual((item.GetProperty('transfer_status'), item.GetTagLine()), ('Paused', 'Paused'))
+
+
+    def test_newer_actions_keep_the_item(self):
+        self.ui.failing.add('start')
+        self.ui.gate = threading.Event()
+        item = make_item()
+        self.queue.put('start', '1', item)
+        self.queue.start()
+        while self.queue.running is None:
+            time.sleep(0.01)
+        # Queued while the failing start is in flight.
+        self.queue.put('delete', '1', item)
+        self.ui.gate.set()
+        self.wait_for_queue()
+        self.assertEqual([action[0] for action in self.ui.actions], ['start', 'delete'])
+        self.assertEqual(item.GetProperty('transfer_status'), 'Removing')
+
+
+    def test_calls_run_before_actions(self):
+        done = []
+        self.queue.put('stop', '1')
+        self.queue.put_call(done.append, 'call')
+        self.queue.put_call(lambda: 1 / 0)
+        self.run_queue()
+        self.assertEqual(done, ['call'])
+        self.assertEqual(self.ui.actions, [('stop', '1', {})])
+
+
+if __name__ == '__main__':
+    unittest.main()
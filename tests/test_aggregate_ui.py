@@ -0,0 +1,134 @@
+import unittest
+import torrent_ui
+from torrent_ui import AggregateUI, TorrentConnectionError, TorrentUIError
+from tests.test_torrent_ui import FakeUI, TestRenderer, UITestCase, make_torrent
+
+
+class FailingUI(FakeUI):
+    def get_snapshot(self):
+        raise Exception('daemon is down')
+
+
+class RecordingUI(FakeUI):
+    '''
+    FakeUI recording the limits and priorities it is given as well.
+    '''
+    def set_torrent_speed_limits(self, limits):
+        self.calls.append(('limits', limits))
+
+
+    def set_priority(self, ids, priority):
+        self.calls.append(('priority', ids, priority))
+
+
+class HeaderRenderer(TestRenderer):
+    header = None
+
+
+    def set_header(self, text):
+        self.header = text
+
+
+class AggregateUITest(UITestCase):
+    def create_aggregate(self, backends):
+        ui = AggregateUI(backends, HeaderRenderer())
+        self.addCleanup(ui.renderer.remove)
+        self.addCleanup(ui.transfers.close)
+        for name, backend in backends:
+            self.addCleanup(backend.renderer.remove)
+        return ui
+
+
+    def create_backend(self, torrents, cls=RecordingUI):
+        return cls(torrents, backend=True)
+
+
+    def test_ids_are_prefixed(self):
+        a = self.create_backend([make_torrent('1', rate_download=100), make_torrent('2')])
+        b = self.create_backend([make_torrent('1', rate_upload=50)])
+        ui = self.create_aggregate([('a', a), ('b', b)])
+        torrents, status = ui.get_snapshot()
+        self.assertEqual([(torrent['id'], torrent['daemon']) for torrent in torrents],
+                         [('a:1', 'a'), ('a:2', 'a'), ('b:1', 'b')])
+        self.assertEqual((status['rate_download_bytes'], status['rate_upload_bytes']), (100, 50))
+        self.assertEqual([name for name, daemon_status in status['daemons']], ['a', 'b'])
+        self.assertEqual(ui.split_id('b:1:x'), ('b', '1:x'))
+
+
+    def test_actions_are_routed(self):
+        a = self.create_backend([])
+        b = self.create_backend([])
+        ui = self.create_aggregate([('a', a), ('b', b)])
+        ui.start_torrents(['a:1', 'b:2', 'a:3'])
+        ui.set_priority(['b:2'], 'high')
+        ui.set_torrent_speed_limits({'a:1': (10, None), 'b:2': (None, 20)})
+        self.assertEqual(a.calls, [('start', ['1', '3']), ('limits', {'1': (10, None)})])
+        self.assertEqual(b.calls, [('start', ['2']), ('priority', ['2'], 'high'),
+                                   ('limits', {'2': (None, 20)})])
+
+
+    def test_failed_daemons_are_skipped(self):
+        a = self.create_backend([make_torrent('1')])
+        down = self.create_backend([make_torrent('2')], FailingUI)
+        ui = self.create_aggregate([('a', a), ('down', down)])
+        torrents, status = ui.get_snapshot()
+        self.assertEqual([torrent['id'] for torrent in torrents], ['a:1'])
+        self.assertEqual(status['daemons'][1], ('down', None))
+        ui.update_status_display(status)
+        self.assertTrue(ui.renderer.header.endswith(' | down: offline'))
+
+
+    def test_all_daemons_down(self):
+        ui = self.create_aggregate([('down', self.create_backend([], FailingUI))])
+        self.assertRaises(TorrentConnectionError, ui.get_snapshot)
+
+
+class FromConfigTest(unittest.TestCase):
+    def setUp(self):
+        self.connected = []
+        self.renderer = TestRenderer()
+        self.addCleanup(self.renderer.remove)
+        connect_backend = torrent_ui.connect_backend
+        torrent_ui.connect_backend = self.connect_backend
+        self.addCleanup(setattr, torrent_ui, 'connect_backend', connect_backend)
+
+
+    def connect_backend(self, client_name, url, username='', password='', **options):
+        if client_name == 'broken':
+            raise TorrentUIError('Unknown torrent client: broken')
+        self.connected.append((client_name, url, username, password))
+        return FakeUI(renderer=options['renderer'], backend=True)
+
+
+    def from_config(self, value):
+        ui = AggregateUI.from_config(value, self.renderer)
+        self.addCleanup(ui.transfers.close)
+        return ui
+
+
+    def test_entries(self):
+        ui = self.from_config(' home|transmission|http://localhost:9091 ; ;'
+                              'nas|qbittorrent|http://nas:8080|admin|secret')
+        self.assertEqual([name for name, backend in ui.backends], ['home', 'nas'])
+        self.assertEqual(self.connected, [('transmission', 'http://localhost:9091', '', ''),
+                                          ('qbittorrent', 'http://nas:8080', 'admin', 'secret')])
+
+
+    def test_bad_entries_are_skipped(self):
+        ui = self.from_config('ok|transmission|http://a;'
+                              'missing url|transmission;'
+                              '|transmission|http://b;'
+                              'bad:name|transmission|http://c;'
+                              'ok|rtorrent|scgi://d;'
+                              'down|broken|http://e;'
+                              'long|transmission|http://f|u|p|extra')
+        self.assertEqual([name for name, backend in ui.backends], ['ok'])
+
+
+    def test_nothing_usable(self):
+        self.assertRaises(TorrentUIError, self.from_config, 'down|broken|http://e; junk')
+        self.assertRaises(TorrentUIError, self.from_config, '')
+
+
+if __name__ == '__main__':
+    unittest.main()
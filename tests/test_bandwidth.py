@@ -0,0 +1,101 @@
+import time, unittest
+import bandwidth
+
+
+class FakeUI(object):
+    '''
+    Records the calls the scheduler makes, failing the ones in `failures` with the
+    exception given.
+    '''
+    def __init__(self, failures=None):
+        self.calls = []
+        self.failures = failures or {}
+
+
+    def call_connection(self, name, *args):
+        self.calls.append((name,) + args)
+        if name in self.failures:
+            raise self.failures[name]
+
+
+def at(hour, minute=0):
+    return time.mktime((2012, 6, 1, hour, minute, 0, 0, 0, -1))
+
+
+class ParseTest(unittest.TestCase):
+    def test_rates(self):
+        profile = bandwidth.parse_rates('500/50.5')
+        self.assertEqual((profile.download, profile.upload), (512000, 51712))
+        profile = bandwidth.parse_rates('-/20')
+        self.assertEqual((profile.download, profile.upload), (None, 20480))
+        profile = bandwidth.parse_rates('')
+        self.assertEqual((profile.download, profile.upload), (None, None))
+
+
+    def test_profile_with_torrent_limits(self):
+        profile = bandwidth.parse_profile('1000/100, abc:200/-,daemon:def:-/10,')
+        self.assertEqual((profile.download, profile.upload), (1024000, 102400))
+        self.assertEqual(profile.torrents, {'abc': (204800, None), 'daemon:def': (None, 10240)})
+
+
+    def test_schedule(self):
+        scheduler = bandwidth.BandwidthScheduler.from_config(None,
+            '08:00-18:00=500/50; 22:00-06:00=-/-; playback=-/20; default=1000/100')
+        self.assertEqual(scheduler.get_profile(now=at(12)).download, 512000)
+        self.assertEqual(scheduler.get_profile(now=at(18)).download, 1024000)
+        self.assertEqual(scheduler.get_profile(now=at(23)).download, None)
+        self.assertEqual(scheduler.get_profile(now=at(5, 59)).upload, None)
+        self.assertEqual(scheduler.get_profile(playing=True, now=at(12)).upload, 20480)
+
+
+class SchedulerTest(unittest.TestCase):
+    def test_disabled_without_limits(self):
+        ui = FakeUI()
+        bandwidth.BandwidthScheduler.from_config(ui, '').update(['a'])
+        self.assertEqual(ui.calls, [])
+
+
+    def test_limits_are_pushed_once(self):
+        ui = FakeUI()
+        scheduler = bandwidth.BandwidthScheduler.from_config(ui, 'default=100/10,a:5/5')
+        scheduler.update(['a', 'b'])
+        scheduler.update(['a', 'b'])
+        self.assertEqual(ui.calls, [
+            ('set_speed_limits', 102400, 10240),
+            ('set_torrent_speed_limits', {'a': (5120, 5120)}),
+        ])
+
+
+    def test_changed_profiles_reset_torrent_limits(self):
+        ui = FakeUI()
+        scheduler = bandwidth.BandwidthScheduler.from_config(ui, 'default=100/10,a:5/5; playback=-/-')
+        scheduler.update(['a'])
+        scheduler.update(['a'], playing=True)
+        self.assertEqual(ui.calls[2:], [
+            ('set_speed_limits', None, None),
+            ('set_torrent_speed_limits', {'a': (None, None)}),
+        ])
+        self.assertEqual(scheduler.applied_torrents, {})
+
+
+    def test_failed_pushes_are_retried(self):
+        ui = FakeUI({'set_speed_limits': IOError('down')})
+        scheduler = bandwidth.BandwidthScheduler.from_config(ui, 'default=100/10')
+        scheduler.update([])
+        del ui.failures['set_speed_limits']
+        scheduler.update([])
+        scheduler.update([])
+        self.assertEqual(len(ui.calls), 2)
+
+
+    def test_unsupported_torrent_limits_are_tried_once(self):
+        ui = FakeUI({'set_torrent_speed_limits': NotImplementedError('no')})
+        scheduler = bandwidth.BandwidthScheduler.from_config(ui, 'default=100/10,a:5/5')
+        scheduler.update(['a'])
+        scheduler.update(['a'])
+        self.assertEqual([call[0] for call in ui.calls], ['set_speed_limits', 'set_torrent_speed_limits'])
+        self.assertFalse(scheduler.torrent_limits)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import hashlib, unittest
+import bencode
+
+
+SINGLE = 'd8:announce3:url4:infod6:lengthi1024e4:name5:a.isoee'
+MULTI = 'd4:infod5:filesld6:lengthi10e4:pathl1:x5:y.txteed6:lengthi5e4:pathl5:z.nfoeee' \
+    '4:name3:diree'
+
+
+class DecodeTest(unittest.TestCase):
+    def test_values(self):
+        self.assertEqual(bencode.decode('i42e'), 42)
+        self.assertEqual(bencode.decode('i-3e'), -3)
+        self.assertEqual(bencode.decode('4:spam'), 'spam')
+        self.assertEqual(bencode.decode('0:'), '')
+        self.assertEqual(bencode.decode('l4:spami1ee'), ['spam', 1])
+        self.assertEqual(bencode.decode('d3:cow3:moo4:spaml1:a1:bee'),
+                         {'cow': 'moo', 'spam': ['a', 'b']})
+
+
+    def test_malformed(self):
+        for data in ('', 'x', 'i42', '5:spam', 'l4:spam', 'd3:cowe', 'i42ei1e', 'iabce'):
+            self.assertRaises(bencode.BencodeError, bencode.decode, data)
+
+
+class TorrentTest(unittest.TestCase):
+    def test_info_hash_covers_the_raw_info_dict(self):
+        metainfo, info_hash = bencode.decode_torrent(SINGLE)
+        self.assertEqual(metainfo['announce'], 'url')
+        self.assertEqual(info_hash, hashlib.sha1('d6:lengthi1024e4:name5:a.isoe').hexdigest())
+
+
+    def test_single_file(self):
+        torrent = bencode.parse_torrent(SINGLE)
+        self.assertEqual(torrent['name'], 'a.iso')
+        self.assertEqual(torrent['size_bytes'], 1024)
+        self.assertEqual(torrent['files'], [('a.iso', 1024)])
+
+
+    def test_multiple_files(self):
+        torrent = bencode.parse_torrent(MULTI)
+        self.assertEqual(torrent['files'], [('dir/x/y.txt', 10), ('dir/z.nfo', 5)])
+        self.assertEqual(torrent['size_bytes'], 15)
+
+
+    def test_not_a_torrent(self):
+        self.assertRaises(bencode.BencodeError, bencode.decode_torrent, 'l1:ae')
+        self.assertRaises(bencode.BencodeError, bencode.decode_torrent, 'd8:announce3:urle')
+        self.assertRaises(bencode.BencodeError, bencode.decode_torrent, 'd4:infoi1ee')
+        self.assertRaises(bencode.BencodeError, bencode.parse_torrent, 'd4:infod4:name1:aee')
+
+
+if __name__ == '__main__':
+    unittest.main()
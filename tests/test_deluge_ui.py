@@ -0,0 +1,139 @@
+import unittest
+from deluge_ui import DelugeUI
+from tests.test_torrent_ui import TestRenderer
+
+
+class FakeRequest(object):
+    def __init__(self, result):
+        self.result = result
+
+
+    def wait(self, timeout=None):
+        return self.result
+
+
+class FakeConnection(object):
+    '''
+    Stands in for a DelugeClient: answers core.get_torrents_status with the queued
+    `changes`, records every call and keeps the event handlers.
+    '''
+    timeout = 5
+
+
+    def __init__(self, changes, protocol=2):
+        self.changes = changes
+        self.protocol = protocol
+        self.connected = True
+        self.connects = 0
+        self.handlers = {}
+        self.calls = []
+
+
+    def subscribe(self, event, handler):
+        self.handlers[event] = handler
+
+
+    def is_connected(self):
+        return self.connected
+
+
+    def connect(self):
+        self.connected = True
+        self.connects += 1
+
+
+    def send(self, calls):
+        self.calls.extend([(method, args, kwargs) for method, args, kwargs in calls])
+        return [FakeRequest(self.changes.pop(0)),
+                FakeRequest({'payload_download_rate': 1024.0, 'payload_upload_rate': 0.0})]
+
+
+    def call(self, method, *args):
+        self.calls.append((method, args, {}))
+
+
+    def call_many(self, calls):
+        self.calls.extend(calls)
+
+
+class DelugeUITest(unittest.TestCase):
+    def create_ui(self, changes, protocol=2):
+        ui = DelugeUI(FakeConnection(changes, protocol), TestRenderer(), backend=True)
+        self.addCleanup(ui.renderer.remove)
+        return ui
+
+
+    def get_torrents(self, ui):
+        return dict([(torrent['id'], torrent) for torrent in ui.get_torrents()])
+
+
+    def test_changes_are_merged(self):
+        ui = self.create_ui([
+            {'a': {'name': 'A', 'state': 'Downloading', 'progress': 50.0, 'download_payload_rate': 100,
+                   'total_wanted': 200, 'total_done': 100},
+             'b': {'name': 'B', 'state': 'Seeding', 'progress': 100.0}},
+            {'a': {'download_payload_rate': 300, 'total_done': 150}},
+        ])
+        ui.get_torrents()
+        torrents = self.get_torrents(ui)
+        self.assertEqual([call[2] for call in ui.connection.calls if call[0] == 'core.get_torrents_status'],
+                         [{'diff': False}, {'diff': True}])
+        self.assertEqual(torrents['a']['label'], 'A')
+        self.assertEqual(torrents['a']['rate_download_bytes'], 300)
+        self.assertEqual(torrents['a']['size_left_bytes'], 50)
+        self.assertEqual(torrents['b']['status'], 'Seeding')
+
+
+    def test_full_refreshes_replace_the_table(self):
+        ui = self.create_ui([{'a': {'name': 'A'}}, {'b': {'name': 'B'}}])
+        ui.get_torrents()
+        ui.full_refresh_interval = 0
+        self.assertEqual(self.get_torrents(ui).keys(), ['b'])
+
+
+    def test_reconnects_fetch_everything(self):
+        ui = self.create_ui([{'a': {'name': 'A'}}, {'b': {'name': 'B'}}])
+        ui.get_torrents()
+        ui.connection.connected = False
+        self.assertEqual(self.get_torrents(ui).keys(), ['b'])
+        self.assertEqual(ui.connection.connects, 1)
+
+
+    def test_events_update_the_table(self):
+        ui = self.create_ui([{'a': {'name': 'A', 'state': 'Downloading'}, 'b': {'name': 'B'}}])
+        ui.get_torrents()
+        handlers = ui.connection.handlers
+        handlers['TorrentStateChangedEvent']('a', 'Paused')
+        handlers['TorrentRemovedEvent']('b')
+        handlers['TorrentStateChangedEvent']('unknown', 'Paused')
+        self.assertEqual([(torrent['id'], torrent['status']) for torrent in ui.get_details(['a', 'b'])],
+                         [('a', 'Paused')])
+        self.assertEqual(ui.get_ids(), ['a'])
+
+
+    def test_actions_by_protocol(self):
+        ui = self.create_ui([], protocol=1)
+        ui.start_torrents(['a'])
+        ui.connection.protocol = 2
+        ui.start_torrents(['a'])
+        ui.stop_torrents(['a', 'b'])
+        ui.delete_torrents(['a', 'b'], files=True)
+        self.assertEqual(ui.connection.calls, [
+            ('core.resume_torrent', (['a'],), {}),
+            ('core.resume_torrents', (['a'],), {}),
+            ('core.pause_torrents', (['a', 'b'],), {}),
+            ('core.remove_torrent', ('a', True), {}),
+            ('core.remove_torrent', ('b', True), {}),
+        ])
+
+
+    def test_speed_limits_are_in_kib(self):
+        ui = self.create_ui([])
+        ui.set_speed_limits(2048, None)
+        self.assertEqual(ui.connection.calls, [
+            ('core.set_config', ({'max_download_speed': 2.0, 'max_upload_speed': -1},), {})
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,27 @@
+import unittest
+from detection import is_qbittorrent_response
+
+
+class QBittorrentResponseTest(unittest.TestCase):
+    def test_logged_in(self):
+        self.assertTrue(is_qbittorrent_response(200, '2.8.3', None))
+        self.assertTrue(is_qbittorrent_response(200, '2.0\n', None))
+        self.assertFalse(is_qbittorrent_response(200, '<html>Welcome</html>', None))
+        self.assertFalse(is_qbittorrent_response(200, '', None))
+
+
+    def test_logged_out(self):
+        self.assertTrue(is_qbittorrent_response(403, 'Forbidden', None))
+        self.assertTrue(is_qbittorrent_response(403, '', 'SID=abc; HttpOnly; path=/'))
+        self.assertTrue(is_qbittorrent_response(403, '', 'QBT_SID_8080=abc; HttpOnly'))
+        self.assertFalse(is_qbittorrent_response(403, '<h1>403 Forbidden</h1>', None))
+        self.assertFalse(is_qbittorrent_response(403, '', 'PHPSESSID=abc'))
+
+
+    def test_other_statuses(self):
+        self.assertFalse(is_qbittorrent_response(404, 'Forbidden', 'SID=abc'))
+        self.assertFalse(is_qbittorrent_response(401, '', None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+import events
+
+
+def torrent(id, status='Downloading', percent_done=0, rate_download=0, rate_upload=0):
+    return {'id': id, 'status': status, 'percent_done': percent_done,
+            'rate_download_bytes': rate_download, 'rate_upload_bytes': rate_upload}
+
+
+class EventBusTest(unittest.TestCase):
+    def setUp(self):
+        self.bus = events.EventBus()
+        self.received = []
+        self.subscription = self.bus.subscribe(self.received.append)
+
+
+    def publish(self, *torrents):
+        return self.bus.publish(list(torrents))
+
+
+    def get_types(self):
+        return sorted([(event['type'], event['id']) for event in self.received])
+
+
+    def test_first_snapshot_is_the_baseline(self):
+        self.assertEqual(self.publish(torrent(1)), [])
+        self.assertEqual(self.received, [])
+
+
+    def test_added_and_removed(self):
+        self.publish(torrent(1))
+        self.publish(torrent(2))
+        self.assertEqual(self.get_types(), [(events.ADDED, 2), (events.REMOVED, 1)])
+        removed = [event for event in self.received if event['type'] == events.REMOVED][0]
+        self.assertEqual(removed['torrent']['id'], 1)
+
+
+    def test_state_change(self):
+        self.publish(torrent(1))
+        self.publish(torrent(1, status='Seeding'))
+        self.assertEqual(len(self.received), 1)
+        self.assertEqual(self.received[0]['status'], 'Seeding')
+        self.assertEqual(self.received[0]['previous_status'], 'Downloading')
+
+
+    def test_progress_thresholds_and_completion(self):
+        self.publish(torrent(1, percent_done=10))
+        self.publish(torrent(1, percent_done=60))
+        self.assertEqual([event['threshold'] for event in self.received], [25, 50])
+        del self.received[:]
+        self.publish(torrent(1, percent_done=100))
+        self.assertEqual([event['type'] for event in self.received], [events.COMPLETED, events.PROGRESS])
+        del self.received[:]
+        self.publish(torrent(1, percent_done=100))
+        self.assertEqual(self.received, [])
+
+
+    def test_rate_changes_need_both_relative_and_absolute_change(self):
+        self.publish(torrent(1, rate_download=100000))
+        self.publish(torrent(1, rate_download=120000))
+        self.assertEqual(self.received, [])
+        self.publish(torrent(1, rate_download=300000))
+        self.assertEqual(self.received[0]['type'], events.RATE_CHANGED)
+        self.assertEqual(self.received[0]['rate_download'], 300000)
+        del self.received[:]
+        self.publish(torrent(1, rate_download=305000, rate_upload=5000))
+        self.assertEqual(self.received, [])
+
+
+    def test_filters(self):
+        self.bus.unsubscribe(self.subscription)
+        completed = []
+        self.bus.subscribe(completed.append, types=[events.COMPLETED], ids=[2])
+        tested = []
+        self.bus.subscribe(tested.append, test=lambda event: event['id'] == 1)
+        self.publish(torrent(1), torrent(2))
+        self.publish(torrent(1, percent_done=100), torrent(2, percent_done=100))
+        self.assertEqual([(event['type'], event['id']) for event in completed], [(events.COMPLETED, 2)])
+        self.assertEqual(set([event['id'] for event in tested]), set([1]))
+        self.assertEqual(self.received, [])
+
+
+    def test_failing_subscriber_does_not_stop_the_others(self):
+        def fail(event):
+            raise ValueError('test')
+        self.bus.unsubscribe(self.subscription)
+        self.bus.subscribe(fail)
+        self.subscription = self.bus.subscribe(self.received.append)
+        self.publish(torrent(1))
+        self.publish(torrent(2))
+        self.assertEqual(len(self.received), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import threading, unittest
+from file_cache import FileCache
+
+
+class FakeUI(object):
+    '''
+    A daemon with one torrent of three files. Each call is recorded, `on_set` runs
+    while priorities are being sent.
+    '''
+    def __init__(self):
+        self.priorities = ['normal', 'normal', 'normal']
+        self.done = [0, 0, 0]
+        self.calls = []
+        self.on_set = None
+        self.fail = False
+
+
+    def call_connection(self, method, *args):
+        self.calls.append(method)
+        return getattr(self, method)(*args)
+
+
+    def get_files(self, id):
+        return [{'index': index, 'name': 'file%d' % index, 'size_bytes': 100,
+                 'done_bytes': self.done[index], 'priority': self.priorities[index]} for index in range(3)]
+
+
+    def get_file_progress(self, id, files):
+        return list(self.done)
+
+
+    def set_file_priorities(self, id, priorities):
+        if self.on_set:
+            self.on_set()
+        if self.fail:
+            raise Exception('refused')
+        for index, priority in priorities.items():
+            self.priorities[index] = priority
+
+
+class FileCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.ui = FakeUI()
+        self.cache = FileCache(self.ui, delay=60)
+        self.addCleanup(self.cancel_timers)
+
+
+    def cancel_timers(self):
+        # Flushed by hand, so `flush` already dropped some of them from the cache.
+        for thread in threading.enumerate():
+            if isinstance(thread, threading._Timer):
+                thread.cancel()
+
+
+    def get_priorities(self, files):
+        return [file['priority'] for file in files]
+
+
+    def test_lists_are_loaded_once(self):
+        self.cache.get('a', 10.0)
+        self.cache.get('a', 10.0)
+        self.ui.done = [50, 0, 0]
+        files = self.cache.get('a', 20.0)
+        self.assertEqual(self.ui.calls, ['get_files', 'get_file_progress'])
+        self.assertEqual([file['done_bytes'] for file in files], [50, 0, 0])
+        self.assertEqual(self.cache.get_cached('b'), None)
+
+
+    def test_pending_priorities_cover_a_fetched_list(self):
+        self.cache.set_priority('a', 0, 'high')
+        self.cache.set_priority('a', 2, 'skip')
+        # Loaded after the changes, the daemon still has the old priorities.
+        self.assertEqual(self.get_priorities(self.cache.get('a')), ['high', 'normal', 'skip'])
+        self.assertEqual(self.ui.priorities, ['normal', 'normal', 'normal'])
+
+
+    def test_priorities_being_sent_cover_a_fetched_list(self):
+        seen = []
+        def refetch():
+            self.cache.invalidate('a')
+            seen.append(self.get_priorities(self.cache.get('a')))
+        self.ui.on_set = refetch
+        self.cache.set_priority('a', 1, 'low')
+        self.cache.flush('a')
+        self.assertEqual(seen, [['normal', 'low', 'normal']])
+        self.assertEqual(self.cache.sending, {})
+
+
+    def test_changes_are_sent_in_one_batch(self):
+        self.cache.get('a')
+        self.cache.set_priority('a', 0, 'low')
+        self.cache.set_priority('a', 1, 'high')
+        self.cache.set_priority('a', 0, 'skip')
+        self.assertEqual(self.get_priorities(self.cache.get_cached('a')), ['skip', 'high', 'normal'])
+        self.cache.flush('a')
+        self.cache.flush('a')
+        self.assertEqual(self.ui.calls, ['get_files', 'set_file_priorities'])
+        self.assertEqual(self.ui.priorities, ['skip', 'high', 'normal'])
+
+
+    def test_rejected_changes_drop_the_list(self):
+        self.cache.get('a')
+        self.ui.fail = True
+        self.cache.set_priority('a', 0, 'high')
+        self.cache.flush('a')
+        self.assertEqual(self.cache.get_cached('a'), None)
+        self.assertEqual(self.get_priorities(self.cache.get('a')), ['normal', 'normal', 'normal'])
+
+
+    def test_prune(self):
+        self.cache.get('a')
+        self.cache.get('b')
+        self.cache.prune({'b': {}})
+        self.assertEqual(self.cache.get_cached('a'), None)
+        self.assertNotEqual(self.cache.get_cached('b'), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
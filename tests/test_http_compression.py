@@ -0,0 +1,59 @@
+import gzip, StringIO, unittest, zlib
+import http_compression
+
+
+class SmallReads(object):
+    '''
+    A response whose reads return at most `size` bytes, like a slow socket.
+    '''
+    def __init__(self, data, size=7):
+        self.data = StringIO.StringIO(data)
+        self.size = size
+
+
+    def read(self, size=-1):
+        if size < 0:
+            return self.data.read()
+        return self.data.read(min(size, self.size))
+
+
+BODY = '{"arguments": {"torrents": []}, "result": "success"}' * 50
+
+
+def gzip_data(data):
+    buffer = StringIO.StringIO()
+    gzip_file = gzip.GzipFile(fileobj=buffer, mode='wb')
+    gzip_file.write(data)
+    gzip_file.close()
+    return buffer.getvalue()
+
+
+class ReadResponseTest(unittest.TestCase):
+    def test_identity(self):
+        self.assertEqual(http_compression.read_response(SmallReads(BODY), None), (BODY, len(BODY)))
+        self.assertEqual(http_compression.read_response(SmallReads(BODY), 'identity'), (BODY, len(BODY)))
+
+
+    def test_gzip(self):
+        data = gzip_data(BODY)
+        for encoding in ('gzip', ' X-Gzip '):
+            self.assertEqual(http_compression.read_response(SmallReads(data), encoding), (BODY, len(data)))
+
+
+    def test_deflate(self):
+        data = zlib.compress(BODY)
+        self.assertEqual(http_compression.read_response(SmallReads(data), 'deflate'), (BODY, len(data)))
+
+
+    def test_raw_deflate(self):
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+        data = compressor.compress(BODY) + compressor.flush()
+        self.assertEqual(http_compression.read_response(SmallReads(data), 'deflate'), (BODY, len(data)))
+
+
+    def test_corrupt(self):
+        self.assertRaises(zlib.error, http_compression.read_response, SmallReads('not gzip data'), 'gzip')
+
+
+if __name__ == '__main__':
+    unittest.main()
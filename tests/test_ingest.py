@@ -0,0 +1,73 @@
+import os, shutil, tempfile, time, unittest
+import ingest
+from tests.test_bencode import SINGLE
+
+
+class FakeUI(object):
+    def __init__(self):
+        self.info_hashes = set()
+        self.added = []
+
+
+    def get_info_hashes(self):
+        return set(self.info_hashes)
+
+
+    def call_connection(self, name, torrents):
+        self.added.extend(torrents)
+
+
+class IngesterTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.ui = FakeUI()
+        self.ingester = ingest.Ingester(self.ui, self.directory)
+
+
+    def drop(self, name, data=SINGLE):
+        path = os.path.join(self.directory, name)
+        torrent_file = open(path, 'wb')
+        torrent_file.write(data)
+        torrent_file.close()
+        return path
+
+
+    def set_mtime(self, mtime):
+        os.utime(self.directory, (mtime, mtime))
+
+
+    def test_adds_and_renames(self):
+        self.drop('a.torrent')
+        self.drop('b.torrent', SINGLE.replace('a.iso', 'b.iso'))
+        self.drop('c.torrent', SINGLE)
+        self.drop('d.torrent', 'garbage')
+        self.drop('notes.txt', 'x')
+        self.assertEqual([torrent['name'] for torrent in self.ingester.update()], ['a.iso', 'b.iso'])
+        self.assertEqual(len(self.ui.added), 2)
+        self.assertEqual(sorted(os.listdir(self.directory)), ['a.torrent.added', 'b.torrent.added',
+                         'c.torrent.duplicate', 'd.torrent.invalid', 'notes.txt'])
+
+
+    def test_unchanged_folders_are_not_listed_again(self):
+        # Whole seconds, so setting it again gives the same modification time.
+        mtime = int(time.time()) - 60
+        self.set_mtime(mtime)
+        self.ingester.update()
+        # Dropped without changing the modification time.
+        self.drop('a.torrent')
+        self.set_mtime(mtime)
+        self.assertEqual(self.ingester.update(), [])
+
+
+    def test_files_dropped_in_the_same_tick_are_found(self):
+        mtime = int(time.time())
+        self.set_mtime(mtime)
+        self.ingester.update()
+        self.drop('a.torrent')
+        self.set_mtime(mtime)
+        self.assertEqual([torrent['name'] for torrent in self.ingester.update()], ['a.iso'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+import BaseHTTPServer, SocketServer, json, threading, unittest
+from qbittorrent_client import QBittorrentClient, QBittorrentClientFailure
+from qbittorrent_ui import QBittorrentUI
+from tests.test_torrent_ui import TestRenderer
+
+
+class WebUIHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    '''
+    Answers like the qBittorrent WebUI: a session cookie from auth/login, 403 for
+    requests without a valid one, and the status in `server.statuses` for the
+    other paths it has one for.
+    '''
+    def do_GET(self):
+        self.answer()
+
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.getheader('content-length') or 0))
+        self.answer()
+
+
+    def answer(self):
+        path = self.path.split('?', 1)[0][len('/api/v2/'):]
+        self.server.requests.append(path)
+        headers = {}
+        if path == 'auth/login':
+            self.server.session += 1
+            status, body = 200, 'Ok.'
+            headers['Set-Cookie'] = 'SID=%d; HttpOnly; path=/' % self.server.session
+        elif self.headers.getheader('cookie') != 'SID=%d' % self.server.session:
+            status, body = 403, 'Forbidden'
+        else:
+            status, body = self.server.statuses.get(path, 200), json.dumps({'rid': 1})
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def log_message(self, *args):
+        pass
+
+
+class WebUIServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+    def __init__(self):
+        self.requests = []
+        self.statuses = {}
+        self.session = 0
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), WebUIHandler)
+
+
+class ClientTest(unittest.TestCase):
+    def setUp(self):
+        self.server = WebUIServer()
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.setDaemon(True)
+        thread.start()
+        self.client = QBittorrentClient('http://127.0.0.1:%d' % self.server.server_address[1], timeout=5)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+
+    def test_expired_sessions_log_in_again(self):
+        # The WebUI restarted and forgot the session.
+        self.server.session += 1
+        self.assertEqual(self.client.sync_maindata(), {'rid': 1})
+        self.assertEqual(self.server.requests, ['auth/login', 'sync/maindata', 'auth/login', 'sync/maindata'])
+
+
+    def test_logs_in_again_only_once(self):
+        self.server.statuses['sync/maindata'] = 403
+        try:
+            self.client.sync_maindata()
+        except QBittorrentClientFailure, e:
+            self.assertEqual(e.code, 403)
+        else:
+            self.fail('403 not raised')
+        self.assertEqual(self.server.requests, ['auth/login', 'sync/maindata', 'auth/login', 'sync/maindata'])
+
+
+    def test_start_falls_back_to_resume_on_404(self):
+        self.server.statuses['torrents/start'] = 404
+        self.client.torrents_start(['abc'])
+        self.server.statuses['torrents/stop'] = 404
+        self.client.torrents_stop(['abc'])
+        self.assertEqual(self.server.requests[1:], ['torrents/start', 'torrents/resume',
+                                                    'torrents/stop', 'torrents/pause'])
+
+
+    def test_start_errors_are_raised(self):
+        self.server.statuses['torrents/start'] = 500
+        self.assertRaises(QBittorrentClientFailure, self.client.torrents_start, ['abc'])
+        self.assertEqual(self.server.requests[1:], ['torrents/start'])
+
+
+class FakeConnection(object):
+    '''
+    Answers sync_maindata with the queued `responses`.
+    '''
+    def __init__(self, responses):
+        self.responses = responses
+        self.rids = []
+
+
+    def sync_maindata(self, rid=0):
+        self.rids.append(rid)
+        return self.responses.pop(0)
+
+
+class SyncTest(unittest.TestCase):
+    def create_ui(self, responses):
+        ui = QBittorrentUI(FakeConnection(responses), TestRenderer(), backend=True)
+        self.addCleanup(ui.renderer.remove)
+        return ui
+
+
+    def test_partial_updates_are_merged(self):
+        ui = self.create_ui([
+            {'rid': 1, 'full_update': True, 'server_state': {'dl_info_speed': 10, 'up_info_speed': 5},
+             'torrents': {'a': {'name': u'A', 'state': 'downloading', 'progress': 0.5, 'dlspeed': 100},
+                          'b': {'name': u'B', 'state': 'uploading', 'progress': 1.0}}},
+            {'rid': 2, 'server_state': {'dl_info_speed': 20},
+             'torrents': {'a': {'dlspeed': 300, 'progress': 0.75}}},
+        ])
+        ui.get_snapshot()
+        torrents = dict([(torrent['id'], torrent) for torrent in ui.get_torrents()])
+        self.assertEqual(ui.connection.rids, [0, 1])
+        self.assertEqual(torrents['a']['label'], 'A')
+        self.assertEqual(torrents['a']['status'], 'Downloading')
+        self.assertEqual(torrents['a']['rate_download_bytes'], 300)
+        self.assertEqual(torrents['a']['percent_done'], 75.0)
+        self.assertEqual(torrents['b']['status'], 'Seeding')
+        self.assertEqual(ui.server_state, {'dl_info_speed': 20, 'up_info_speed': 5})
+
+
+    def test_removed_torrents(self):
+        ui = self.create_ui([
+            {'rid': 1, 'full_update': True, 'torrents': {'a': {'name': u'A'}, 'b': {'name': u'B'}}},
+            {'rid': 2, 'torrents_removed': ['a', 'unknown']},
+        ])
+        ui.get_torrents()
+        self.assertEqual([torrent['id'] for torrent in ui.get_torrents()], ['b'])
+
+
+    def test_full_updates_replace_the_table(self):
+        ui = self.create_ui([
+            {'rid': 1, 'full_update': True, 'torrents': {'a': {'name': u'A', 'dlspeed': 100}}},
+            {'rid': 2, 'full_update': True, 'torrents': {'b': {'name': u'B'}}},
+        ])
+        ui.get_torrents()
+        self.assertEqual(ui.get_torrents()[0]['id'], 'b')
+        self.assertEqual(ui.table, {'b': {'name': u'B'}})
+
+
+if __name__ == '__main__':
+    unittest.main()
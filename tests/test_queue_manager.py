@@ -0,0 +1,118 @@
+import unittest
+import queue_manager
+
+
+class FakeActions(object):
+    def __init__(self):
+        self.pending = set()
+
+
+    def is_pending(self, id):
+        return id in self.pending
+
+
+class FakeUI(object):
+    def __init__(self):
+        self.actions = FakeActions()
+        self.calls = []
+
+
+    def call_connection(self, name, ids):
+        self.calls.append((name, ids))
+
+
+def torrent(id, status='Downloading', rate_download=100000, rate_upload=0, **extra):
+    extra.update({'id': id, 'status': status, 'rate_download_bytes': rate_download,
+                  'rate_upload_bytes': rate_upload})
+    return extra
+
+
+class QueueManagerTest(unittest.TestCase):
+    def setUp(self):
+        self.ui = FakeUI()
+
+
+    def test_disabled_by_default(self):
+        manager = queue_manager.QueueManager(self.ui)
+        self.assertEqual(manager.update([torrent(1, rate_download=0)], now=0), ([], []))
+
+
+    def test_from_config(self):
+        settings = {'queue_max_downloads': '0', 'queue_max_seeds': '', 'queue_stall_grace': '600'}
+        manager = queue_manager.QueueManager.from_config(self.ui, settings.get)
+        self.assertEqual((manager.max_downloads, manager.max_seeds, manager.grace), (0, None, 600))
+        self.assertFalse(queue_manager.QueueManager.from_config(self.ui, {}.get).is_enabled())
+
+
+    def test_slowest_downloads_make_room(self):
+        manager = queue_manager.QueueManager(self.ui, max_downloads=1)
+        started, stopped = manager.update([torrent(1, rate_download=5000), torrent(2)], now=0)
+        self.assertEqual((started, stopped), ([], [1]))
+        # A freed slot goes to the queued torrent.
+        started, stopped = manager.update([torrent(1, 'Paused'), torrent(2, 'Seeding')], now=1)
+        self.assertEqual((started, stopped), ([1], []))
+        self.assertEqual(self.ui.calls, [('stop_torrents', [1]), ('start_torrents', [1])])
+
+
+    def test_priority_goes_first(self):
+        manager = queue_manager.QueueManager(self.ui, max_downloads=1)
+        manager.update([
+            torrent(1, rate_download=900000),
+            torrent(2, rate_download=2000, priority='low'),
+            torrent(3, rate_download=1000, priority='high'),
+            torrent(4, rate_download=3000),
+        ], now=0)
+        paused = [torrent(id, 'Paused', priority=priority)
+                  for id, priority in ((2, 'low'), (3, 'high'), (4, 'normal'))]
+        started, stopped = manager.update([torrent(1, 'Seeding')] + paused, now=1)
+        self.assertEqual(started, [3])
+
+
+    def test_priority_changes_while_queued(self):
+        manager = queue_manager.QueueManager(self.ui, max_downloads=1)
+        manager.update([torrent(1, rate_download=900000), torrent(2, priority='low'),
+                        torrent(3, priority='high')], now=0)
+        started, stopped = manager.update([torrent(1, 'Seeding'), torrent(2, 'Paused', priority='high'),
+                                           torrent(3, 'Paused', priority='low')], now=1)
+        self.assertEqual(started, [2])
+
+
+    def test_stalled_downloads_wait_out_the_grace(self):
+        manager = queue_manager.QueueManager(self.ui, grace=30)
+        self.assertEqual(manager.update([torrent(1, rate_download=0)], now=0), ([], []))
+        self.assertEqual(manager.update([torrent(1, peers_connected=0)], now=29), ([], []))
+        self.assertEqual(manager.update([torrent(1, rate_download=0)], now=30), ([], [1]))
+        self.assertEqual(manager.update([torrent(1, 'Paused')], now=40), ([], []))
+        self.assertEqual(manager.update([torrent(1, 'Paused')], now=60), ([1], []))
+        self.assertEqual(manager.stalls, {1: 1})
+        # Started again, it gets another grace period.
+        self.assertEqual(manager.update([torrent(1, rate_download=0)], now=61), ([], []))
+
+
+    def test_fewest_stalls_first(self):
+        manager = queue_manager.QueueManager(self.ui, max_downloads=1)
+        manager.stalls = {1: 2}
+        manager.update([torrent(3, rate_download=900000), torrent(1), torrent(2)], now=0)
+        started, stopped = manager.update([torrent(3, 'Seeding'), torrent(1, 'Paused'),
+                                           torrent(2, 'Paused')], now=1)
+        self.assertEqual(started, [2])
+
+
+    def test_user_paused_and_pending_torrents_are_left_alone(self):
+        manager = queue_manager.QueueManager(self.ui, max_downloads=1)
+        self.ui.actions.pending.add(2)
+        started, stopped = manager.update([torrent(1, 'Paused'), torrent(2), torrent(3)], now=0)
+        self.assertEqual((started, stopped), ([], []))
+
+
+    def test_seeds(self):
+        manager = queue_manager.QueueManager(self.ui, max_seeds=1)
+        started, stopped = manager.update([torrent(1, 'Seeding', rate_upload=10),
+                                           torrent(2, 'Seeding', rate_upload=20)], now=0)
+        self.assertEqual(stopped, [1])
+        started, stopped = manager.update([torrent(1, 'Paused')], now=1)
+        self.assertEqual(started, [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
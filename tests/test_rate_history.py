@@ -0,0 +1,59 @@
+import unittest
+import rate_history
+
+
+class RateHistoryTest(unittest.TestCase):
+    def setUp(self):
+        self.history = rate_history.RateHistory(samples=3, slots=2)
+
+
+    def test_rates_oldest_first(self):
+        self.history.add('a', 1, 10)
+        self.history.add('a', 2, 20)
+        self.assertEqual(self.history.get_rates('a'), ([1, 2], [10, 20]))
+
+
+    def test_ring_keeps_the_last_samples(self):
+        for rate in range(1, 6):
+            self.history.add('a', rate, -rate)
+        self.assertEqual(self.history.get_rates('a'), ([3, 4, 5], [-3, -4, -5]))
+
+
+    def test_torrents_do_not_share_samples(self):
+        self.history.add('a', 1, 0)
+        self.history.add('b', 2, 0)
+        self.history.add('c', 3, 0)
+        self.assertEqual(self.history.get_rates('a')[0], [1])
+        self.assertEqual(self.history.get_rates('b')[0], [2])
+        self.assertEqual(self.history.get_rates('c')[0], [3])
+        self.assertEqual(self.history.get_rates('d'), ([], []))
+
+
+    def test_freed_slots_are_reused_empty(self):
+        self.history.add('a', 1, 0)
+        self.history.add('b', 2, 0)
+        self.history.prune(['b'])
+        self.history.add('c', 3, 0)
+        self.assertEqual(self.history.get_rates('a'), ([], []))
+        self.assertEqual(self.history.get_rates('c')[0], [3])
+        self.assertEqual(len(self.history.counts), 2)
+
+
+    def test_smoothed_weighs_newer_samples_more(self):
+        self.assertEqual(self.history.get_smoothed('a'), (0.0, 0.0))
+        self.history.add('a', 0, 30)
+        self.history.add('a', 30, 0)
+        self.assertEqual(self.history.get_smoothed('a'), (20.0, 10.0))
+
+
+    def test_eta(self):
+        self.assertEqual(self.history.get_eta('a', 100), None)
+        self.history.add('a', 0.5, 0)
+        self.assertEqual(self.history.get_eta('a', 100), None)
+        self.history.add('a', 100, 0)
+        self.history.add('a', 100, 0)
+        self.assertEqual(self.history.get_eta('a', 1000), 11)
+
+
+if __name__ == '__main__':
+    unittest.main()
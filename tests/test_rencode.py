@@ -0,0 +1,133 @@
+import struct, unittest, zlib
+import rencode, deluge_client
+
+
+class RencodeTest(unittest.TestCase):
+    def assertRoundTrip(self, value, expected=None):
+        if expected is None:
+            expected = value
+        self.assertEqual(rencode.loads(rencode.dumps(value)), expected)
+
+
+    def test_ints(self):
+        for value in (0, 1, 43, 44, -1, -32, -33, 127, -128, 128, 32767, -32769,
+                      2 ** 31, -2 ** 63, 2 ** 64, -2 ** 70):
+            self.assertRoundTrip(value)
+
+
+    def test_fixed_ints_take_one_byte(self):
+        self.assertEqual(len(rencode.dumps(43)), 1)
+        self.assertEqual(len(rencode.dumps(-32)), 1)
+
+
+    def test_floats_and_constants(self):
+        self.assertRoundTrip(1.5)
+        self.assertRoundTrip(True)
+        self.assertRoundTrip(False)
+        self.assertRoundTrip(None)
+
+
+    def test_strings(self):
+        self.assertRoundTrip('')
+        self.assertRoundTrip('x' * 63)
+        self.assertRoundTrip('x' * 64)
+        self.assertRoundTrip('x' * 5000)
+        self.assertRoundTrip(u'caf\xe9', 'caf\xc3\xa9')
+
+
+    def test_lists_come_back_as_tuples(self):
+        self.assertRoundTrip([1, 'a', None], (1, 'a', None))
+        self.assertRoundTrip(tuple(range(63)))
+        self.assertRoundTrip(tuple(range(100)))
+
+
+    def test_dicts(self):
+        self.assertRoundTrip({'a': 1, 'b': (2, 3)})
+        big = dict([('key%d' % index, index) for index in range(30)])
+        self.assertRoundTrip(big)
+
+
+    def test_nested(self):
+        self.assertRoundTrip({'torrents': {'abc': {'name': 'x', 'progress': 12.5, 'files': ('a', 'b')}}})
+
+
+    def test_malformed(self):
+        self.assertRaises(rencode.RencodeError, rencode.loads, rencode.dumps('abc')[:-1])
+        self.assertRaises(rencode.RencodeError, rencode.loads, rencode.dumps(1) + 'x')
+        self.assertRaises(rencode.RencodeError, rencode.loads, chr(rencode.CHR_LIST) + chr(1))
+        self.assertRaises(rencode.RencodeError, rencode.dumps, object())
+
+
+class FakeSocket(object):
+    '''
+    Hands out the given chunks from recv, then reports the connection closed.
+    '''
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+
+
+    def recv(self, size):
+        if self.chunks:
+            return self.chunks.pop(0)
+        return ''
+
+
+class OfflineClient(deluge_client.DelugeClient):
+    def connect(self):
+        pass
+
+
+class FramingTest(unittest.TestCase):
+    calls = [(1, 'core.get_torrents_status', ({}, ('name',)), {}), (2, 'daemon.info', (), {})]
+
+
+    def test_deluge2_header(self):
+        data = deluge_client.encode_message(self.calls)
+        version, length = struct.unpack('!BI', data[:5])
+        self.assertEqual(version, 1)
+        self.assertEqual(length, len(data) - 5)
+        self.assertEqual(rencode.loads(zlib.decompress(data[5:])), tuple(self.calls))
+
+
+    def test_deluge1_has_no_header(self):
+        data = deluge_client.encode_message(self.calls, protocol=1)
+        self.assertEqual(rencode.loads(zlib.decompress(data)), tuple(self.calls))
+
+
+    def read(self, protocol, chunks):
+        client = OfflineClient(protocol=protocol)
+        requests = [deluge_client.DelugeRequest(id, 'test', 0) for id in (1, 2)]
+        client.pending = dict([(request.id, request) for request in requests])
+        client.read_messages(FakeSocket(chunks))
+        return requests
+
+
+    def answers(self, protocol):
+        # The daemon sends each answer as a message of its own.
+        return deluge_client.encode_message((deluge_client.RPC_RESPONSE, 1, 'one'), protocol) + \
+            deluge_client.encode_message((deluge_client.RPC_ERROR, 2, 'Error', 'no'), protocol)
+
+
+    def test_reads_split_deluge2_messages(self):
+        data = self.answers(2)
+        # Chunks split inside the header and inside the payload.
+        requests = self.read(2, [data[:3], data[3:20], data[20:]])
+        self.assertEqual(requests[0].wait(0), 'one')
+        self.assertRaises(deluge_client.DelugeRPCError, requests[1].wait, 0)
+
+
+    def test_reads_deluge1_streams(self):
+        data = self.answers(1)
+        requests = self.read(1, [data[:7], data[7:]])
+        self.assertEqual(requests[0].wait(0), 'one')
+        self.assertRaises(deluge_client.DelugeRPCError, requests[1].wait, 0)
+
+
+    def test_rejects_unknown_version(self):
+        data = self.answers(2)
+        requests = self.read(2, [chr(2) + data[1:]])
+        self.assertRaises(deluge_client.DelugeClientFailure, requests[0].wait, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
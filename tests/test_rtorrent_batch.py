@@ -0,0 +1,94 @@
+import SocketServer, StringIO, threading, unittest, xmlrpclib
+import rtorrent_client
+
+
+class MulticallHandler(SocketServer.StreamRequestHandler):
+    '''
+    Answers system.multicall like rTorrent: a [result] list per call, a fault
+    struct for calls to 'fail'.
+    '''
+    def handle(self):
+        length = ''
+        while not length.endswith(':'):
+            length += self.rfile.read(1)
+        headers = self.rfile.read(int(length[:-1]) + 1).split('\x00')
+        body = self.rfile.read(int(dict(zip(headers[::2], headers[1::2]))['CONTENT_LENGTH']))
+        (calls,), methodname = xmlrpclib.loads(body)
+        self.server.requests.append((methodname, len(calls)))
+        results = []
+        for call in calls:
+            if call['methodName'] == 'fail':
+                results.append({'faultCode': -501, 'faultString': 'Unsupported target type found.'})
+            else:
+                results.append([[call['methodName']] + call['params']])
+        response = xmlrpclib.dumps((results,), methodresponse=True)
+        self.wfile.write('Status: 200 OK\r\nContent-Type: text/xml\r\n\r\n' + response)
+
+
+class MulticallServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+    def __init__(self):
+        self.requests = []
+        SocketServer.TCPServer.__init__(self, ('127.0.0.1', 0), MulticallHandler)
+
+
+class ParseTest(unittest.TestCase):
+    def test_parse_batch_line(self):
+        self.assertEqual(rtorrent_client.parse_batch_line('d.start abc'), ('d.start', ('abc',)))
+        self.assertEqual(rtorrent_client.parse_batch_line("d.set_directory abc 'My Files/x' i/3"),
+                         ('d.set_directory', ('abc', 'My Files/x', 3)))
+        self.assertEqual(rtorrent_client.parse_batch_line('system.pid # comment'), ('system.pid', ()))
+        self.assertEqual(rtorrent_client.parse_batch_line('   '), None)
+        self.assertEqual(rtorrent_client.parse_batch_line('# d.stop abc'), None)
+
+
+    def test_chunks(self):
+        lines = ['m%d' % index for index in range(5)] + ['', '# skipped']
+        chunks = list(rtorrent_client.gen_batch_chunks(lines, 2))
+        self.assertEqual([[call[0] for call in chunk] for chunk in chunks], [['m0', 'm1'], ['m2', 'm3'], ['m4']])
+        self.assertEqual(list(rtorrent_client.gen_batch_chunks(['# nothing'])), [])
+
+
+class BatchTest(unittest.TestCase):
+    def setUp(self):
+        self.server = MulticallServer()
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.setDaemon(True)
+        thread.start()
+        self.host = 'scgi://127.0.0.1:%d' % self.server.server_address[1]
+
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+    def test_batch(self):
+        lines = ['d.start abc', 'fail', '', 'd.set_priority abc i/2', 'system.pid']
+        output = StringIO.StringIO()
+        failed = rtorrent_client.do_scgi_xmlrpc_batch(self.host, lines, 3, output)
+        self.assertEqual(failed, 1)
+        self.assertEqual(self.server.requests, [('system.multicall', 3), ('system.multicall', 1)])
+        self.assertEqual(output.getvalue().splitlines(), [
+            "['d.start', 'abc']",
+            "<Fault -501: 'Unsupported target type found.'>",
+            "['d.set_priority', 'abc', 2]",
+            "['system.pid']",
+        ])
+
+
+    def test_main_exit_status(self):
+        # The results go to the real stdout, the batch comes from stdin.
+        stdin, rtorrent_client.sys.stdin = rtorrent_client.sys.stdin, StringIO.StringIO('system.pid\nfail\n')
+        try:
+            self.assertEqual(rtorrent_client.main(['-b', '-n', '1', self.host]), 1)
+        finally:
+            rtorrent_client.sys.stdin = stdin
+        self.assertEqual(self.server.requests, [('system.multicall', 1)] * 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+import search
+
+
+def torrent(id, label, **values):
+    values.update({'id': id, 'label': label})
+    return values
+
+
+class TokenizeTest(unittest.TestCase):
+    def test_tokenize(self):
+        self.assertEqual(search.tokenize('Ubuntu-12.04_Desktop [x86]'),
+                         ['ubuntu', '12', '04_desktop', 'x86'])
+        self.assertEqual(search.tokenize('  '), [])
+
+
+class TorrentIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = search.TorrentIndex(prefix_length=4)
+        self.index.update([
+            torrent(1, 'Ubuntu Desktop', status='Seeding', category='linux'),
+            torrent(2, 'Ubuntu Server', status='Downloading', category='linux'),
+            torrent(3, 'Debian Netinst', status='Seeding', category='linux'),
+        ])
+
+
+    def test_prefix_search(self):
+        self.assertEqual(self.index.search('ubu'), set([1, 2]))
+        self.assertEqual(self.index.search('ubuntu serv'), set([2]))
+        self.assertEqual(self.index.search('fedora'), set())
+        self.assertEqual(self.index.search(''), set([1, 2, 3]))
+
+
+    def test_tokens_longer_than_the_prefix_are_checked_in_full(self):
+        self.assertEqual(self.index.search('desktop'), set([1]))
+        self.assertEqual(self.index.search('deskjet'), set())
+
+
+    def test_filters(self):
+        self.assertEqual(self.index.search(status='Seeding'), set([1, 3]))
+        self.assertEqual(self.index.search('ubuntu', status='Seeding'), set([1]))
+        self.assertEqual(self.index.search(status='Stopped'), set())
+
+
+    def test_facet_counts(self):
+        self.assertEqual(self.index.get_facet('status'), [('Seeding', 2), ('Downloading', 1)])
+        self.assertEqual(self.index.get_facet('tracker'), [('', 3)])
+
+
+    def test_changes_are_reindexed(self):
+        self.index.update([
+            torrent(1, 'Fedora Workstation', status='Stopped'),
+            torrent(2, 'Ubuntu Server'),
+        ])
+        self.assertEqual(self.index.search('ubuntu'), set([2]))
+        self.assertEqual(self.index.search('fedora'), set([1]))
+        self.assertEqual(self.index.search('debian'), set())
+        # Values missing from a summary keep their last known value.
+        self.assertEqual(self.index.search(status='Downloading'), set([2]))
+        self.assertEqual(self.index.get_facet('status'), [('Downloading', 1), ('Stopped', 1)])
+        self.assertEqual(self.index.get_facet('category'), [('linux', 2)])
+
+
+    def test_removed_torrents_leave_no_prefixes(self):
+        self.index.update([])
+        self.assertEqual(self.index.prefixes, {})
+        self.assertEqual(self.index.get_facet('status'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import marshal, os, shutil, tempfile, unittest
+import snapshot_cache
+
+
+class SnapshotCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache', 'snapshot')
+        self.cache = snapshot_cache.SnapshotCache(self.path)
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def test_round_trip(self):
+        torrents = [{'id': 1, 'label': u'caf\xe9', 'percent_done': 12.5}]
+        status = {'rate_download_bytes': 10, 'rate_upload_bytes': 0}
+        self.cache.save(torrents, status)
+        self.assertEqual(self.cache.load(), (torrents, status))
+        self.assertFalse(os.path.exists(self.path + '.tmp'))
+
+
+    def test_missing_file(self):
+        self.assertEqual(self.cache.load(), None)
+
+
+    def test_corrupt_file(self):
+        self.cache.save([], {})
+        snapshot_file = open(self.path, 'wb')
+        snapshot_file.write('\xff\x00garbage')
+        snapshot_file.close()
+        self.assertEqual(self.cache.load(), None)
+
+
+    def test_other_version(self):
+        self.cache.save([], {})
+        snapshot_file = open(self.path, 'wb')
+        marshal.dump((self.cache.version + 1, [], {}), snapshot_file)
+        snapshot_file.close()
+        self.assertEqual(self.cache.load(), None)
+
+
+    def test_saves_are_throttled(self):
+        self.cache.save([{'id': 1}], {}, now=100)
+        self.cache.save([{'id': 2}], {}, now=130)
+        self.assertEqual(self.cache.load(), ([{'id': 1}], {}))
+        self.cache.save([{'id': 3}], {}, now=160)
+        self.assertEqual(self.cache.load(), ([{'id': 3}], {}))
+
+
+    def test_flush_writes_the_held_back_snapshot(self):
+        self.cache.save([{'id': 1}], {}, now=100)
+        self.cache.save([{'id': 2}], {}, now=101)
+        self.cache.flush()
+        self.assertEqual(self.cache.load(), ([{'id': 2}], {}))
+
+
+    def test_unchanged_snapshots_are_not_written(self):
+        torrents = [{'id': 1}]
+        self.cache.save(torrents, {}, now=100)
+        os.remove(self.path)
+        self.cache.save(torrents, {}, now=200)
+        self.assertFalse(os.path.exists(self.path))
+        # Changes in place are seen.
+        torrents[0]['id'] = 2
+        self.cache.save(torrents, {}, now=300)
+        self.assertEqual(self.cache.load(), ([{'id': 2}], {}))
+
+
+    def test_replaces_the_file_on_windows(self):
+        self.cache.save([{'id': 1}], {}, now=100)
+        name = os.name
+        os.name = 'nt'
+        try:
+            self.cache.save([{'id': 2}], {}, now=200)
+        finally:
+            os.name = name
+        self.assertEqual(self.cache.load(), ([{'id': 2}], {}))
+
+
+if __name__ == '__main__':
+    unittest.main()
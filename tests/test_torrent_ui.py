@@ -0,0 +1,284 @@
+import os, shutil, subprocess, sys, tempfile, threading, time, unittest
+import renderer, torrent_ui
+from torrent_ui import TorrentUI, TorrentUIError
+
+
+def make_torrent(id, label=None, status='Downloading', percent_done=50.0, rate_download=0, rate_upload=0):
+    '''
+    Returns a full torrent dict as `TorrentUI.get_torrents` describes it.
+    '''
+    return {
+        'id': id,
+        'label': label or 'Torrent %s' % id,
+        'status': status,
+        'size_total': '20 MB',
+        'size_downloaded': '10 MB',
+        'size_uploaded': '0 b',
+        'percent_done': percent_done,
+        'estimated_time': '',
+        'peers_connected': 0,
+        'peers_incoming': 0,
+        'peers_outgoing': 0,
+        'rate_download': '0 b',
+        'rate_upload': '0 b',
+        'rate_download_bytes': rate_download,
+        'rate_upload_bytes': rate_upload,
+        'size_left_bytes': 10485760,
+        'ratio': '0.0'
+    }
+
+
+class TestRenderer(renderer.Renderer):
+    '''
+    Headless renderer writing to a temporary data directory, whose visibility
+    can be switched.
+    '''
+    def __init__(self, settings=None):
+        super(TestRenderer, self).__init__(settings)
+        self.data_dir = tempfile.mkdtemp()
+        self.visible = True
+
+
+    def get_data_dir(self):
+        return self.data_dir
+
+
+    def is_visible(self):
+        return self.visible
+
+
+    def remove(self):
+        shutil.rmtree(self.data_dir)
+
+
+class FakeUI(TorrentUI):
+    '''
+    TorrentUI over an in-memory daemon: `torrents` is what it lists, `calls`
+    records the actions it was asked for.
+    '''
+    def __init__(self, torrents=None, renderer=None, backend=False):
+        super(FakeUI, self).__init__(None, renderer or TestRenderer(), backend)
+        self.daemon_torrents = torrents or []
+        self.calls = []
+
+
+    def get_torrents(self):
+        return [dict(torrent) for torrent in self.daemon_torrents]
+
+
+    def start_torrents(self, ids):
+        self.calls.append(('start', list(ids)))
+
+
+    def stop_torrents(self, ids):
+        self.calls.append(('stop', list(ids)))
+
+
+class UITestCase(unittest.TestCase):
+    def create_ui(self, torrents=None, settings=None, backend=False):
+        ui = FakeUI(torrents, TestRenderer(settings), backend)
+        self.addCleanup(ui.renderer.remove)
+        if not backend:
+            self.addCleanup(ui.transfers.close)
+        return ui
+
+
+class UpdateListTest(UITestCase):
+    def test_one_cycle(self):
+        ui = self.create_ui([make_torrent('1'), make_torrent('2', status='Seeding', percent_done=100.0)])
+        self.assertTrue(ui.update_list(firstrun=True))
+        self.assertEqual([item.GetProperty('id') for item in ui.renderer.items], ['1', '2'])
+        self.assertEqual(ui.list_ids, ['1', '2'])
+        self.assertEqual(ui.renderer.items[1].GetProperty('transfer_status'), 'Seeding')
+        self.assertEqual(sorted(ui.torrents_by_id.keys()), ['1', '2'])
+        # The snapshot is saved for the next start.
+        self.assertEqual([torrent['id'] for torrent in ui.snapshots.load()[0]], ['1', '2'])
+
+
+    def test_later_cycles_update_items_in_place(self):
+        ui = self.create_ui([make_torrent('1'), make_torrent('2')])
+        ui.update_list(firstrun=True)
+        item = ui.renderer.items[0]
+        ui.daemon_torrents = [make_torrent('1', status='Paused'), make_torrent('3')]
+        ui.poll_interval = 0
+        self.assertTrue(ui.update_list())
+        self.assertEqual(sorted(ui.list_ids), ['1', '3'])
+        self.assertTrue([new for new in ui.renderer.items if new is item])
+        self.assertEqual(item.GetTagLine(), 'Paused')
+
+
+    def test_hidden_lists_are_not_drawn(self):
+        ui = self.create_ui([make_torrent('1')])
+        ui.renderer.visible = False
+        self.assertTrue(ui.update_list(firstrun=True))
+        self.assertEqual(ui.renderer.items, [])
+        self.assertEqual(ui.torrents_by_id.keys(), ['1'])
+
+
+    def test_stops_once_a_hidden_list_is_gone(self):
+        ui = self.create_ui([make_torrent('1')])
+        ui.renderer.visible = False
+        ui.renderer.close()
+        self.assertFalse(ui.update_list(firstrun=True))
+
+
+    def test_waiting_stops_once_a_hidden_list_is_gone(self):
+        ui = self.create_ui([make_torrent('1')])
+        ui.renderer.visible = False
+        ui.alive_interval = 0
+        # Without background polls the wait would never end otherwise.
+        ui.background_interval = 0
+        ui.renderer.close()
+        started = time.time()
+        self.assertFalse(ui.update_list())
+        self.assertTrue(time.time() - started < 2)
+
+
+    def test_list_ids_follow_sorting(self):
+        ui = self.create_ui([make_torrent('1', label='b', status='Seeding'), make_torrent('2', label='c'),
+                             make_torrent('3', label='a', status='Paused')])
+        ui.update_list(firstrun=True)
+        ui.sort_torrents('alphabetical')
+        self.assertEqual(ui.list_ids, ['3', '1', '2'])
+        self.assertEqual([item.GetProperty('id') for item in ui.renderer.items], ui.list_ids)
+        ui.sort_torrents('status')
+        self.assertEqual(ui.list_ids, ['2', '1', '3'])
+        # The next poll keeps the sorted order and updates the right rows.
+        ui.daemon_torrents[0] = make_torrent('1', label='b', status='Paused')
+        ui.poll_interval = 0
+        ui.update_list()
+        self.assertEqual(ui.list_ids, ['2', '1', '3'])
+        self.assertEqual([(item.GetProperty('id'), item.GetProperty('transfer_status'))
+                          for item in ui.renderer.items],
+                         [('2', 'Downloading'), ('1', 'Paused'), ('3', 'Paused')])
+
+
+    def test_hidden_lists_keep_polling(self):
+        ui = self.create_ui([make_torrent('1')])
+        ui.renderer.visible = False
+        ui.alive_interval = 0
+        ui.background_interval = 0.5
+        self.assertTrue(ui.wait_for_next_poll())
+
+
+class DeltaUI(FakeUI):
+    '''
+    FakeUI whose deltas are the torrents in `changed`, merged by id.
+    '''
+    delta_window = 50
+
+
+    def __init__(self, torrents=None, renderer=None, backend=False):
+        super(DeltaUI, self).__init__(torrents, renderer, backend)
+        self.changed = []
+        self.fetches = []
+
+
+    def get_snapshot(self):
+        self.fetches.append('full')
+        return super(DeltaUI, self).get_snapshot()
+
+
+    def get_delta_snapshot(self, torrents):
+        self.fetches.append('delta')
+        if self.changed is None:
+            return None
+        changed = dict([(torrent['id'], torrent) for torrent in self.changed])
+        torrents = [changed.pop(torrent['id'], torrent) for torrent in torrents] + changed.values()
+        return torrents, self.format_status(0, 0)
+
+
+class PollingTest(UITestCase):
+    def create_delta_ui(self, torrents):
+        ui = DeltaUI(torrents, TestRenderer())
+        self.addCleanup(ui.renderer.remove)
+        self.addCleanup(ui.transfers.close)
+        ui.poll_interval = 0
+        return ui
+
+
+    def test_deltas_are_merged(self):
+        ui = self.create_delta_ui([make_torrent('1'), make_torrent('2')])
+        ui.update_list(firstrun=True)
+        ui.changed = [make_torrent('2', status='Paused'), make_torrent('3')]
+        ui.update_list()
+        self.assertEqual(ui.fetches, ['full', 'delta'])
+        self.assertEqual([(torrent['id'], torrent['status']) for torrent in ui.torrents],
+                         [('1', 'Downloading'), ('2', 'Paused'), ('3', 'Downloading')])
+        self.assertEqual(sorted(ui.list_ids), ['1', '2', '3'])
+
+
+    def test_full_fetches(self):
+        ui = self.create_delta_ui([make_torrent('1')])
+        ui.fetch_snapshot()
+        ui.fetch_snapshot()
+        # The last fetch is too old for a delta.
+        ui.fetched_at -= ui.delta_window
+        ui.fetch_snapshot()
+        # Deltas still need a full fetch now and then.
+        ui.refreshed_at -= ui.full_refresh_interval
+        ui.fetch_snapshot()
+        # The backend asks for one.
+        ui.changed = None
+        ui.fetch_snapshot()
+        self.assertEqual(ui.fetches, ['full', 'delta', 'full', 'full', 'delta', 'full'])
+
+
+    def set_visible_later(self, ui, visible, delay=0.6):
+        timer = threading.Timer(delay, setattr, (ui.renderer, 'visible', visible))
+        timer.start()
+        self.addCleanup(timer.cancel)
+
+
+    def test_polls_when_the_list_comes_back(self):
+        ui = self.create_ui()
+        ui.renderer.visible = False
+        ui.background_interval = 0
+        self.set_visible_later(ui, True)
+        started = time.time()
+        self.assertTrue(ui.wait_for_next_poll())
+        self.assertTrue(time.time() - started < 2)
+
+
+    def test_wake_up(self):
+        ui = self.create_ui()
+        ui.poll_interval = 60
+        ui.wake_up()
+        started = time.time()
+        self.assertTrue(ui.wait_for_next_poll())
+        self.assertTrue(time.time() - started < 2)
+        self.assertFalse(ui.woken)
+
+
+class EngineTest(UITestCase):
+    def test_imports_without_mc_or_backends(self):
+        # In a fresh interpreter, the other tests import backends already.
+        code = 'import sys, torrent_ui; print sorted([name for name in sys.modules if name == "mc" or ' \
+            'name.endswith("_ui") and name != "torrent_ui" or name.endswith("_client")])'
+        output = subprocess.check_output([sys.executable, '-c', code],
+                                         cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.assertEqual(output.strip(), '[]')
+
+
+    def test_backends_load_by_name(self):
+        self.assertEqual(torrent_ui.load_backend('Transmission').__name__, 'TransmissionUI')
+        self.assertRaises(TorrentUIError, torrent_ui.load_backend, 'azureus')
+
+
+    def test_settings_come_from_the_renderer(self):
+        ui = self.create_ui(settings={'order': 'status', 'background_interval': '30'})
+        self.assertEqual(ui.order, 'status')
+        self.assertEqual(ui.background_interval, 30.0)
+
+
+    def test_default_renderer(self):
+        default = TestRenderer()
+        self.addCleanup(default.remove)
+        torrent_ui.set_renderer(default)
+        self.addCleanup(torrent_ui.set_renderer, None)
+        ui = TorrentUI(None, backend=True)
+        self.assertTrue(ui.renderer is default)
+
+
+if __name__ == '__main__':
+    unittest.main()
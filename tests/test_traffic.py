@@ -0,0 +1,107 @@
+import os, shutil, socket, tempfile, threading, unittest, urllib2, xmlrpclib
+import traffic
+
+
+class TrafficTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'capture')
+        self.recorder = traffic.TrafficRecorder()
+
+
+    def tearDown(self):
+        self.recorder.disable()
+        shutil.rmtree(self.directory)
+
+
+    def capture(self, exchanges):
+        self.recorder.enable(self.path)
+        for client, key, request, response in exchanges:
+            self.recorder.record(self.recorder.start(), client, key, request, response,
+                                 headers={'Content-Type': 'text/plain'})
+        self.recorder.disable()
+
+
+    def test_disabled_recorder_writes_nothing(self):
+        self.assertEqual(self.recorder.start(), None)
+        self.recorder.record(None, 'utorrent', 'list', '', 'x')
+        self.assertFalse(os.path.exists(self.path))
+
+
+    def test_round_trip(self):
+        self.capture([('transmission', 'torrent-get', '{}', 'a' * 1000)])
+        # Reopening appends without a second header.
+        self.capture([('utorrent', 'list', '', 'b')])
+        exchanges = traffic.load(self.path)
+        self.assertEqual([(exchange['client'], exchange['key'], exchange['response'])
+                          for exchange in exchanges],
+                         [('transmission', 'torrent-get', 'a' * 1000), ('utorrent', 'list', 'b')])
+        self.assertEqual(exchanges[0]['status'], 200)
+        self.assertEqual(exchanges[0]['headers'], {'Content-Type': 'text/plain'})
+
+
+    def test_load_rejects_other_files(self):
+        open(self.path, 'wb').write('\x00not marshal')
+        self.assertRaises(ValueError, traffic.load, self.path)
+
+
+    def test_get_key(self):
+        self.assertEqual(traffic.get_key('transmission', '/', '{"method": "torrent-get"}'), 'torrent-get')
+        self.assertEqual(traffic.get_key('utorrent', '/gui/?token=x&action=start&hash=y', ''), 'start')
+        self.assertEqual(traffic.get_key('utorrent', '/gui/?token=x&list=1', ''), 'list')
+        self.assertEqual(traffic.get_key('rtorrent', '', xmlrpclib.dumps((), 'd.multicall')), 'd.multicall')
+        self.assertEqual(traffic.get_key('transmission', '/', 'not json'), None)
+
+
+    def test_replay_order(self):
+        exchanges = [
+            {'client': 'utorrent', 'key': 'list', 'response': '1'},
+            {'client': 'utorrent', 'key': 'start', 'response': '2'},
+            {'client': 'utorrent', 'key': 'list', 'response': '3'},
+            {'client': 'transmission', 'key': 'list', 'response': '4'},
+        ]
+        replay = traffic.Replay(exchanges, 'utorrent', 0)
+        self.assertEqual([replay.next('list')['response'] for index in range(3)], ['1', '3', '1'])
+        self.assertEqual(replay.next('start')['response'], '2')
+        self.assertEqual([replay.next('stop')['response'] for index in range(4)], ['1', '2', '3', '1'])
+        self.assertRaises(ValueError, traffic.Replay, exchanges, 'rtorrent')
+
+
+    def serve(self, client):
+        server = traffic.ReplayServer(self.path, client, speed=0)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.setDaemon(True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+
+    def test_http_replay(self):
+        self.capture([('transmission', 'session-get', '', 'session'),
+                      ('transmission', 'torrent-get', '', 'torrents')])
+        server = self.serve('transmission')
+        response = urllib2.urlopen(server.get_url() + '/transmission/rpc', '{"method": "torrent-get"}')
+        self.assertEqual(response.read(), 'torrents')
+        self.assertEqual(response.info().getheader('Content-Type'), 'text/plain')
+
+
+    def test_scgi_replay(self):
+        self.capture([('rtorrent', 'system.pid', '', 'pid'), ('rtorrent', 'd.multicall', '', 'list')])
+        server = self.serve('rtorrent')
+        body = xmlrpclib.dumps((), 'd.multicall')
+        headers = 'CONTENT_LENGTH\x00%d\x00SCGI\x001\x00' % len(body)
+        sock = socket.create_connection(server.server_address)
+        sock.sendall('%d:%s,%s' % (len(headers), headers, body))
+        data = ''
+        while True:
+            chunk = sock.recv(4096)
+            if not chunk:
+                break
+            data += chunk
+        sock.close()
+        self.assertEqual(data, 'list')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+import os, shutil, tempfile, time, unittest
+import transfer_history
+from transfer_history import GLOBAL
+
+
+TIERS = ((10, 6), (60, 10))
+
+
+def torrent(id, downloaded=None, uploaded=0):
+    torrent = {'id': id, 'rate_download_bytes': 0, 'rate_upload_bytes': 0}
+    if downloaded is not None:
+        torrent['downloaded_bytes'] = downloaded
+        torrent['uploaded_bytes'] = uploaded
+    return torrent
+
+
+class TransferHistoryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'history', 'transfers.ring')
+        self.histories = []
+        # The current bucket of the finest tier, so samples at self.now + 0..9 share it.
+        self.now = int(time.time()) / 10 * 10
+
+
+    def tearDown(self):
+        for history in self.histories:
+            history.close()
+        shutil.rmtree(self.directory)
+
+
+    def open(self, slots=4, tiers=TIERS):
+        history = transfer_history.TransferHistory(self.path, slots, tiers)
+        self.histories.append(history)
+        return history
+
+
+    def test_layout_and_size(self):
+        history = self.open()
+        self.assertTrue(history.is_enabled())
+        self.assertEqual(os.path.getsize(self.path), history.size)
+        self.assertEqual(history.size, transfer_history.HEADER.size + 2 * transfer_history.TIER.size +
+                         4 * (transfer_history.SLOT.size + 16 * transfer_history.RECORD.size))
+
+
+    def test_disabled_without_slots(self):
+        history = self.open(slots=0)
+        self.assertFalse(history.is_enabled())
+        history.update([torrent('a', 100)])
+        history.update([torrent('a', 200)])
+        self.assertEqual(history.get_summary(), {'downloaded': 0, 'uploaded': 0,
+                                                 'peak_download': 0, 'peak_upload': 0})
+        self.assertFalse(os.path.exists(self.path))
+
+
+    def test_first_poll_is_the_baseline(self):
+        history = self.open()
+        history.update([torrent('a', 5000, 100)], self.now - 5)
+        self.assertEqual(history.get_ids(), [])
+
+
+    def test_counter_deltas(self):
+        history = self.open()
+        history.update([torrent('a', 5000, 100), torrent('b', 70)], self.now - 20)
+        history.update([torrent('a', 6000, 200), torrent('b', 70)], self.now - 10)
+        history.update([torrent('a', 6500, 200), torrent('b', 70), torrent('c', 9000)], self.now)
+        self.assertEqual(sorted(history.get_ids()), [GLOBAL, 'a'])
+        summary = history.get_summary(GLOBAL, self.now - 20)
+        self.assertEqual((summary['downloaded'], summary['uploaded']), (1500, 100))
+        self.assertEqual(summary['peak_download'], 100)
+        self.assertEqual(list(history.iter_range('a', self.now - 20)),
+                         [(self.now - 10, 1000, 100), (self.now, 500, 0)])
+        # The hour tier has it all in one bucket.
+        self.assertEqual(history.get_summary('a')['downloaded'], 1500)
+        self.assertEqual(list(history.iter_range('b')), [])
+
+
+    def test_the_global_series_sums_the_torrents(self):
+        history = self.open()
+        history.update([torrent('a', 0), torrent('b', 0)], self.now - 10)
+        history.update([torrent('a', 300, 5), torrent('b', 200, 7)], self.now)
+        self.assertEqual(list(history.iter_range(GLOBAL, self.now - 10)), [(self.now, 500, 12)])
+
+
+    def test_long_gaps_count_what_the_counters_say(self):
+        history = self.open()
+        history.update([torrent('a', 1000)], self.now - 3000)
+        history.update([torrent('a', 1010)], self.now)
+        self.assertEqual(history.get_summary()['downloaded'], 10)
+
+
+    def test_counter_resets_start_over(self):
+        history = self.open()
+        history.update([torrent('a', 1000, 1000)], self.now - 20)
+        history.update([torrent('a', 10, 1000)], self.now - 10)
+        history.update([torrent('a', 60, 1000)], self.now)
+        self.assertEqual(list(history.iter_range('a', self.now - 20)), [(self.now, 50, 0)])
+
+
+    def test_polls_without_counters_keep_the_last_ones(self):
+        history = self.open()
+        history.update([torrent('a', 1000)], self.now - 20)
+        history.update([torrent('a')], self.now - 10)
+        history.update([torrent('a', 1400)], self.now)
+        self.assertEqual(list(history.iter_range('a', self.now - 20)), [(self.now, 400, 0)])
+        # Torrents that left the snapshot start over.
+        history.update([], self.now)
+        history.update([torrent('a', 2000)], self.now)
+        self.assertEqual(history.get_summary('a')['downloaded'], 400)
+
+
+    def test_long_ids_survive_a_restart(self):
+        id = 'daemon-with-a-long-name:' + 'f' * 40 + ':' + 'e' * 40
+        history = self.open()
+        history.add(id, 42, 4, self.now)
+        history.close()
+        history = self.open()
+        self.assertEqual(history.get_ids(), [transfer_history.get_key(id)])
+        self.assertEqual(list(history.iter_range(id, self.now - 50, tier=0)), [(self.now, 42, 4)])
+        history.add(id, 8, 0, self.now)
+        self.assertEqual(len(history.get_ids()), 1)
+        self.assertEqual(list(history.iter_range(id, self.now - 50, tier=0)), [(self.now, 50, 4)])
+
+
+    def test_ring_overwrites_old_buckets(self):
+        history = self.open()
+        history.add(GLOBAL, 111, 0, self.now - 60)
+        history.add(GLOBAL, 7, 0, self.now)
+        self.assertEqual(list(history.iter_range(GLOBAL, self.now - 50, tier=0)), [(self.now, 7, 0)])
+
+
+    def test_least_recently_transferring_torrent_loses_its_slot(self):
+        history = self.open(slots=3)
+        history.add(GLOBAL, 1, 0, self.now - 30)
+        history.add('a', 1, 0, self.now - 20)
+        history.add('b', 1, 0, self.now - 10)
+        history.add('c', 5, 0, self.now)
+        self.assertEqual(sorted(history.get_ids()), [GLOBAL, 'b', 'c'])
+        self.assertEqual(list(history.iter_range('c', self.now - 50, tier=0)), [(self.now, 5, 0)])
+
+
+    def test_history_outlives_the_app(self):
+        history = self.open()
+        history.add('a', 42, 4, self.now)
+        history.close()
+        history = self.open()
+        self.assertEqual(history.get_ids(), ['a'])
+        self.assertEqual(list(history.iter_range('a', self.now - 50, tier=0)), [(self.now, 42, 4)])
+
+
+    def test_other_layouts_start_over(self):
+        history = self.open()
+        history.add('a', 42, 4, self.now)
+        history.close()
+        history = self.open(slots=5)
+        self.assertEqual(history.get_ids(), [])
+        self.assertEqual(os.path.getsize(self.path), history.size)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+from transmission_ui import TransmissionUI
+from tests.test_torrent_ui import TestRenderer
+
+
+def torrent_data(id, status=4, rate_download=0):
+    '''
+    Returns a torrent as torrent-get reports it with the default fields.
+    '''
+    return {
+        'id': id, 'name': 'Torrent %d' % id, 'status': status, 'totalSize': 100, 'files': [],
+        'uploadedEver': 0, 'downloadedEver': 0, 'percentDone': 0.5, 'eta': -1, 'peersConnected': 0,
+        'peersSendingToUs': 0, 'peersGettingFromUs': 0, 'rateDownload': rate_download,
+        'rateUpload': 0, 'leftUntilDone': 50, 'uploadRatio': 0.0, 'trackers': [],
+        'hashString': '%040d' % id
+    }
+
+
+class FakeConnection(object):
+    '''
+    Answers torrentGet with the queued argument dicts.
+    '''
+    def __init__(self, responses):
+        self.responses = responses
+        self.requests = []
+
+
+    def torrentGet(self, **kwargs):
+        self.requests.append(kwargs)
+        return {'arguments': self.responses.pop(0)}
+
+
+class DeltaTest(unittest.TestCase):
+    def test_recently_active_torrents_are_merged(self):
+        ui = TransmissionUI(FakeConnection([
+            {'torrents': [torrent_data(1), torrent_data(2), torrent_data(3)]},
+            {'torrents': [torrent_data(2, status=16), torrent_data(4, rate_download=100)], 'removed': [3]},
+        ]), TestRenderer(), backend=True)
+        self.addCleanup(ui.renderer.remove)
+        torrents = ui.get_torrents()
+        torrents, status = ui.get_delta_snapshot(torrents)
+        self.assertEqual(ui.connection.requests[1], {'torrentIds': 'recently-active'})
+        self.assertEqual([(torrent['id'], torrent['status']) for torrent in torrents],
+                         [('1', 'Downloading'), ('2', 'Paused'), ('4', 'Downloading')])
+        self.assertEqual(status['rate_download_bytes'], 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
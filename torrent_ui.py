@@ -1,11 +1,38 @@
-import time, threading, operator
-import mc
+import os, time, threading, operator, urlparse
+from instrumentation import STATS
+from traffic import RECORDER
+from actions import ActionQueue
+from file_cache import FileCache
+from rate_history import RateHistory
+from snapshot_cache import SnapshotCache
+from search import TorrentIndex
+from events import EventBus
+from bandwidth import BandwidthScheduler
+from queue_manager import QueueManager
+from streaming import StreamManager
+from ingest import Ingester
+from profiling import PollProfiler
+from transfer_history import TransferHistory, GLOBAL
+from renderer import Renderer
 
 
-CONFIG = mc.GetApp().GetLocalConfig()
-WINDOW = mc.GetWindow(14002)
-TORRENT_LIST = WINDOW.GetList(100)
-STATUS = WINDOW.GetLabel(105)
+# Client name -> (module, TorrentUI subclass) of each backend. The modules, and the
+# client libraries behind them, are only imported once a backend is used. The names
+# are the lowercased TORRENT_CLIENTS names.
+BACKENDS = {
+    'transmission': ('transmission_ui', 'TransmissionUI'),
+    'rtorrent': ('rtorrent_ui', 'rTorrentUI'),
+    'utorrent': ('utorrent_ui', 'uTorrentUI'),
+    'qbittorrent': ('qbittorrent_ui', 'QBittorrentUI'),
+    'deluge': ('deluge_ui', 'DelugeUI'),
+}
+
+# Renderer used by TorrentUIs created without one, see `set_renderer`.
+RENDERER = None
+
+
+# File priorities, in the order the options dialog cycles through them.
+FILE_PRIORITIES = ('skip', 'low', 'normal', 'high')
 
 
 class TorrentConnectionError(Exception): pass
@@ -22,30 +49,146 @@ class TorrentUI(threading.Thread):
     Arguments:
         connection: A connection object, usually created when checking connectivity of
         a torrent client
+        renderer: The Renderer the list is drawn with, by default the one passed to
+        `set_renderer`
+        backend: True for a daemon's TorrentUI inside an AggregateUI. Only the
+        fetching and action methods are used then, so the poll loop's queues,
+        caches and history are not created.
     '''
     order = "alphabetical"
-    stored_order = CONFIG.GetValue('order')
-    if stored_order:
-        order = stored_order
     
+    # Shows per-RPC stats on top of the main window when enabled.
+    debug_overlay = False
+    
+    # When virtualized, full details are only fetched for the rows around the
+    # focused one, see `get_list_snapshot`.
+    virtual_list = False
+    viewport_rows = 10
+    viewport_margin = 10
+    
+    # Seconds between polls while the list is on screen.
+    poll_interval = 5.0
+    
+    # Seconds between polls while the window is hidden or media is playing. 0 stops
+    # polling until the list is back on screen.
+    background_interval = 30.0
+    
+    # Seconds between checks that a hidden list is still there, see `is_alive`.
+    alive_interval = 5.0
     
-    def __init__(self, connection):
+    # Backends implementing `get_delta_snapshot` set this to how long after the
+    # previous fetch, in seconds, a delta is still complete.
+    delta_window = 0
+    
+    # Longest time between two full fetches while deltas are used.
+    full_refresh_interval = 300.0
+    
+    # Url of the daemon, set by `connect_backend`. None when unknown.
+    url = None
+    
+    
+    def __init__(self, connection, renderer=None, backend=False):
         super(TorrentUI, self).__init__()
         self.connection = connection
+        self.renderer = renderer or RENDERER or Renderer()
+        if self.renderer.get_setting('order'):
+            self.order = self.renderer.get_setting('order')
+        self.debug_overlay = self.renderer.get_setting('debug_overlay') == 'true'
+        self.virtual_list = self.renderer.get_setting('virtual_list') == 'true'
+        if self.renderer.get_setting('background_interval'):
+            self.background_interval = float(self.renderer.get_setting('background_interval'))
+        # When the last fetch and the last full fetch happened.
+        self.fetched_at = 0
+        self.refreshed_at = 0
+        # Torrent ids in the order of the list control.
+        self.list_ids = []
+        # Set by `wake_up` to poll before the interval is over.
+        self.woken = False
+        # The torrents and status of the last snapshot, and the torrents by id.
+        self.torrents = []
+        self.status = None
+        self.torrents_by_id = {}
+        # Serializes use of the connection between the poll loop and the actions.
+        self.connection_lock = threading.RLock()
+        if backend:
+            return
+        # Name and facet index over the last snapshot, and the filter applied to it.
+        self.index = TorrentIndex()
+        self.search_query = ''
+        self.search_filters = {}
+        # Change events computed from each snapshot, see `subscribe`.
+        self.events = EventBus()
+        self.bandwidth = BandwidthScheduler.from_config(self,
+            self.renderer.get_setting('bandwidth_schedule') or '')
+        self.queue = QueueManager.from_config(self, self.renderer.get_setting)
+        self.streams = StreamManager.from_config(self, self.renderer.get_setting)
+        self.ingester = Ingester.from_config(self, self.renderer.get_setting)
+        self.files = FileCache(self)
+        self.history = RateHistory()
+        # Bytes transferred over time, kept on disk across runs.
+        self.transfers = TransferHistory.from_config(self, self.renderer.get_setting)
+        self.profiler = PollProfiler(os.path.join(self.renderer.get_data_dir(), 'profiles'))
+        # The last snapshot of this client type, drawn at startup until the first poll.
+        self.snapshots = SnapshotCache(os.path.join(self.renderer.get_data_dir(),
+            '%s.snapshot' % self.__class__.__name__))
+        # Serializes drawing the list between the poll loop and filter changes.
+        self.render_lock = threading.RLock()
+        self.actions = ActionQueue(self)
+        if self.debug_overlay:
+            STATS.enable()
+        # Daemon traffic is captured to this file for `traffic.ReplayServer`.
+        if self.renderer.get_setting('traffic_capture'):
+            RECORDER.enable(self.renderer.get_setting('traffic_capture'))
+        
+
+    @classmethod
+    def connect(cls, url, username='', password='', **options):
+        '''
+        Extend this to connect to the daemon at `url` and return an instance for it,
+        created with the keyword arguments in `options`. Used by `connect_backend`.
+        '''
+        raise NotImplementedError("You must extend this method to connect to a daemon.")
         
 
     def run(self):
         self.refresh_list = False
+        self.actions.start()
+        
+        # Draw the last known list while the daemon is asked for the current one.
+        self.show_cached_snapshot()
         
-        # Start updating the torrent list.
-        self.update_list(firstrun=True)
+        # Keep updating the torrent list until the window goes away.
+        firstrun = True
+        while self.update_list(firstrun):
+            firstrun = False
+        self.snapshots.flush()
 
     
     def get_status(self):
         '''
-        Extend this to get status information. Mainly for getting global up/down speeds.
+        Returns global status information, mainly the global up/down speeds.
+        Prefer `get_snapshot` when the torrents are needed as well, it saves a
+        round trip to the daemon.
+        '''
+        return self.get_snapshot()[1]
+        
+    
+    def get_snapshot(self):
+        '''
+        Returns a (torrents, status) tuple fetched in as few round trips as the
+        daemon allows. `torrents` is the list returned by `get_torrents` and `status`
+        a dict as returned by `format_status`.
+        
+        By default the global rates are the sums of the per-torrent rates. Extend this
+        when the daemon can report its global rates in the same request.
         '''
-        raise NotImplementedError("You must extend this method to get status information.")
+        torrents = self.get_torrents()
+        rate_download = 0
+        rate_upload = 0
+        for torrent in torrents:
+            rate_download += torrent['rate_download_bytes']
+            rate_upload += torrent['rate_upload_bytes']
+        return torrents, self.format_status(rate_download, rate_upload)
         
     
     def get_torrents(self):
@@ -53,19 +196,31 @@ class TorrentUI(threading.Thread):
         Extend this to get torrent information for use in other methods.
         Should return a list of dicts with torrent information.
         A torrent list item should contain these variables:
+            'id': <string>
             'label': <string>,
             'status': <string> options: 'Downloading', 'Seeding', 'Paused', 'Unknown'
-            'total_size': <string> example: "20 MB"
+            'size_total': <string> example: "20 MB"
             'size_downloaded': <string> example: "20 MB"
             'size_uploaded': <string> example: "20 MB"
-            'percent_done': <string> example: "56%"
+            'percent_done': <float> example: 56.0
             'estimated_time': <string> example: "2 hrs, 32 mins, 10 sec"
             'peers_connected': <int>
             'peers_incoming': <int>
             'peers_outgoing': <int>
             'rate_download': <string> example: "150 KB" (per second)
             'rate_upload': <string> example: "150 KB" (per second)
-            'ratio': <float>
+            'rate_download_bytes': <int> bytes per second
+            'rate_upload_bytes': <int> bytes per second
+            'size_left_bytes': <int> bytes left to download
+            'ratio': <string>
+            'category': <string> optional, the daemon's label for the torrent
+            'tracker': <string> optional, host name of the main tracker
+            'info_hash': <string> optional, hex info hash when the id is not one
+            'priority': <string> optional, 'low', 'normal' or 'high' as set with
+            `set_priority`, for daemons with per-torrent priorities
+            'downloaded_bytes': <int> optional, the daemon's counter of all bytes
+            downloaded for the torrent
+            'uploaded_bytes': <int> optional, the same for bytes uploaded
             
             These values may be created using the built in `format_filesize` and
             `format_time` methods.
@@ -73,6 +228,125 @@ class TorrentUI(threading.Thread):
         raise NotImplementedError("You must extend this method to return a list of torrents.")
     
     
+    def get_summary_snapshot(self):
+        '''
+        Like `get_snapshot`, but only the summary fields of each torrent are needed:
+        see `format_summary`. Used when the list is virtualized, extend this when the
+        daemon can return the summary cheaper than the full torrent information.
+        '''
+        return self.get_snapshot()
+        
+    
+    def get_delta_snapshot(self, torrents):
+        '''
+        Extend this when the daemon can report just the torrents that changed. Should
+        return the (torrents, status) snapshot following `torrents`, the previous
+        one, or None when a full fetch is needed. Only called within `delta_window`
+        seconds of the previous fetch.
+        '''
+        return None
+        
+    
+    def get_details(self, ids):
+        '''
+        Returns the full torrent information, as in `get_torrents`, for the torrents
+        in the `ids` list only. Extend this when the daemon can fetch a subset of
+        torrents.
+        '''
+        return [torrent for torrent in self.get_torrents() if torrent['id'] in ids]
+        
+    
+    def get_files(self, id):
+        '''
+        Extend this to return the file list of the torrent `id`. Should return a list
+        of dicts as created by `format_file`, in the daemon's file index order.
+        '''
+        raise NotImplementedError("You must extend this method to list torrent files.")
+        
+    
+    def get_file_progress(self, id, files):
+        '''
+        Returns the downloaded bytes of each file in `files`, the cached result of
+        `get_files` for the torrent `id`. Extend this when the daemon can report
+        file progress cheaper than the whole file list.
+        '''
+        return [file['done_bytes'] for file in self.get_files(id)]
+        
+    
+    def set_file_priorities(self, id, priorities):
+        '''
+        Extend this to set file priorities of the torrent `id` in one batch.
+        `priorities` maps file indexes to 'skip', 'low', 'normal' or 'high'.
+        '''
+        raise NotImplementedError("You must extend this method to set file priorities.")
+        
+    
+    def set_sequential(self, id, index, enabled=True):
+        '''
+        Extend this to have the daemon download file `index` of the torrent `id` in
+        order, or at least its first and last pieces first, and in its usual order
+        again when `enabled` is False. Returns True if the daemon supports it.
+        '''
+        return False
+        
+    
+    def get_file_pieces(self, id, index):
+        '''
+        Extend this when the daemon reports downloaded pieces. Should return a
+        (bitfield, piece_size, offset, length) tuple for file `index` of the torrent
+        `id`: the torrent's pieces as a string with one bit per piece, most
+        significant bit first, and the file's byte offset and length within the
+        torrent. None when the pieces are unknown.
+        '''
+        return None
+        
+    
+    def get_file_path(self, id, index):
+        '''
+        Extend this to return the path of file `index` of the torrent `id` on the
+        daemon's disk, None when it is unknown.
+        '''
+        return None
+        
+    
+    def is_local(self):
+        '''
+        Returns True when the daemon runs on this machine, so the paths of its files
+        can be opened as they are. Daemons of unknown `url` count as local.
+        '''
+        if self.url is None:
+            return True
+        host = urlparse.urlsplit(self.url)[1].rsplit('@', 1)[-1]
+        if host.startswith('['):
+            host = host[1:].split(']', 1)[0]
+        else:
+            host = host.split(':', 1)[0]
+        return host.lower() in ('', 'localhost', '127.0.0.1', '::1')
+        
+    
+    def get_stream_path(self, id, index):
+        '''
+        Returns the path or url the player opens file `index` of the torrent `id`
+        with. The daemon's path is mapped with the first matching
+        'daemon path=player path' pair of the ';' separated 'stream_path_map'
+        config value, like '/srv/downloads=smb://nas/downloads'. Unmapped paths are
+        only used for local daemons, see `is_local`. None when the file can not be
+        reached from here.
+        '''
+        path = self.get_file_path(id, index)
+        if path is None:
+            return None
+        for entry in (self.renderer.get_setting('stream_path_map') or '').split(';'):
+            if '=' not in entry:
+                continue
+            prefix, target = [part.strip() for part in entry.split('=', 1)]
+            if prefix and (path == prefix or path.startswith(prefix.rstrip('/') + '/')):
+                return target.rstrip('/') + path[len(prefix.rstrip('/')):]
+        if self.is_local():
+            return path
+        return None
+        
+    
     def start_torrent(self, id=False):
         '''
         Extend this to start torrents. If the `id` argument is False, start all torrents, 
@@ -96,6 +370,259 @@ class TorrentUI(threading.Thread):
         '''
         raise NotImplementedError("You must extend this method to stop torrents.")
         
+    
+    def start_torrents(self, ids):
+        '''
+        Starts every torrent in the `ids` list. Extend this to use the daemon's
+        native bulk form, by default `start_torrent` is called once per id.
+        '''
+        for id in ids:
+            self.start_torrent(id)
+        
+    
+    def stop_torrents(self, ids):
+        '''
+        Stops every torrent in the `ids` list. Extend this to use the daemon's
+        native bulk form, by default `stop_torrent` is called once per id.
+        '''
+        for id in ids:
+            self.stop_torrent(id)
+        
+    
+    def delete_torrents(self, ids, files=False):
+        '''
+        Deletes every torrent in the `ids` list, see `delete_torrent`. Extend this to
+        use the daemon's native bulk form, by default `delete_torrent` is called once
+        per id.
+        '''
+        for id in ids:
+            self.delete_torrent(id, files)
+        
+    
+    def add_torrents(self, torrents):
+        '''
+        Extend this to add torrents in one batch. `torrents` is a list of .torrent
+        file contents.
+        '''
+        raise NotImplementedError("You must extend this method to add torrents.")
+        
+    
+    def get_info_hash(self, torrent):
+        '''
+        Returns the lowercase hex info hash of a torrent dict, its 'info_hash' key or
+        else its id.
+        '''
+        return torrent.get('info_hash', torrent['id']).lower()
+        
+    
+    def get_info_hashes(self):
+        '''
+        Returns the set of info hashes of the torrents in the last snapshot.
+        '''
+        return set([self.get_info_hash(torrent) for torrent in self.torrents])
+        
+    
+    def add_torrent_files(self, paths):
+        '''
+        Adds the .torrent files in the `paths` list that the daemon does not have yet.
+        Returns the parsed torrents that were added, see `Ingester.ingest`.
+        '''
+        return self.ingester.ingest(paths, rename=False)
+        
+    
+    def set_priority(self, ids, priority):
+        '''
+        Extend this to set the priority of every torrent in the `ids` list.
+        `priority` is one of 'low', 'normal' or 'high'.
+        '''
+        raise NotImplementedError("You must extend this method to set torrent priorities.")
+        
+    
+    def set_speed_limits(self, download=None, upload=None):
+        '''
+        Extend this to set the daemon's global speed limits, in bytes per second.
+        None removes a limit.
+        '''
+        raise NotImplementedError("You must extend this method to set speed limits.")
+        
+    
+    def set_torrent_speed_limits(self, limits):
+        '''
+        Extend this to set per-torrent speed limits in one batch. `limits` maps
+        torrent ids to (download, upload) tuples in bytes per second, None removing
+        a limit.
+        '''
+        raise NotImplementedError("You must extend this method to set torrent speed limits.")
+        
+      
+    def queue_action(self, action, id, item=None, **kwargs):
+        '''
+        Queues a 'start', 'stop' or 'delete' action for the torrent `id` without
+        waiting for the daemon. `item` is the torrent's ListItem, it shows the
+        expected state straight away and is rolled back if the action fails.
+        '''
+        self.actions.put(action, id, item, **kwargs)
+        
+    
+    def run_action(self, action, id, **kwargs):
+        '''
+        Runs a queued action against the daemon. Called from the action queue's
+        worker thread.
+        '''
+        return self.call_connection('%s_torrent' % action, id, **kwargs)
+        
+    
+    def call_connection(self, method, *args, **kwargs):
+        '''
+        Calls one of this TorrentUI's methods while holding the connection lock, for
+        use from threads other than the poll loop.
+        '''
+        self.connection_lock.acquire()
+        try:
+            return getattr(self, method)(*args, **kwargs)
+        finally:
+            self.connection_lock.release()
+        
+    
+    def open_torrent(self, id):
+        '''
+        Returns the file list of the torrent `id`, loading it on first use. Later
+        calls only refresh the per-file progress, and only once the torrent's
+        progress has changed.
+        '''
+        torrent = self.torrents_by_id.get(id)
+        return self.files.get(id, torrent and torrent['percent_done'])
+        
+    
+    def show_files(self, id):
+        '''
+        Fills the file list of the torrent options dialog in the background.
+        '''
+        thread = threading.Thread(target=self.update_file_list, args=(id,))
+        thread.setDaemon(True)
+        thread.start()
+        
+    
+    def update_file_list(self, id):
+        items = self.renderer.create_items()
+        for file in self.open_torrent(id):
+            item = self.renderer.create_item()
+            item.SetLabel(file['name'])
+            item.SetProperty('torrent_id', id)
+            item.SetProperty('index', str(file['index']))
+            self.update_file_item(item, file)
+            items.append(item)
+        self.renderer.set_file_items(items)
+        
+    
+    def update_file_item(self, item, file):
+        percent = 100
+        if file['size_bytes']:
+            percent = file['done_bytes'] * 100 / file['size_bytes']
+        item.SetProperty('priority', file['priority'])
+        item.SetProperty('file_status', '%s%% of %s - %s' % (
+            percent,
+            self.format_filesize(file['size_bytes']),
+            file['priority']
+        ))
+        
+    
+    def cycle_file_priority(self, item):
+        '''
+        Moves a file ListItem of the options dialog to the next priority. The change
+        is sent to the daemon together with the ones that follow it shortly.
+        '''
+        priority = FILE_PRIORITIES[(FILE_PRIORITIES.index(item.GetProperty('priority')) + 1) % len(FILE_PRIORITIES)]
+        id = item.GetProperty('torrent_id')
+        index = int(item.GetProperty('index'))
+        self.files.set_priority(id, index, priority)
+        files = self.files.get_cached(id)
+        if files is None:
+            # Called from the skin, load the list on the action queue's thread.
+            self.actions.put_call(self.update_file_item_at, item, id, index)
+        else:
+            self.update_file_item_at(item, id, index, files)
+        
+    
+    def update_file_item_at(self, item, id, index, files=None):
+        '''
+        Updates the file ListItem of file `index` of the torrent `id` from `files`,
+        or from the file list loaded with `open_torrent`.
+        '''
+        if files is None:
+            files = self.open_torrent(id)
+        for file in files:
+            if file['index'] == index:
+                self.update_file_item(item, file)
+        
+    
+    def play_now(self, id, index=None):
+        '''
+        Plays file `index` of the torrent `id`, its largest file when None, as soon as
+        enough of its start is downloaded. Buffering runs in the background.
+        '''
+        thread = threading.Thread(target=self.streams.play, args=(id, index))
+        thread.setDaemon(True)
+        thread.start()
+        
+    
+    def stop_stream(self, id):
+        '''
+        Stops buffering the torrent `id` for playback and puts its file priorities
+        and download order back. Streams stop by themselves once playback is over.
+        '''
+        self.streams.stop(id)
+        
+    
+    def start_profiling(self, cycles=None):
+        '''
+        Profiles the next `cycles` poll cycles, the 'profile_cycles' config value or
+        5 by default, and writes a report to the data directory. See `PollProfiler`.
+        '''
+        if cycles is None:
+            cycles = int(self.renderer.get_setting('profile_cycles') or 5)
+        self.profiler.start(cycles)
+        
+    
+    def check_profile_request(self):
+        '''
+        Starts profiling when the 'profile_now' config value is set to a number of
+        cycles, so it can be turned on without a restart. The value is cleared.
+        '''
+        requested = self.renderer.get_setting('profile_now')
+        if requested:
+            self.renderer.set_setting('profile_now', '')
+            self.start_profiling(int(requested))
+        
+    
+    def get_stats(self):
+        '''
+        Returns the per-method RPC stats recorded by the client transports, slowest
+        total time first. Stats are only recorded while instrumentation is enabled.
+        '''
+        return STATS.get_stats()
+        
+    
+    def set_debug_overlay(self, enabled):
+        '''
+        Turns the RPC stats overlay and the recording behind it on or off.
+        '''
+        self.debug_overlay = enabled
+        if enabled:
+            STATS.enable()
+        else:
+            STATS.disable()
+            self.renderer.set_debug_text(None)
+        
+    
+    def update_debug_overlay(self):
+        '''
+        Shows the most expensive daemon calls on the debug overlay label.
+        '''
+        if not self.debug_overlay:
+            return
+        self.renderer.set_debug_text(STATS.summary())
+        
       
     def format_filesize(self, bytes, labels=True):
         '''
@@ -119,7 +646,7 @@ class TorrentUI(threading.Thread):
         else:
             size = '%.1f' % bytes; unit = 'b' 
            
-        size = size.strip('.0') 
+        size = size.rstrip('0').rstrip('.')
         if str(size).strip() == '':
             size = 0
         if labels:
@@ -128,6 +655,54 @@ class TorrentUI(threading.Thread):
             return size
             
             
+    def format_summary(self, id, label, status, percent_done, rate_download, rate_upload,
+                       downloaded=None, uploaded=None):
+        '''
+        Creates a summary torrent dict. Summaries carry just enough to place a torrent
+        in the list; the rest is fetched for the rows around the viewport only. The
+        byte counters are added when the daemon listed them, see `get_torrents`.
+        '''
+        summary = {
+            'id': id,
+            'label': label,
+            'status': status,
+            'percent_done': percent_done,
+            'rate_download_bytes': rate_download,
+            'rate_upload_bytes': rate_upload,
+            'summary': True
+        }
+        if downloaded is not None and uploaded is not None:
+            summary['downloaded_bytes'] = downloaded
+            summary['uploaded_bytes'] = uploaded
+        return summary
+        
+        
+    def format_file(self, index, name, size, done, priority):
+        '''
+        Creates a file dict from a file's index, name, size and downloaded bytes and
+        its priority, one of 'skip', 'low', 'normal' or 'high'.
+        '''
+        return {
+            'index': index,
+            'name': name,
+            'size_bytes': size,
+            'done_bytes': done,
+            'priority': priority
+        }
+        
+        
+    def format_status(self, rate_download, rate_upload):
+        '''
+        Creates the global status dict from global rates in bytes per second.
+        '''
+        return {
+            'global_download': '%s/s' % self.format_filesize(rate_download), 
+            'global_upload': '%s/s' % self.format_filesize(rate_upload),
+            'rate_download_bytes': rate_download,
+            'rate_upload_bytes': rate_upload
+        }
+            
+            
     def format_time(self, seconds, add_s=False):
         '''
         Formats an integer representation of seconds to a human-readable 
@@ -154,18 +729,34 @@ class TorrentUI(threading.Thread):
         Creates a ListItem from a torrent dict. Used when adding torrents to
         the list.
         '''
-        item = mc.ListItem(mc.ListItem.MEDIA_FILE)
+        item = self.renderer.create_item()
         item.SetLabel(torrent['label'])
         item = self.update_item_from_torrent(item, torrent)
         self.refresh_list = True
         return item
     
     
+    def update_item_from_summary(self, item, torrent):
+        '''
+        Updates the parts of the torrent display a summary dict has information for.
+        The detail lines are kept as they were, or filled with the status if empty.
+        '''
+        item.SetProperty("transfer_status", torrent['status'])
+        item.SetProperty("id", torrent['id'])
+        item.SetProperty("progress_bar", str(int(round(torrent['percent_done'], -1))) )
+        if not item.GetDescription():
+            item.SetDescription("%s (%s%%)" % (torrent['status'], int(torrent['percent_done'])))
+        return item
+    
+    
     def update_item_from_torrent(self, item, torrent):
         '''
         Updates torrent information display.
         Does not refresh the list, just makes changes on the fly.
         '''
+        item.SetProperty("stale", "")
+        if torrent.get('summary'):
+            return self.update_item_from_summary(item, torrent)
         description1 = ''
         description2 = ''
         # Create display info in a format relevant to the torrent status.
@@ -194,7 +785,7 @@ class TorrentUI(threading.Thread):
                 torrent['rate_upload']
             )
         elif torrent['status'] == 'Paused':
-            if torrent['percent_done'] == '100%':
+            if torrent['percent_done'] >= 100:
                 description1 = "%s, uploaded %s (Ratio %s)" % (
                     torrent['size_total'],
                     torrent['size_uploaded'],
@@ -217,114 +808,364 @@ class TorrentUI(threading.Thread):
         return item
 
 
+    def update_rate_history(self, torrents):
+        '''
+        Adds the rates of a snapshot to the rate history and replaces the daemons'
+        instantaneous ETAs with ones based on the smoothed download rate.
+        '''
+        for torrent in torrents:
+            self.history.add(torrent['id'], torrent['rate_download_bytes'], torrent['rate_upload_bytes'])
+            if 'size_left_bytes' in torrent:
+                eta = self.history.get_eta(torrent['id'], torrent['size_left_bytes'])
+                torrent['estimated_time'] = eta is not None and self.format_time(eta) or ''
+        self.history.prune(self.torrents_by_id)
+        
+        
+    def get_rate_history(self, id):
+        '''
+        Returns the recent (download, upload) rate samples of the torrent `id`, in
+        bytes per second and oldest first, for drawing sparklines.
+        '''
+        return self.history.get_rates(id)
+        
+        
+    def get_transfer_summary(self, id=None, start=None, end=None):
+        '''
+        Returns the bytes downloaded and uploaded between the times `start` and
+        `end`, and the peak rates, by the torrent `id` or by all torrents. See
+        `TransferHistory.get_summary`.
+        '''
+        return self.transfers.get_summary(id or GLOBAL, start, end)
+        
+        
+    def get_list_snapshot(self):
+        '''
+        Returns the (torrents, status) snapshot the list is built from. In virtual
+        list mode only the rows in and near the viewport get full details, the rest
+        are summaries.
+        '''
+        if not self.virtual_list:
+            return self.get_snapshot()
+        
+        summaries, status = self.get_summary_snapshot()
+        ids = self.list_ids or [torrent['id'] for torrent in summaries]
+        try:
+            focused = self.renderer.get_focused()
+        except:
+            focused = 0
+        first = max(0, focused - self.viewport_margin)
+        last = focused + self.viewport_rows + self.viewport_margin
+        wanted = ids[first:last]
+        
+        details = {}
+        if wanted:
+            for torrent in self.get_details(wanted):
+                details[torrent['id']] = torrent
+        return [details.get(torrent['id'], torrent) for torrent in summaries], status
+        
+        
+    def fetch_snapshot(self):
+        '''
+        Returns the next (torrents, status) snapshot. A delta against the last one is
+        fetched when the backend supports it and the last fetch is recent enough,
+        a full one at least every `full_refresh_interval` seconds.
+        '''
+        now = time.time()
+        snapshot = None
+        if not self.virtual_list and now - self.fetched_at < self.delta_window and \
+                now - self.refreshed_at < self.full_refresh_interval:
+            snapshot = self.get_delta_snapshot(self.torrents)
+        if snapshot is None:
+            snapshot = self.get_list_snapshot()
+            self.refreshed_at = now
+        self.fetched_at = now
+        return snapshot
+        
+        
+    def is_active(self):
+        '''
+        Returns True while the list is on screen and no media is playing.
+        '''
+        try:
+            return self.renderer.is_visible() and not self.renderer.is_playing()
+        except:
+            return True
+        
+        
+    def is_alive(self):
+        '''
+        Returns False once the list is gone for good, when the poll loop has to stop.
+        Only needed while inactive, drawing finds out by itself.
+        '''
+        try:
+            return self.renderer.is_alive()
+        except:
+            return False
+        
+        
+    def wait_for_next_poll(self):
+        '''
+        Sleeps until the next poll is due: `poll_interval` seconds while the list is
+        active, `background_interval` seconds, or until it is active again, while
+        not. Returns right away when the list becomes active, so it catches up with
+        the daemon as soon as it is back on screen. Returns True when the poll is
+        due, False when the list went away while inactive.
+        '''
+        started = checked = time.time()
+        active = self.is_active()
+        while True:
+            time.sleep(0.5)
+            was_active, active = active, self.is_active()
+            if not active and time.time() - checked >= self.alive_interval:
+                checked = time.time()
+                if not self.is_alive():
+                    return False
+            if active and not was_active:
+                return True
+            if active and self.woken:
+                self.woken = False
+                return True
+            if active:
+                interval = self.poll_interval
+            elif self.background_interval:
+                interval = self.background_interval
+            else:
+                continue
+            if time.time() - started >= interval:
+                return True
+        
+        
+    def wake_up(self):
+        '''
+        Makes the poll loop fetch right away while the list is active, for daemons
+        that push changes.
+        '''
+        self.woken = True
+        
+        
+    def show_cached_snapshot(self):
+        '''
+        Draws the snapshot saved after the last successful poll, marked stale, so
+        the list shows up before the daemon has answered. The first poll reconciles
+        the list with the live torrents. Returns True if there was a snapshot.
+        '''
+        snapshot = self.snapshots.load()
+        if not snapshot or not snapshot[0]:
+            return False
+        torrents, status = snapshot
+        items = self.renderer.create_items()
+        for torrent in torrents:
+            item = self.create_item_from_torrent(torrent)
+            item.SetProperty("stale", "true")
+            items.append(item)
+        self.list_ids = [torrent['id'] for torrent in torrents]
+        self.renderer.set_items(items)
+        self.update_status_display(status)
+        self.renderer.set_loading(False)
+        self.renderer.set_stale(True)
+        return True
+        
+        
+    def update_status_display(self, status):
+        '''
+        Shows the global status, as returned by `get_snapshot`, in the main window.
+        '''
+        try:
+            self.renderer.set_rates(status['global_download'], status['global_upload'])
+        except:
+            raise Exception("Killing the TorrentUI thread.")
+
+
     def update_list(self, firstrun=False):
         '''
-        Main function for updating the torrent list. Usually run in a loop.
-        Gets torrents, makes ListItems out of them and populates the list.
+        Main function for updating the torrent list, `run` calls it in a loop.
+        Waits for the next poll, gets torrents, updates the caches and indexes built
+        from them and draws them with `render_list`. The list is not drawn while
+        inactive, see `is_active`. Returns False once the list is gone and updating
+        should stop.
         '''
-        # Set true when the list needs to be refresh because of added torrents
-        self.refresh_list = False
+        if not firstrun and not self.wait_for_next_poll():
+            return False
         
-        torrents = self.get_torrents()
+        self.check_profile_request()
+        self.profiler.begin_cycle()
+        self.connection_lock.acquire()
+        try:
+            torrents, status = self.fetch_snapshot()
+        finally:
+            self.connection_lock.release()
+        self.profiler.mark('fetch')
         
-        # On the first run, create all torrent items.
-        if firstrun:
-            items = mc.ListItems()
-            for torrent in torrents:
-                item = self.create_item_from_torrent(torrent)
-                items.append(item)
-                # Update the global status items.
-            status = self.get_status()
-            try:
-                WINDOW.GetControl(2000).SetVisible(True)
-                WINDOW.GetLabel(2001).SetLabel(status['global_download'])
-                WINDOW.GetLabel(2002).SetLabel(status['global_upload'])
-            except:
-                raise Exception("Killing the TorrentUI thread.")
-        else:
-            # Wait for 2 seconds, this will later be switched to a var that
-            # can be changed by the user.
-            time.sleep(5.0)
-            
-            # List of current items.
-            try:
-                current_items = TORRENT_LIST.GetItems()
-            except:
-                return
-            
-            current_ids = {}
-            count = 0
-            for item in current_items:
-                current_ids[item.GetProperty('id')] = count
-                count += 1
-            
-            torrent_ids = []
-            
-            new_items = mc.ListItems()
+        self.torrents_by_id = dict([(torrent['id'], torrent) for torrent in torrents])
+        self.files.prune(self.torrents_by_id)
+        self.update_rate_history(torrents)
+        self.transfers.update(torrents)
+        self.index.update(torrents)
+        self.events.publish(torrents)
+        self.bandwidth.update(self.torrents_by_id, self.renderer.is_playing())
+        self.queue.update(torrents)
+        self.torrents = torrents
+        self.status = status
+        self.ingester.update()
+        self.profiler.mark('diff')
+        
+        if self.is_active():
+            if not self.render_list(torrents, status, firstrun):
+                self.profiler.end_cycle()
+                return False
+            self.update_debug_overlay()
+        elif not self.is_alive():
+            self.profiler.end_cycle()
+            return False
+        self.profiler.mark('render')
+        self.snapshots.save(torrents, status)
+        self.profiler.end_cycle()
+        return True
+        
+        
+    def render_list(self, torrents, status, firstrun=False):
+        '''
+        Makes ListItems out of a snapshot and populates the list, updating the
+        items already in it in place. Only the torrents matching the filter set
+        with `set_filter` are shown. Returns False if the list is gone.
+        '''
+        self.render_lock.acquire()
+        try:
+            # Set true when the list needs to be refresh because of added torrents
+            self.refresh_list = False
+            torrents = self.filter_torrents(torrents)
             
-            for torrent in torrents:
-                # Existing torrent, update the current ListItem.
-                if torrent['id'] in current_ids.keys():
-                    item = current_items[current_ids[torrent['id']]]
-                    self.update_item_from_torrent(item, torrent)
-
-                # This torrent is not in the current list, create a ListItem.
-                else:
+            # On the first run, create all torrent items. If the cached snapshot is
+            # on screen already, it is reconciled like any other update.
+            if firstrun and not self.list_ids:
+                items = self.renderer.create_items()
+                for torrent in torrents:
                     item = self.create_item_from_torrent(torrent)
-                    new_items.append(item)
+                    items.append(item)
+                # Update the global status items.
+                self.update_status_display(status)
+            else:
+                # List of current items.
+                try:
+                    current_items = self.renderer.get_items()
+                except:
+                    return False
                 
-
-                torrent_ids.append(torrent['id'])
+                current_ids = {}
+                count = 0
+                for item in current_items:
+                    current_ids[item.GetProperty('id')] = count
+                    count += 1
                 
-            try:
-                # Update the global status items.
-                status = self.get_status()
-                WINDOW.GetControl(2000).SetVisible(True)
-                WINDOW.GetLabel(2001).SetLabel(status['global_download'])
-                WINDOW.GetLabel(2002).SetLabel(status['global_upload'])  
-            except:
-                raise Exception("Killing the TorrentUI thread.")
+                torrent_ids = {}
                 
-            new_ids = []
-            for current_id in current_ids.keys():
-                if current_id in torrent_ids:
-                    new_ids.append(current_id)
-                    
-            for new_id in new_ids:
-                new_items.append(TORRENT_LIST.GetItem(current_ids[new_id]))
-    
-            items = current_items
-            if len(new_items) != len(current_items):
-                self.refresh_list = True
-                items = new_items
-        
-        # If the list needs to be refreshed, do it. When you call SetItems()
-        # on a list, it loses it's focus and you end up at the top again.
-        if self.refresh_list:
-            # Try to get the currently selected item.
-            try:
-                selected = TORRENT_LIST.GetFocusedItem()
-            except:
-                pass
-            # Set the new list values.
-            TORRENT_LIST.SetItems(items)
-            # Try to restore the previously selected item.
-            try:
-                TORRENT_LIST.SetFocusedItem(selected)
-            except:
-                pass
+                new_items = self.renderer.create_items()
                 
-        STATUS.SetVisible(False)
-        WINDOW.GetControl(3000).SetVisible(False)
-        # Do it all again.
-        self.update_list()
+                for torrent in torrents:
+                    # Existing torrent, update the current ListItem unless an action
+                    # on it is still in flight.
+                    if torrent['id'] in current_ids:
+                        item = current_items[current_ids[torrent['id']]]
+                        if not self.actions.is_pending(torrent['id']):
+                            self.update_item_from_torrent(item, torrent)
+    
+                    # This torrent is not in the current list, create a ListItem.
+                    else:
+                        item = self.create_item_from_torrent(torrent)
+                        new_items.append(item)
+                    
+    
+                    torrent_ids[torrent['id']] = True
+                    
+                # Update the global status items.
+                self.update_status_display(status)
+                    
+                new_ids = []
+                for current_id in current_ids.keys():
+                    if current_id in torrent_ids:
+                        new_ids.append(current_id)
+                        
+                for new_id in new_ids:
+                    new_items.append(current_items[current_ids[new_id]])
+        
+                items = current_items
+                if self.refresh_list or len(new_items) != len(current_items):
+                    self.refresh_list = True
+                    items = new_items
+            
+            # If the list needs to be refreshed, do it. The renderer keeps the focus
+            # on the previously selected item.
+            if self.refresh_list:
+                self.list_ids = [item.GetProperty('id') for item in items]
+                self.renderer.set_items(items)
+                    
+            self.renderer.set_loading(False)
+            self.renderer.set_stale(False)
+            return True
+        finally:
+            self.render_lock.release()
+        
+        
+    def subscribe(self, callback, types=None, ids=None, test=None):
+        '''
+        Calls `callback(event)` for the torrent changes found in each poll, instead
+        of fetching and comparing torrents again. See `events.EventBus` for the
+        events and filters. Returns the subscription to pass to `unsubscribe`.
+        '''
+        return self.events.subscribe(callback, types, ids, test)
+        
+        
+    def unsubscribe(self, subscription):
+        self.events.unsubscribe(subscription)
+        
+        
+    def filter_torrents(self, torrents):
+        '''
+        Returns the torrents of a snapshot that match the current filter.
+        '''
+        if not self.search_query and not self.search_filters:
+            return torrents
+        matches = self.index.search(self.search_query, **self.search_filters)
+        return [torrent for torrent in torrents if torrent['id'] in matches]
+        
+        
+    def set_filter(self, query='', **filters):
+        '''
+        Only shows the torrents with a name matching `query` and facets matching
+        `filters`, see `TorrentIndex.search`. For example
+        set_filter('ubuntu', status='Seeding'). Without arguments the filter is
+        cleared. The list is redrawn from the last snapshot right away.
+        '''
+        self.search_query = query
+        self.search_filters = filters
+        if self.status is not None:
+            self.render_list(self.torrents, self.status)
+        
+        
+    def get_facet(self, facet):
+        '''
+        Returns the (value, count) pairs of 'status', 'category' or 'tracker' over
+        the last snapshot, largest count first.
+        '''
+        return self.index.get_facet(facet)
+        
+        
+    def get_tracker_host(self, urls):
+        '''
+        Returns the host name of the first tracker announce url in `urls`, or ''.
+        '''
+        for url in urls:
+            host = urlparse.urlsplit(url)[1].split(':', 1)[0]
+            if host:
+                return host
+        return ''
     
     
     def sort_torrents(self, sort_type):
         items_dict = {}
         
         if sort_type == "alphabetical":
-            for item in TORRENT_LIST.GetItems():
+            for item in self.renderer.get_items():
                 items_dict[item.GetLabel()] = item
             labels = items_dict.keys()
             labels.sort()
@@ -333,7 +1174,7 @@ class TorrentUI(threading.Thread):
                 ordered_list.append(items_dict[label])
         elif sort_type == "status":
             down = []; seed = []; pause = []
-            for item in TORRENT_LIST.GetItems():
+            for item in self.renderer.get_items():
                 if item.GetProperty('transfer_status') == 'Downloading':
                     down.append(item)
                 if item.GetProperty('transfer_status') == 'Seeding':
@@ -342,235 +1183,321 @@ class TorrentUI(threading.Thread):
                     pause.append(item)
             ordered_list = down + seed + pause
         
-        WINDOW.GetLabel(104).SetLabel(sort_type.upper())
-        print ordered_list
+        self.renderer.set_sort_label(sort_type.upper())
         
-        list_items = mc.ListItems()        
+        list_items = self.renderer.create_items()
         for item in ordered_list:
             list_items.append(item)
             
-        TORRENT_LIST.SetItems(list_items)
+        self.renderer.set_items(list_items, keep_focus=False)
+        # Rows are filled in by list position in virtual list mode.
+        self.list_ids = [item.GetProperty('id') for item in ordered_list]
         
 
-class TransmissionUI(TorrentUI):
+class AggregateUI(TorrentUI):
     '''
-    TorrentUI subclass for the Transmission torrent client.
+    TorrentUI over several daemons, of any mix of backends, shown as one list.
+    
+    The daemons are polled in parallel, so a poll takes as long as the slowest
+    daemon. Torrent ids are prefixed with the daemon name, `split_id` turns them
+    back into a (daemon, id) pair.
+    
+    Arguments:
+        backends: A list of (name, TorrentUI) pairs, one per daemon. Only their
+        fetching and action methods are used, their threads are never started.
     '''
-    def get_status(self):
-        status = self.connection.sessionStats()['arguments']
-        status = {
-            'global_download': '%s/s' % self.format_filesize(status['downloadSpeed']), 
-            'global_upload': '%s/s' % self.format_filesize(status['uploadSpeed'])
-        }
-        return status
+    separator = ':'
+    
+    
+    def __init__(self, backends, renderer=None):
+        super(AggregateUI, self).__init__(None, renderer)
+        self.backends = backends
+        self.backends_by_name = dict(backends)
         
-         
-    def get_torrents(self):
-        feed_torrents = self.connection.torrentGet()['arguments']['torrents']
-        torrents = []
         
-        for torrent_data in feed_torrents:
+    @classmethod
+    def from_config(cls, value, renderer=None):
+        '''
+        Creates an AggregateUI from the 'daemons' config value, a list of
+        `name|client_name|url|username|password` entries separated by ';'. The
+        credentials may be left out. Malformed entries and daemons that can not be
+        reached are reported and skipped. Raises TorrentUIError if none is left.
+        '''
+        backends = []
+        for entry in value.split(';'):
+            if not entry.strip():
+                continue
+            fields = [field.strip() for field in entry.split('|')]
+            if len(fields) < 3 or len(fields) > 5 or not fields[0] or not fields[2] or \
+                    cls.separator in fields[0]:
+                print "Skipping malformed daemons entry: %r" % entry
+                continue
+            name, client_name, url, username, password = (fields + ['', ''])[:5]
+            if name in dict(backends):
+                print "Skipping daemons entry with a duplicate name: %r" % entry
+                continue
+            try:
+                backends.append((name, connect_backend(client_name, url, username, password,
+                                                       renderer=renderer, backend=True)))
+            except Exception, e:
+                print "Skipping daemon %s, connecting failed: %s" % (name, e)
+        if not backends:
+            raise TorrentUIError("No usable daemons in %r" % value)
+        return cls(backends, renderer)
         
-            total_bytes_completed = 0
-            for payload in torrent_data['files']:
-                total_bytes_completed += payload['bytesCompleted']
         
-            if torrent_data['status'] == 4:
-                status = 'Downloading'
-            elif torrent_data['status'] == 8:
-                status = 'Seeding'
-            elif torrent_data['status'] == 16:
-                status = 'Paused'
-            else:
-                status = 'Unknown'
-            
-            if torrent_data['percentDone']*100 == 100.0:
-                torrent_data['percentDone'] = 1
-        
-            torrents.append({
-                'id': str(torrent_data['id']),
-                'label': str(torrent_data['name']),
-                'status': status,
-                'size_total': self.format_filesize(torrent_data['totalSize']),
-                'size_downloaded': self.format_filesize(total_bytes_completed),
-                'size_uploaded': self.format_filesize(torrent_data['uploadedEver']),
-                'percent_done': (torrent_data['percentDone']*100),
-                'estimated_time': self.format_time(torrent_data['eta']),
-                'peers_connected': torrent_data['peersConnected'],
-                'peers_incoming': torrent_data['peersSendingToUs'],
-                'peers_outgoing': torrent_data['peersGettingFromUs'],
-                'rate_download': self.format_filesize(torrent_data['rateDownload']),
-                'rate_upload': self.format_filesize(torrent_data['rateUpload']),
-                'ratio': str(torrent_data['uploadRatio'])
-            })
-            
-        return torrents
+    def split_id(self, id):
+        '''
+        Returns the (daemon name, id) pair for a prefixed id.
+        '''
+        return tuple(id.split(self.separator, 1))
         
         
-    def start_torrent(self, id=False):
-        print "Starting torrent"
-        if id:
-            print "Starting torrent with id: %s" % id
-            self.connection.torrentStart(torrents=id)
-        else:
-            print "Starting all torrents"
-            self.connection.torrentStart()
+    def split_ids(self, ids):
+        '''
+        Groups prefixed ids by daemon. Returns a list of (TorrentUI, daemon name,
+        ids) tuples.
+        '''
+        groups = {}
+        for id in ids:
+            name, id = self.split_id(id)
+            groups.setdefault(name, []).append(id)
+        return [(self.backends_by_name[name], name, ids) for name, ids in groups.items()]
         
         
-    def stop_torrent(self, id=False):
-        if id:
-            self.connection.torrentStop(torrents=id)
-        else:
-            self.connection.torrentStop()
+    def poll_backend(self, name, backend, method, results):
+        backend.connection_lock.acquire()
+        try:
+            try:
+                results[name] = getattr(backend, method)()
+            except Exception, e:
+                print "Polling %s failed: %s" % (name, e)
+                results[name] = None
+        finally:
+            backend.connection_lock.release()
         
         
-    def delete_torrent(self, id, files=False):
-        if id:
-            self.connection.torrentRemove(torrents=id, files=files)
-        else:
-            self.connection.torrentRemove(files)
+    def get_snapshot(self):
+        return self.poll_backends('get_snapshot')
         
         
-class rTorrentUI(TorrentUI):
-    '''
-    TorrentUI subclass for the rTorrent client.
-    '''
-    def get_status(self):
-        print "get_status Ran"
-        print "Methods: %s" % status
-        status = {
-            'global_download': '%s/s' % self.format_filesize(status['downloadSpeed']), 
-            'global_upload': '%s/s' % self.format_filesize(status['uploadSpeed'])
-        }
-        return status
-
-         
-    def get_torrents(self):
+    def get_summary_snapshot(self):
+        return self.poll_backends('get_summary_snapshot')
         
-        conn = self.connection
         
+    def get_details(self, ids):
         torrents = []
-        
-        views = ['started', 'stopped', 'seeding']
-        for view in views:
-            infohashes = conn.download_list(view)
-            for infohash in infohashes:
-                print "up_total: %s" % conn.d.get_up_total(infohash)     
-             
-                if view == 'started':
-                    status = 'Downloading'
-                elif view == 'seeding':
-                    status = 'Seeding'
-                elif view == 'stopped':
-                    status = 'Paused'
-                else:
-                    status = 'Unknown'
-                print status
-                
-                total = int(conn.d.get_size_bytes(infohash))
-                completed = int(total)-int(conn.d.get_left_bytes(infohash))
-                print "total: %s" % total
-                print "completed: %s" % completed
-                percent = (float(completed)*100.00)/float(total)
-                print "percent: %s" % percent
-                torrents.append({
-                    'id': str(infohash),
-                    'label': str(conn.d.get_name(infohash)),
-                    'status': status,
-                    'size_total': self.format_filesize(total),
-                    'size_downloaded': self.format_filesize(completed),
-                    'size_uploaded': self.format_filesize(conn.d.get_up_total(infohash)),
-                    'percent_done': percent,
-                    'estimated_time': self.format_time(torrent_data['eta']),
-                    'peers_connected': conn.d.get_peers_connected(infohash),
-                    'peers_incoming': conn.d.get_ratio(infohash),
-                    'peers_outgoing': conn.d.get_ratio(infohash),
-                    'rate_download': self.format_filesize(conn.d.get_down_rate(infohash)),
-                    'rate_upload': self.format_filesize(conn.d.get_up_rate(infohash)),
-                    'ratio': conn.d.get_ratio(infohash)
-                })
-            
+        for backend, name, backend_ids in self.split_ids(ids):
+            for torrent in self.run_backend(backend, 'get_details', backend_ids):
+                torrents.append(self.prefix_torrent(name, torrent))
         return torrents
-
-
-class uTorrentUI(TorrentUI):
-    '''
-    TorrentUI subclass for the uTorrent client.
-    '''
-    def get_status(self):
-        print "uTorrent returned: %s" % self.connection.webui_get()
-        # status = self.connection.sessionStats()['arguments']
-#         status = {
-#             'global_download': '%s/s' % self.format_filesize(status['downloadSpeed']), 
-#             'global_upload': '%s/s' % self.format_filesize(status['uploadSpeed'])
-#         }
-#         return status
-        
-         
-    def get_torrents(self):
-        print self.connection
-        print "uTorrent returned: %s" % self.connection.webui_get()
-        feed_torrents = self.connection.torrentGet()['arguments']['torrents']
+        
+        
+    def prefix_torrent(self, name, torrent):
+        torrent = dict(torrent)
+        torrent['id'] = '%s%s%s' % (name, self.separator, torrent['id'])
+        torrent['daemon'] = name
+        return torrent
+        
+        
+    def poll_backends(self, method):
+        '''
+        Calls the snapshot `method` of every daemon in parallel and merges the
+        results into one snapshot.
+        '''
+        results = {}
+        threads = []
+        for name, backend in self.backends:
+            thread = threading.Thread(target=self.poll_backend, args=(name, backend, method, results))
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        
         torrents = []
+        daemons = []
+        rate_download = 0
+        rate_upload = 0
+        for name, backend in self.backends:
+            if results[name] is None:
+                daemons.append((name, None))
+                continue
+            daemon_torrents, daemon_status = results[name]
+            for torrent in daemon_torrents:
+                torrents.append(self.prefix_torrent(name, torrent))
+            rate_download += daemon_status['rate_download_bytes']
+            rate_upload += daemon_status['rate_upload_bytes']
+            daemons.append((name, daemon_status))
+        
+        if len(daemons) and not [status for name, status in daemons if status]:
+            raise TorrentConnectionError("None of the torrent daemons answered.")
         
-        for torrent_data in feed_torrents:
+        status = self.format_status(rate_download, rate_upload)
+        status['daemons'] = daemons
+        return torrents, status
         
-            total_bytes_completed = 0
-            for payload in torrent_data['files']:
-                total_bytes_completed += payload['bytesCompleted']
         
-            if torrent_data['status'] == 4:
-                status = 'Downloading'
-            elif torrent_data['status'] == 8:
-                status = 'Seeding'
-            elif torrent_data['status'] == 16:
-                status = 'Paused'
+    def get_torrents(self):
+        return self.get_snapshot()[0]
+        
+        
+    def update_status_display(self, status):
+        super(AggregateUI, self).update_status_display(status)
+        # Per-daemon rates go in the header label next to the title.
+        parts = []
+        for name, daemon_status in status['daemons']:
+            if daemon_status is None:
+                parts.append('%s: offline' % name)
             else:
-                status = 'Unknown'
-            
-            if torrent_data['percentDone']*100 == 100.0:
-                torrent_data['percentDone'] = 1
-        
-            torrents.append({
-                'id': str(torrent_data['id']),
-                'label': str(torrent_data['name']),
-                'status': status,
-                'size_total': self.format_filesize(torrent_data['totalSize']),
-                'size_downloaded': self.format_filesize(total_bytes_completed),
-                'size_uploaded': self.format_filesize(torrent_data['uploadedEver']),
-                'percent_done': (torrent_data['percentDone']*100),
-                'estimated_time': self.format_time(torrent_data['eta']),
-                'peers_connected': torrent_data['peersConnected'],
-                'peers_incoming': torrent_data['peersSendingToUs'],
-                'peers_outgoing': torrent_data['peersGettingFromUs'],
-                'rate_download': self.format_filesize(torrent_data['rateDownload']),
-                'rate_upload': self.format_filesize(torrent_data['rateUpload']),
-                'ratio': str(torrent_data['uploadRatio'])
-            })
-            
-        return torrents
+                parts.append('%s: DL %s UL %s' % (
+                    name,
+                    daemon_status['global_download'],
+                    daemon_status['global_upload']
+                ))
+        self.renderer.set_header(' | '.join(parts))
+        
+        
+    def run_backend(self, backend, method, *args):
+        backend.connection_lock.acquire()
+        try:
+            return getattr(backend, method)(*args)
+        finally:
+            backend.connection_lock.release()
         
         
     def start_torrent(self, id=False):
-        print "Starting torrent"
         if id:
-            print "Starting torrent with id: %s" % id
-            self.connection.torrentStart(torrents=id)
+            self.start_torrents([id])
         else:
-            print "Starting all torrents"
-            self.connection.torrentStart()
+            for name, backend in self.backends:
+                self.run_backend(backend, 'start_torrent')
         
         
     def stop_torrent(self, id=False):
         if id:
-            self.connection.torrentStop(torrents=id)
+            self.stop_torrents([id])
         else:
-            self.connection.torrentStop()
+            for name, backend in self.backends:
+                self.run_backend(backend, 'stop_torrent')
         
         
     def delete_torrent(self, id, files=False):
         if id:
-            self.connection.torrentRemove(torrents=id, files=files)
+            self.delete_torrents([id], files)
         else:
-            self.connection.torrentRemove(files)
+            for name, backend in self.backends:
+                self.run_backend(backend, 'delete_torrent', False, files)
+        
+        
+    def start_torrents(self, ids):
+        for backend, name, backend_ids in self.split_ids(ids):
+            self.run_backend(backend, 'start_torrents', backend_ids)
+        
+        
+    def stop_torrents(self, ids):
+        for backend, name, backend_ids in self.split_ids(ids):
+            self.run_backend(backend, 'stop_torrents', backend_ids)
+        
+        
+    def delete_torrents(self, ids, files=False):
+        for backend, name, backend_ids in self.split_ids(ids):
+            self.run_backend(backend, 'delete_torrents', backend_ids, files)
+        
+        
+    def add_torrents(self, torrents):
+        # New torrents go to the first daemon.
+        name, backend = self.backends[0]
+        self.run_backend(backend, 'add_torrents', torrents)
+        
+        
+    def get_info_hash(self, torrent):
+        return torrent.get('info_hash', self.split_id(torrent['id'])[1]).lower()
+        
+        
+    def set_priority(self, ids, priority):
+        for backend, name, backend_ids in self.split_ids(ids):
+            self.run_backend(backend, 'set_priority', backend_ids, priority)
+        
+        
+    def set_speed_limits(self, download=None, upload=None):
+        # Every daemon gets the full limit, they usually sit on separate links.
+        for name, backend in self.backends:
+            self.run_backend(backend, 'set_speed_limits', download, upload)
+        
+        
+    def set_torrent_speed_limits(self, limits):
+        for backend, name, backend_ids in self.split_ids(limits.keys()):
+            try:
+                self.run_backend(backend, 'set_torrent_speed_limits',
+                    dict([(id, limits[self.separator.join((name, id))]) for id in backend_ids]))
+            except NotImplementedError, e:
+                # Skipped, the other daemons still get theirs.
+                print "Not setting torrent speed limits on %s: %s" % (name, e)
+        
+        
+    def get_files(self, id):
+        name, id = self.split_id(id)
+        return self.run_backend(self.backends_by_name[name], 'get_files', id)
+        
+        
+    def get_file_progress(self, id, files):
+        name, id = self.split_id(id)
+        return self.run_backend(self.backends_by_name[name], 'get_file_progress', id, files)
+        
+        
+    def set_file_priorities(self, id, priorities):
+        name, id = self.split_id(id)
+        return self.run_backend(self.backends_by_name[name], 'set_file_priorities', id, priorities)
+        
+        
+    def set_sequential(self, id, index, enabled=True):
+        name, id = self.split_id(id)
+        return self.run_backend(self.backends_by_name[name], 'set_sequential', id, index, enabled)
+        
+        
+    def get_file_pieces(self, id, index):
+        name, id = self.split_id(id)
+        return self.run_backend(self.backends_by_name[name], 'get_file_pieces', id, index)
+        
+        
+    def get_file_path(self, id, index):
+        name, id = self.split_id(id)
+        return self.run_backend(self.backends_by_name[name], 'get_file_path', id, index)
+        
+        
+    def get_stream_path(self, id, index):
+        # Whether a path is reachable depends on the daemon it comes from.
+        name, id = self.split_id(id)
+        return self.run_backend(self.backends_by_name[name], 'get_stream_path', id, index)
+
+
+def set_renderer(renderer):
+    '''
+    Sets the Renderer TorrentUIs created without one draw with. The skin passes a
+    BoxeeRenderer before connecting.
+    '''
+    global RENDERER
+    RENDERER = renderer
+
 
+def load_backend(client_name):
+    '''
+    Imports the backend of `client_name` and returns its TorrentUI subclass.
+    '''
+    try:
+        module_name, class_name = BACKENDS[client_name.lower()]
+    except KeyError:
+        raise TorrentUIError("Unknown torrent client: %s" % client_name)
+    module = __import__(module_name)
+    return getattr(module, class_name)
+
+
+def connect_backend(client_name, url, username='', password='', **options):
+    '''
+    Connects to a torrent daemon and returns a TorrentUI for it without starting
+    its thread. `client_name` is one of the `BACKENDS` names, `options` are passed
+    on to the TorrentUI.
+    '''
+    ui = load_backend(client_name).connect(url, username, password, **options)
+    ui.url = url
+    return ui
@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+import sys, time, threading, marshal, zlib, SocketServer, BaseHTTPServer, xmlrpclib
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+
+# First record of every capture file, bumped when the record layout changes.
+HEADER = ('torrentui-traffic', 1)
+
+
+class TrafficRecorder(object):
+    '''
+    Captures the requests the torrent client transports send and the responses
+    they get, to replay them later with `ReplayServer`.
+
+    Each exchange is appended to the capture file as one marshal record of
+    (time, client, key, request, status, headers, compressed response, elapsed).
+    `key` is what the replay matches requests on: the RPC method or WebUI action.
+    Responses are stored decompressed, then zlib compressed for the file.
+
+    Capturing is off by default, the transports then only pay for the check in
+    `start`, the same as with `instrumentation.STATS`.
+    '''
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.file = None
+
+
+    def enable(self, path):
+        '''
+        Starts appending exchanges to the capture file at `path`.
+        '''
+        self.lock.acquire()
+        try:
+            if self.file is None:
+                self.file = open(path, 'ab')
+                if self.file.tell() == 0:
+                    marshal.dump(HEADER, self.file)
+            self.enabled = True
+        finally:
+            self.lock.release()
+
+
+    def disable(self):
+        self.lock.acquire()
+        try:
+            self.enabled = False
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+        finally:
+            self.lock.release()
+
+
+    def start(self):
+        '''
+        Returns a start time for an exchange, or None when not capturing.
+        '''
+        if self.enabled:
+            return time.time()
+        return None
+
+
+    def record(self, started, client, key, request, response, status=200, headers=None):
+        '''
+        Appends one exchange. Nothing is written if `started`, the value returned by
+        `start`, is None.
+        '''
+        if started is None:
+            return
+        entry = (started, client, key, request, status, headers or {},
+                 zlib.compress(response), time.time() - started)
+        self.lock.acquire()
+        try:
+            if self.file is not None:
+                marshal.dump(entry, self.file)
+                self.file.flush()
+        finally:
+            self.lock.release()
+
+
+# Shared by all client transports.
+RECORDER = TrafficRecorder()
+
+
+def load(path):
+    '''
+    Returns the exchanges of a capture file as a list of dicts.
+    '''
+    exchanges = []
+    capture_file = open(path, 'rb')
+    try:
+        if marshal.load(capture_file) != HEADER:
+            raise ValueError("%s is not a capture file of this version" % path)
+        while True:
+            try:
+                started, client, key, request, status, headers, response, elapsed = marshal.load(capture_file)
+            except EOFError:
+                break
+            exchanges.append({
+                'started': started,
+                'client': client,
+                'key': key,
+                'request': request,
+                'status': status,
+                'headers': headers,
+                'response': zlib.decompress(response),
+                'elapsed': elapsed
+            })
+    finally:
+        capture_file.close()
+    return exchanges
+
+
+def get_key(client, path, body):
+    '''
+    Works out the replay key of a request the way the transports name them.
+    '''
+    try:
+        if client == 'transmission':
+            return json.loads(body).get('method')
+        if client == 'utorrent':
+            if 'action=' in path:
+                return path.split('action=', 1)[1].split('&', 1)[0]
+            return 'list'
+        if client == 'rtorrent':
+            return xmlrpclib.loads(body)[1]
+    except Exception:
+        pass
+    return None
+
+
+class Replay(object):
+    '''
+    Hands out the captured responses of one client in their original order, per
+    key. A request whose key was never captured gets the client's next response
+    of any key. Once all responses of a key were used they start over.
+
+    Arguments:
+        exchanges: Exchanges as returned by `load`
+        client: 'transmission', 'utorrent' or 'rtorrent'
+        speed: How much faster than captured responses are sent. 1 keeps each
+        response's original latency, 0 sends them right away.
+    '''
+    def __init__(self, exchanges, client, speed=1.0):
+        self.speed = speed
+        self.lock = threading.Lock()
+        self.exchanges = [exchange for exchange in exchanges if exchange['client'] == client]
+        # Key -> list of exchanges, and the index of the next one to use.
+        self.by_key = {}
+        for exchange in self.exchanges:
+            self.by_key.setdefault(exchange['key'], []).append(exchange)
+        self.positions = {}
+        if not self.exchanges:
+            raise ValueError("Nothing captured for %s" % client)
+
+
+    def next(self, key):
+        self.lock.acquire()
+        try:
+            if key not in self.by_key:
+                key = '*'
+            exchanges = self.by_key.get(key, self.exchanges)
+            position = self.positions.get(key, 0)
+            self.positions[key] = (position + 1) % len(exchanges)
+            return exchanges[position]
+        finally:
+            self.lock.release()
+
+
+    def wait(self, exchange):
+        if self.speed:
+            time.sleep(exchange['elapsed'] / self.speed)
+
+
+class ReplayHTTPHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    '''
+    Answers Transmission RPC and uTorrent WebUI requests from a Replay.
+    '''
+    def log_message(self, format, *args):
+        pass
+
+
+    def do_GET(self):
+        self.reply('')
+
+
+    def do_POST(self):
+        self.reply(self.rfile.read(int(self.headers.getheader('Content-Length') or 0)))
+
+
+    def reply(self, body):
+        replay = self.server.replay
+        exchange = replay.next(get_key(self.server.client, self.path, body))
+        replay.wait(exchange)
+        self.send_response(exchange['status'])
+        for name, value in exchange['headers'].items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(exchange['response'])))
+        self.end_headers()
+        self.wfile.write(exchange['response'])
+
+
+class ReplaySCGIHandler(SocketServer.StreamRequestHandler):
+    '''
+    Answers rTorrent SCGI requests from a Replay.
+    '''
+    def handle(self):
+        length = ''
+        while not length.endswith(':'):
+            length += self.rfile.read(1)
+        headers = self.rfile.read(int(length[:-1]) + 1).split('\x00')
+        body = self.rfile.read(int(dict(zip(headers[::2], headers[1::2]))['CONTENT_LENGTH']))
+        replay = self.server.replay
+        exchange = replay.next(get_key('rtorrent', '', body))
+        replay.wait(exchange)
+        self.wfile.write(exchange['response'])
+
+
+class ReplayServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+    '''
+    Serves a capture file's responses to a client pointed at it, for profiling
+    decoding, diffing and rendering against real daemon traffic without the
+    daemon.
+
+    Arguments:
+        path: The capture file
+        client: 'transmission', 'utorrent' or 'rtorrent', whose exchanges to serve
+        address: The (host, port) to listen on, port 0 picks a free one
+        speed: See `Replay`
+    '''
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+    def __init__(self, path, client, address=('localhost', 0), speed=1.0):
+        self.client = client
+        self.replay = Replay(load(path), client, speed)
+        handler = client == 'rtorrent' and ReplaySCGIHandler or ReplayHTTPHandler
+        SocketServer.TCPServer.__init__(self, address, handler)
+
+
+    def get_url(self):
+        '''
+        Returns the url to connect the client to.
+        '''
+        host, port = self.server_address
+        return '%s://%s:%d' % (self.client == 'rtorrent' and 'scgi' or 'http', host, port)
+
+
+def main(argv):
+    if len(argv) < 2:
+        print "Usage: traffic.py <capture file> <transmission|utorrent|rtorrent> [port] [speed]"
+        return 1
+    if len(argv) > 2:
+        port = int(argv[2])
+    else:
+        port = 0
+    # A speed of 0 answers without any delay.
+    if len(argv) > 3:
+        speed = float(argv[3])
+    else:
+        speed = 1.0
+    server = ReplayServer(argv[0], argv[1], ('localhost', port), speed)
+    print "Replaying %d exchanges at %s" % (len(server.replay.exchanges), server.get_url())
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
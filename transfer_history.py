@@ -0,0 +1,308 @@
+import os, math, mmap, struct, time, threading, hashlib
+
+
+# Downsampling tiers as (bucket width in seconds, number of buckets). Every sample is
+# added to the current bucket of each tier, so a tier keeps transfer sums at its
+# resolution for width * buckets seconds: an hour by 10 seconds, a day by minutes
+# and six weeks by hours.
+TIERS = ((10, 360), (60, 1440), (3600, 1008))
+
+MAGIC = 'TUIRING1'
+# Magic, number of slots and number of tiers, followed by a TIER per tier.
+HEADER = struct.Struct('<8sII')
+TIER = struct.Struct('<II')
+# Series key, zero padded, and when the series last got a sample. See `get_key`.
+SLOT = struct.Struct('<64sI')
+# Bucket start, bytes downloaded and bytes uploaded in the bucket.
+RECORD = struct.Struct('<Iqq')
+
+# Series id of the global transfers.
+GLOBAL = '*'
+
+
+def get_key(id):
+    '''
+    Returns the key the series `id` is kept under in the slot table: the id
+    itself, or '#' and its SHA1 when it does not fit, as aggregated ids may not.
+    '''
+    if len(id) <= 64:
+        return id
+    return '#' + hashlib.sha1(id).hexdigest()
+
+
+class TransferHistory(object):
+    '''
+    Keeps the bytes downloaded and uploaded over time, globally and per torrent, in
+    a fixed size ring file that is memory mapped, so the history outlives the app
+    and never grows.
+
+    The file has a header, a table of `slots` series keys and the records of each
+    series: one ring of fixed size records per tier, see TIERS. The global series
+    always has a slot. Torrents get one the first time they transfer something,
+    once all are taken the torrent that transferred least recently loses its slot.
+
+    Samples are what the daemon's byte counters of each torrent, 'downloaded_bytes'
+    and 'uploaded_bytes', grew by since the previous poll, so nothing is guessed
+    from rates however far apart the polls are. The global series is the sum over
+    all torrents. Queries read the records they need straight from the map, one at
+    a time.
+
+    Arguments:
+        path: The ring file
+        slots: Number of series kept, the global one included. 0 disables the
+        history.
+        tiers: See TIERS. A file laid out for other slots or tiers is started over.
+    '''
+    # Seconds between flushes of the map to disk.
+    flush_interval = 60
+
+
+    def __init__(self, path, slots=64, tiers=TIERS):
+        self.path = path
+        self.slots = slots
+        self.tiers = tiers
+        self.lock = threading.Lock()
+        self.file = None
+        self.map = None
+        # Series key -> slot, and when each slot was last sampled.
+        self.ids = {}
+        self.seen = [0] * slots
+        # Torrent id -> (downloaded, uploaded) counters of the previous poll.
+        self.counters = {}
+        self.flushed_at = 0
+
+        # Offset of each tier's ring within a slot's records.
+        self.tier_offsets = []
+        offset = 0
+        for width, count in tiers:
+            self.tier_offsets.append(offset)
+            offset += count * RECORD.size
+        self.slot_size = offset
+        self.table_offset = HEADER.size + TIER.size * len(tiers)
+        self.data_offset = self.table_offset + SLOT.size * slots
+        self.size = self.data_offset + self.slot_size * slots
+        if slots:
+            self.open()
+
+
+    @classmethod
+    def from_config(cls, ui, get_setting):
+        '''
+        Creates a history in the app's data directory, with the number of slots in
+        the 'transfer_history_slots' config value, read with `get_setting`.
+        '''
+        slots = get_setting('transfer_history_slots') or 64
+        return cls(os.path.join(ui.renderer.get_data_dir(), 'transfers.ring'), int(slots))
+
+
+    def open(self):
+        header = HEADER.pack(MAGIC, self.slots, len(self.tiers)) + \
+            ''.join([TIER.pack(*tier) for tier in self.tiers])
+        try:
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            self.file = open(self.path, os.path.exists(self.path) and 'r+b' or 'w+b')
+            if self.file.read(len(header)) != header or os.path.getsize(self.path) != self.size:
+                self.file.seek(0)
+                self.file.truncate()
+                self.file.write(header)
+                self.file.seek(self.size - 1)
+                self.file.write('\0')
+                self.file.flush()
+            self.map = mmap.mmap(self.file.fileno(), self.size)
+        except (IOError, OSError, mmap.error), e:
+            print "Could not open the transfer history: %s" % e
+            self.close()
+            return
+
+        for slot in range(self.slots):
+            id, seen = SLOT.unpack_from(self.map, self.table_offset + slot * SLOT.size)
+            id = id.rstrip('\0')
+            if id:
+                self.ids[id] = slot
+                self.seen[slot] = seen
+
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+    def is_enabled(self):
+        return self.map is not None
+
+
+    def get_slot(self, id, now):
+        '''
+        Returns the slot of the series `id`, taking a free one or the least recently
+        sampled torrent's for a new series.
+        '''
+        key = get_key(id)
+        slot = self.ids.get(key)
+        if slot is not None:
+            return slot
+        used = self.ids.values()
+        free = [slot for slot in range(self.slots) if slot not in used]
+        if free:
+            slot = free[0]
+        else:
+            oldest = min([(self.seen[slot], other) for other, slot in self.ids.items()
+                          if other != GLOBAL])[1]
+            slot = self.ids.pop(oldest)
+        start = self.data_offset + slot * self.slot_size
+        self.map[start:start + self.slot_size] = '\0' * self.slot_size
+        self.ids[key] = slot
+        self.seen[slot] = int(now)
+        self.map[self.table_offset + slot * SLOT.size:self.table_offset + (slot + 1) * SLOT.size] = \
+            SLOT.pack(key, int(now))
+        return slot
+
+
+    def get_offset(self, slot, tier, bucket):
+        width, count = self.tiers[tier]
+        return self.data_offset + slot * self.slot_size + self.tier_offsets[tier] + \
+            (bucket / width) % count * RECORD.size
+
+
+    def add(self, id, downloaded, uploaded, now):
+        '''
+        Adds bytes transferred by the series `id` at `now` to each tier.
+        '''
+        slot = self.get_slot(id, now)
+        for tier, (width, count) in enumerate(self.tiers):
+            bucket = int(now) / width * width
+            offset = self.get_offset(slot, tier, bucket)
+            start, bucket_downloaded, bucket_uploaded = RECORD.unpack_from(self.map, offset)
+            if start != bucket:
+                # The ring came around, the record held a bucket `count` widths ago.
+                bucket_downloaded = bucket_uploaded = 0
+            self.map[offset:offset + RECORD.size] = RECORD.pack(bucket,
+                bucket_downloaded + downloaded, bucket_uploaded + uploaded)
+        self.seen[slot] = int(now)
+        offset = self.table_offset + slot * SLOT.size + SLOT.size - 4
+        self.map[offset:offset + 4] = struct.pack('<I', int(now))
+
+
+    def update(self, torrents, now=None):
+        '''
+        Records the bytes each torrent of a poll's snapshot transferred since the
+        previous poll, from its byte counters, at `now`. A torrent's first poll and
+        polls without counters, like summaries of daemons that do not list them,
+        only keep the last counters. A counter going back was reset by the daemon
+        and starts over from its new value. Torrents that transferred nothing are
+        left out.
+        '''
+        if not self.is_enabled():
+            return
+        if now is None:
+            now = time.time()
+
+        deltas = []
+        current = {}
+        for torrent in torrents:
+            id = torrent['id']
+            previous = self.counters.get(id)
+            if 'downloaded_bytes' not in torrent or 'uploaded_bytes' not in torrent:
+                if previous is not None:
+                    current[id] = previous
+                continue
+            counters = current[id] = (torrent['downloaded_bytes'], torrent['uploaded_bytes'])
+            if previous is None:
+                continue
+            downloaded, uploaded = counters[0] - previous[0], counters[1] - previous[1]
+            if downloaded < 0 or uploaded < 0:
+                continue
+            if downloaded or uploaded:
+                deltas.append((id, downloaded, uploaded))
+        self.counters = current
+        if not deltas:
+            return
+
+        self.lock.acquire()
+        try:
+            self.add(GLOBAL, sum([delta[1] for delta in deltas]), sum([delta[2] for delta in deltas]), now)
+            if self.slots > 1:
+                for id, downloaded, uploaded in deltas:
+                    self.add(id, downloaded, uploaded, now)
+            if now - self.flushed_at >= self.flush_interval:
+                self.map.flush()
+                self.flushed_at = now
+        finally:
+            self.lock.release()
+
+
+    def get_ids(self):
+        '''
+        Returns the keys of the series kept, GLOBAL among them. See `get_key`.
+        '''
+        return self.ids.keys()
+
+
+    def get_tier(self, start, now):
+        '''
+        Returns the finest tier that still holds the bucket of `start`.
+        '''
+        for tier, (width, count) in enumerate(self.tiers):
+            if start >= (int(now) / width - count + 1) * width:
+                return tier
+        return len(self.tiers) - 1
+
+
+    def iter_range(self, id=GLOBAL, start=None, end=None, tier=None):
+        '''
+        Yields the (bucket start, bytes downloaded, bytes uploaded) buckets of the
+        series `id` from `start` up to `end`, oldest first. By default they come from
+        the finest tier reaching back to `start`, which defaults to as far back as
+        the last tier goes. `end` defaults to now. Buckets without transfers are
+        left out.
+        '''
+        if not self.is_enabled() or get_key(id) not in self.ids:
+            return
+        now = time.time()
+        if end is None:
+            end = now
+        if start is None:
+            width, count = self.tiers[-1]
+            start = (int(now) / width - count + 1) * width
+        if tier is None:
+            tier = self.get_tier(start, now)
+        width, count = self.tiers[tier]
+        first = max(int(start) / width, int(now) / width - count + 1) * width
+        # Buckets starting before `end`, the one `end` falls in included.
+        for bucket in xrange(first, int(math.ceil(end)), width):
+            self.lock.acquire()
+            try:
+                slot = self.ids.get(get_key(id))
+                if slot is None:
+                    return
+                record = RECORD.unpack_from(self.map, self.get_offset(slot, tier, bucket))
+            finally:
+                self.lock.release()
+            if record[0] == bucket:
+                yield record
+
+
+    def get_summary(self, id=GLOBAL, start=None, end=None):
+        '''
+        Returns the transfers of the series `id` between `start` and `end`, see
+        `iter_range`, as a dict with the total bytes 'downloaded' and 'uploaded',
+        and the highest 'peak_download' and 'peak_upload' rates in bytes per second
+        at the resolution of the tier used.
+        '''
+        summary = {'downloaded': 0, 'uploaded': 0, 'peak_download': 0, 'peak_upload': 0}
+        if start is None:
+            tier = len(self.tiers) - 1
+        else:
+            tier = self.get_tier(start, time.time())
+        width = self.tiers[tier][0]
+        for bucket, downloaded, uploaded in self.iter_range(id, start, end, tier):
+            summary['downloaded'] += downloaded
+            summary['uploaded'] += uploaded
+            summary['peak_download'] = max(summary['peak_download'], downloaded / width)
+            summary['peak_upload'] = max(summary['peak_upload'], uploaded / width)
+        return summary
@@ -5,6 +5,10 @@ except ImportError:
     import json
 import urllib2
 import sys
+import base64
+from instrumentation import STATS
+from traffic import RECORDER
+from http_compression import ACCEPT_ENCODING, read_response
 
 
 class TransmissionClientFailure(Exception): pass
@@ -13,17 +17,19 @@ class TransmissionClient(object):
   
     rpcUrl = None
     headers = {}
+    timeout = None
 
 
-    def __init__( self, rpcUrl='http://localhost:9091'):
+    def __init__( self, rpcUrl='http://localhost:9091', timeout=None ):
         """ try to do a stupid call to transmission via rpc """
 
         try:
+            self.timeout = timeout
             self.rpcUrl = rpcUrl
             if not self.rpcUrl.endswith("/transmission/rpc"):
                 self.rpcUrl = '%s/transmission/rpc' % rpcUrl 
-            req = urllib2.Request( self.rpcUrl , {}, self.headers)
-            response = urllib2.urlopen(req)
+            req = urllib2.Request( self.rpcUrl , '{}', self.headers)
+            response = urllib2.urlopen(req, timeout=self.timeout)
             response = response.read()
             if not response.find("no method name"):
                 raise TransmissionClientFailure, "Make sure your transmission-daemon is running %s" % e             
@@ -31,7 +37,7 @@ class TransmissionClient(object):
         except urllib2.HTTPError, e:
             if e.code == 409:
                 self.headers['X-Transmission-Session-Id'] = e.info()['X-Transmission-Session-Id']
-                return self.__init__( self.rpcUrl )
+                return self.__init__( self.rpcUrl, self.timeout )
             else:
                 raise Exception('HTTPError: %s' % e.code )
         except Exception, e:
@@ -42,29 +48,48 @@ class TransmissionClient(object):
         """ generic rpc call to transmission """
         
         try:
-            params['ids'] = int(params['ids'])
+            if isinstance(params['ids'], (list, tuple)):
+                params['ids'] = [ id.isdigit() and int(id) or id for id in map(str, params['ids']) ]
+            else:
+                params['ids'] = int(params['ids'])
         except:
             pass
 
         data = { 'method': method, 'arguments': params}
         postdata = json.dumps(data)
+        started = STATS.start()
+        captured = RECORDER.start()
         try:
             req = urllib2.Request( self.rpcUrl , postdata, self.headers)
-            response = urllib2.urlopen(req)
-            return json.loads(response.read())
+            req.add_header('Accept-Encoding', ACCEPT_ENCODING)
+            response = urllib2.urlopen(req, timeout=self.timeout)
+            response, received = read_response(response, response.info().getheader('Content-Encoding'))
         except urllib2.HTTPError, e:
             if e.code == 409:
                 self.headers['X-Transmission-Session-Id'] = e.info()['X-Transmission-Session-Id']
+                RECORDER.record( captured, 'transmission', method, postdata, '', 409,
+                                 { 'X-Transmission-Session-Id': self.headers['X-Transmission-Session-Id'] } )
                 return self._rpc(method, params)
             else:
+                STATS.record( 'transmission', method, started, len(postdata), error=True )
                 raise Exception('HTTPError: %s' % e.code )
+        except:
+            STATS.record( 'transmission', method, started, len(postdata), error=True )
+            raise
+        STATS.record( 'transmission', method, started, len(postdata), received, decoded=len(response) )
+        RECORDER.record( captured, 'transmission', method, postdata, response )
+        return json.loads(response)
             
             
     def sessionStats( self ):
         return self._rpc( 'session-stats' )
+
+
+    def sessionSet( self, **arguments ):
+        return self._rpc( 'session-set', arguments )
     
 
-    def torrentGet( self, torrentIds=[], fields=[ 'id', 'name', 'totalSize', 'percentDone', 'rateDownload', 'rateUpload', 'files', 'status', 'peersConnected', 'peersSendingToUs', 'peersGettingFromUs', 'eta', 'uploadedEver', 'uploadRatio']):
+    def torrentGet( self, torrentIds=[], fields=[ 'id', 'name', 'totalSize', 'percentDone', 'rateDownload', 'rateUpload', 'files', 'status', 'peersConnected', 'peersSendingToUs', 'peersGettingFromUs', 'eta', 'leftUntilDone', 'downloadedEver', 'uploadedEver', 'uploadRatio', 'labels', 'trackers', 'hashString', 'bandwidthPriority']):
         if len(torrentIds) > 0:
             return self._rpc( 'torrent-get', { 'ids': torrentIds, 'fields': fields } ) 
         return self._rpc( 'torrent-get', { 'fields': fields } )
@@ -74,6 +99,11 @@ class TransmissionClient(object):
         return self._rpc( 'torrent-add', { 'filename': torrentFile, 'download-dir': downloadDir } )
 
 
+    def torrentAddMetainfo( self, metainfo, **arguments ):
+        arguments['metainfo'] = base64.b64encode(metainfo)
+        return self._rpc( 'torrent-add', arguments )
+
+
     def torrentRemove( self, torrents=None, files=False ):
         if files:
             if torrents:
@@ -86,6 +116,12 @@ class TransmissionClient(object):
             return self._rpc( 'torrent-remove', { } ) 
     
     
+    def torrentSet( self, torrents=None, **arguments ):
+        if torrents:
+            arguments['ids'] = torrents
+        return self._rpc( 'torrent-set', arguments )
+
+
     def torrentStart( self, torrents=None ):
         if torrents:
             return self._rpc( 'torrent-start', { 'ids': torrents } )
@@ -0,0 +1,270 @@
+import base64, posixpath
+from torrent_ui import TorrentUI, TorrentUIError
+from transmission_client import TransmissionClient
+
+
+class TransmissionUI(TorrentUI):
+    '''
+    TorrentUI subclass for the Transmission torrent client.
+    '''
+    # Values of the torrent-set bandwidthPriority argument.
+    priorities = {'low': -1, 'normal': 0, 'high': 1}
+    torrent_priorities = {-1: 'low', 0: 'normal', 1: 'high'}
+    
+    # File priorities as reported by torrent-get.
+    file_priorities = {-1: 'low', 0: 'normal', 1: 'high'}
+    
+    # Fields needed for `get_summary_snapshot`.
+    summary_fields = ['id', 'name', 'status', 'percentDone', 'rateDownload', 'rateUpload', 'hashString',
+                      'downloadedEver', 'uploadedEver']
+    
+    # Transmission counts a torrent as recently active for 60 seconds after its last
+    # activity, a 'recently-active' delta misses changes older than that.
+    delta_window = 50
+    
+    
+    def get_status_name(self, status):
+        if status == 4:
+            return 'Downloading'
+        elif status == 8:
+            return 'Seeding'
+        elif status == 16:
+            return 'Paused'
+        return 'Unknown'
+        
+        
+    def get_torrents(self):
+        feed_torrents = self.connection.torrentGet()['arguments']['torrents']
+        return [self.format_torrent(torrent_data) for torrent_data in feed_torrents]
+        
+        
+    def get_summary_snapshot(self):
+        feed_torrents = self.connection.torrentGet(fields=self.summary_fields)['arguments']['torrents']
+        torrents = []
+        rate_download = 0
+        rate_upload = 0
+        
+        for torrent_data in feed_torrents:
+            rate_download += torrent_data['rateDownload']
+            rate_upload += torrent_data['rateUpload']
+            torrent = self.format_summary(
+                str(torrent_data['id']),
+                str(torrent_data['name']),
+                self.get_status_name(torrent_data['status']),
+                torrent_data['percentDone']*100,
+                torrent_data['rateDownload'],
+                torrent_data['rateUpload'],
+                torrent_data['downloadedEver'],
+                torrent_data['uploadedEver']
+            )
+            torrent['info_hash'] = torrent_data['hashString']
+            torrents.append(torrent)
+            
+        return torrents, self.format_status(rate_download, rate_upload)
+        
+        
+    def get_delta_snapshot(self, torrents):
+        arguments = self.connection.torrentGet(torrentIds='recently-active')['arguments']
+        changed = dict([(str(torrent_data['id']), self.format_torrent(torrent_data))
+                        for torrent_data in arguments['torrents']])
+        removed = dict([(str(id), True) for id in arguments.get('removed', [])])
+        
+        merged = []
+        for torrent in torrents:
+            if torrent['id'] not in removed:
+                merged.append(changed.pop(torrent['id'], torrent))
+        merged.extend(changed.values())
+        
+        rate_download = 0
+        rate_upload = 0
+        for torrent in merged:
+            rate_download += torrent['rate_download_bytes']
+            rate_upload += torrent['rate_upload_bytes']
+        return merged, self.format_status(rate_download, rate_upload)
+        
+        
+    def get_details(self, ids):
+        feed_torrents = self.connection.torrentGet(torrentIds=list(ids))['arguments']['torrents']
+        return [self.format_torrent(torrent_data) for torrent_data in feed_torrents]
+        
+        
+    def format_torrent(self, torrent_data):
+        total_bytes_completed = 0
+        for payload in torrent_data['files']:
+            total_bytes_completed += payload['bytesCompleted']
+        
+        if torrent_data['percentDone']*100 == 100.0:
+            torrent_data['percentDone'] = 1
+        
+        return {
+            'id': str(torrent_data['id']),
+            'label': str(torrent_data['name']),
+            'status': self.get_status_name(torrent_data['status']),
+            'size_total': self.format_filesize(torrent_data['totalSize']),
+            'size_downloaded': self.format_filesize(total_bytes_completed),
+            'size_uploaded': self.format_filesize(torrent_data['uploadedEver']),
+            'percent_done': (torrent_data['percentDone']*100),
+            'estimated_time': self.format_time(torrent_data['eta']),
+            'peers_connected': torrent_data['peersConnected'],
+            'peers_incoming': torrent_data['peersSendingToUs'],
+            'peers_outgoing': torrent_data['peersGettingFromUs'],
+            'rate_download': self.format_filesize(torrent_data['rateDownload']),
+            'rate_upload': self.format_filesize(torrent_data['rateUpload']),
+            'rate_download_bytes': torrent_data['rateDownload'],
+            'rate_upload_bytes': torrent_data['rateUpload'],
+            'size_left_bytes': torrent_data['leftUntilDone'],
+            'ratio': str(torrent_data['uploadRatio']),
+            # Labels only exist since Transmission 3, older daemons leave them out.
+            'category': (torrent_data.get('labels') or [''])[0],
+            'tracker': self.get_tracker_host([tracker['announce'] for tracker in torrent_data['trackers']]),
+            'info_hash': torrent_data['hashString'],
+            'priority': self.torrent_priorities.get(torrent_data.get('bandwidthPriority', 0), 'normal'),
+            'downloaded_bytes': torrent_data['downloadedEver'],
+            'uploaded_bytes': torrent_data['uploadedEver']
+        }
+        
+        
+    def get_speed_arguments(self, download, upload, prefix):
+        # Transmission limits are in kB/s of 1000 bytes.
+        return {
+            prefix % 'down-enabled': download is not None,
+            prefix % 'down': int((download or 0) / 1000),
+            prefix % 'up-enabled': upload is not None,
+            prefix % 'up': int((upload or 0) / 1000)
+        }
+        
+        
+    def set_speed_limits(self, download=None, upload=None):
+        self.check_response(self.connection.sessionSet(
+            **self.get_speed_arguments(download, upload, 'speed-limit-%s')))
+        
+        
+    def set_torrent_speed_limits(self, limits):
+        # torrent-set applies one set of arguments, so it is one call per distinct
+        # pair of limits.
+        groups = {}
+        for id, (download, upload) in limits.items():
+            groups.setdefault((download, upload), []).append(id)
+        for (download, upload), ids in groups.items():
+            self.check_response(self.connection.torrentSet(torrents=ids,
+                downloadLimited=download is not None,
+                downloadLimit=int((download or 0) / 1000),
+                uploadLimited=upload is not None,
+                uploadLimit=int((upload or 0) / 1000)))
+        
+        
+    def get_files(self, id):
+        torrent_data = self.connection.torrentGet(torrentIds=[id],
+            fields=['files', 'priorities', 'wanted'])['arguments']['torrents'][0]
+        files = []
+        for index, payload in enumerate(torrent_data['files']):
+            priority = 'skip'
+            if torrent_data['wanted'][index]:
+                priority = self.file_priorities[torrent_data['priorities'][index]]
+            files.append(self.format_file(index, payload['name'], payload['length'],
+                                          payload['bytesCompleted'], priority))
+        return files
+        
+        
+    def get_file_progress(self, id, files):
+        torrent_data = self.connection.torrentGet(torrentIds=[id],
+            fields=['fileStats'])['arguments']['torrents'][0]
+        return [stats['bytesCompleted'] for stats in torrent_data['fileStats']]
+        
+        
+    def set_file_priorities(self, id, priorities):
+        arguments = {}
+        for index, priority in priorities.items():
+            if priority == 'skip':
+                arguments.setdefault('files-unwanted', []).append(index)
+            else:
+                arguments.setdefault('files-wanted', []).append(index)
+                arguments.setdefault('priority-%s' % priority, []).append(index)
+        self.check_response(self.connection.torrentSet(torrents=[id], **arguments))
+        
+        
+    def set_sequential(self, id, index, enabled=True):
+        # Sequential download exists since Transmission 4.1, older daemons ignore the
+        # argument and leave the field out of torrent-get.
+        self.check_response(self.connection.torrentSet(torrents=[id], sequential_download=enabled))
+        torrent_data = self.connection.torrentGet(torrentIds=[id],
+            fields=['sequential_download'])['arguments']['torrents'][0]
+        return bool(torrent_data.get('sequential_download'))
+        
+        
+    def get_file_pieces(self, id, index):
+        torrent_data = self.connection.torrentGet(torrentIds=[id],
+            fields=['pieces', 'pieceSize', 'files'])['arguments']['torrents'][0]
+        offset = sum([payload['length'] for payload in torrent_data['files'][:index]])
+        return (base64.b64decode(torrent_data['pieces']), torrent_data['pieceSize'],
+                offset, torrent_data['files'][index]['length'])
+        
+        
+    def get_file_path(self, id, index):
+        torrent_data = self.connection.torrentGet(torrentIds=[id],
+            fields=['downloadDir', 'files'])['arguments']['torrents'][0]
+        return posixpath.join(torrent_data['downloadDir'], torrent_data['files'][index]['name'])
+        
+        
+    def check_response(self, response):
+        '''
+        Raises TorrentUIError when Transmission did not accept a request.
+        '''
+        if response.get('result') != 'success':
+            raise TorrentUIError(response.get('result'))
+        return response
+        
+        
+    def start_torrent(self, id=False):
+        if id:
+            self.check_response(self.connection.torrentStart(torrents=id))
+        else:
+            self.check_response(self.connection.torrentStart())
+        
+        
+    def stop_torrent(self, id=False):
+        if id:
+            self.check_response(self.connection.torrentStop(torrents=id))
+        else:
+            self.check_response(self.connection.torrentStop())
+        
+        
+    def delete_torrent(self, id, files=False):
+        if id:
+            self.check_response(self.connection.torrentRemove(torrents=id, files=files))
+        else:
+            self.check_response(self.connection.torrentRemove(files=files))
+        
+        
+    def start_torrents(self, ids):
+        if ids:
+            self.check_response(self.connection.torrentStart(torrents=list(ids)))
+        
+        
+    def stop_torrents(self, ids):
+        if ids:
+            self.check_response(self.connection.torrentStop(torrents=list(ids)))
+        
+        
+    def delete_torrents(self, ids, files=False):
+        if ids:
+            self.check_response(self.connection.torrentRemove(torrents=list(ids), files=files))
+        
+        
+    def add_torrents(self, torrents):
+        # torrent-add takes one torrent per request.
+        for metainfo in torrents:
+            response = self.check_response(self.connection.torrentAddMetainfo(metainfo))
+            if 'torrent-duplicate' in response.get('arguments', {}):
+                print "Transmission already has %s" % response['arguments']['torrent-duplicate'].get('name')
+        
+        
+    def set_priority(self, ids, priority):
+        if ids:
+            self.check_response(self.connection.torrentSet(torrents=list(ids),
+                bandwidthPriority=self.priorities[priority]))
+        
+        
+    @classmethod
+    def connect(cls, url, username='', password='', **options):
+        return cls(TransmissionClient(url), **options)
@@ -19,6 +19,9 @@
 #	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
 
 import logging, sys, socket, simplejson
+from instrumentation import STATS
+from traffic import RECORDER, get_key
+from http_compression import ACCEPT_ENCODING, read_response
 from base64 import b64encode
 from httplib import *
 from urllib import quote
@@ -43,6 +46,16 @@ UT_TORRENT_STATE_FORCESTART		= 0x01
 UT_TORRENT_STATE_PAUSE      	= 0x02
 UT_TORRENT_STATE_STOP       	= 0x03
 
+#	torrent status bits, as reported in UT_TORRENT_PROP_STATE
+UT_STATE_STARTED				= 0x01
+UT_STATE_CHECKING				= 0x02
+UT_STATE_START_AFTER_CHECK		= 0x04
+UT_STATE_CHECKED				= 0x08
+UT_STATE_ERROR					= 0x10
+UT_STATE_PAUSED					= 0x20
+UT_STATE_QUEUED					= 0x40
+UT_STATE_LOADED					= 0x80
+
 #	individual torrent properties
 UT_TORRENT_DETAIL_HASH 			= 0
 UT_TORRENT_DETAIL_TRACKERS 		= 1
@@ -89,9 +102,10 @@ class uTorrent(HTTPConnection):
 	identity = None
 
 	#	will be happy as long as you feed it valid uTorrent WebUI details
-	def __init__(self, host='localhost', port='8080', username='default', password='default'):
+	#	timeout is in seconds and applies to every socket operation, None blocks
+	def __init__(self, host='localhost', port='8080', username='default', password='default', timeout=None):
 		try:
-			HTTPConnection.__init__(self, host, int(port))
+			HTTPConnection.__init__(self, host, int(port), timeout=timeout)
 			self.connect()
 		except socket.error, exception:
 			logging.critical(exception)
@@ -111,26 +125,51 @@ class uTorrent(HTTPConnection):
 	#	creates and fires off an HTTP request
 	#	all webui_ methods return a python object
 	def webui_action(self, selector, method=r'GET', headers=None, data=None):
-		self.putrequest(method, selector)
-		self.putheader('Authorization', 'Basic ' + self.webui_identity())
+		started = STATS.start()
+		captured = RECORDER.start()
+		if (started is not None):
+			action = r'list'
+			if (r'action=' in selector):
+				action = selector.split(r'action=', 1)[1].split(r'&', 1)[0]
+			sent = len(selector) + len(data or '')
+
+		try:
+			self.putrequest(method, selector)
+			self.putheader('Authorization', 'Basic ' + self.webui_identity())
+			self.putheader('Accept-Encoding', ACCEPT_ENCODING)
+
+			if (headers is not None):
+				for (name, value) in headers.items():
+					self.putheader(name, value)
 
-		if (headers is not None):
-  			for (name, value) in headers.items():
-  				self.putheader(name, value)
+			self.endheaders()
 
-		self.endheaders()
+			if (method == r'POST'):
+				self.send(str(data))
 
-		if (method == r'POST'):
-			self.send(str(data))                
-                
-		webui_response = self.getresponse()		
+			webui_response = self.getresponse()
+			webui_data, received = read_response(webui_response, webui_response.getheader('content-encoding'))
+		except:
+			if (started is not None):
+				STATS.record('utorrent', action, started, sent, error=True)
+			raise
 
 		if (webui_response.status == 401):
 			logging.error('401 Unauthorized Access')
+			if (captured is not None):
+				RECORDER.record(captured, 'utorrent', get_key('utorrent', selector, data), selector + (data or ''), webui_data, 401)
+			if (started is not None):
+				STATS.record('utorrent', action, started, sent, received, error=True, decoded=len(webui_data))
 
 			return None
 
-		return simplejson.loads(webui_response.read())
+		if (started is not None):
+			STATS.record('utorrent', action, started, sent, received, decoded=len(webui_data))
+
+		if (captured is not None):
+			RECORDER.record(captured, 'utorrent', get_key('utorrent', selector, data), selector + (data or ''), webui_data, webui_response.status)
+
+		return simplejson.loads(webui_data)
 
 	#	gets torrent properties
 	def webui_get_props(self, torrent_hash):
@@ -150,6 +189,24 @@ class uTorrent(HTTPConnection):
 
 		return self.webui_action(r'/gui/?action=setsetting&s=' + setting + r'&v=' + value)
 
+	#	sets several uTorrent settings in one request
+	#	settings is a list of (setting, value) pairs
+	def webui_set_many(self, settings):
+		selector = r'/gui/?action=setsetting'
+		for (setting, value) in settings:
+			selector += r'&s=' + quote(setting) + r'&v=' + quote(str(value))
+
+		return self.webui_action(selector)
+
+	#	sets torrent properties of several torrents in one request
+	#	props is a list of (torrent_hash, setting, value) tuples
+	def webui_set_props(self, props):
+		selector = r'/gui/?action=setprops'
+		for (torrent_hash, setting, value) in props:
+			selector += r'&hash=' + torrent_hash + r'&s=' + quote(setting) + r'&v=' + quote(str(value))
+
+		return self.webui_action(selector)
+
 	#	gets uTorrent settings
 	def webui_get(self):
 		return self.webui_action(r'/gui/?action=getsettings')['settings']
@@ -163,12 +220,6 @@ class uTorrent(HTTPConnection):
 
 	#	adds a torrent via POST
 	def webui_add_file(self, torrent_file):
-		CRLF 		= '\r\n'
-		method 		= r'POST'
-		boundary 	= r'---------------------------22385145923439'
-		headers 	= {r'Content-Type': r'multipart/form-data; boundary=' + boundary}
-		data		= ''
-
 		try:
 			torrent	= open(torrent_file, 'rb')
 			torrent	= torrent.read()
@@ -177,6 +228,16 @@ class uTorrent(HTTPConnection):
 
 			return None
 
+		return self.webui_add_data(torrent, torrent_file)
+
+	#	adds a torrent from the contents of a .torrent file via POST
+	def webui_add_data(self, torrent, torrent_file='upload.torrent'):
+		CRLF 		= '\r\n'
+		method 		= r'POST'
+		boundary 	= r'---------------------------22385145923439'
+		headers 	= {r'Content-Type': r'multipart/form-data; boundary=' + boundary}
+		data		= ''
+
 		data += "--%s%s" % (boundary, CRLF)
 		data += "Content-Disposition: form-data; name=\"torrent_file\"; filename=\"%s\"%s" % (torrent_file, CRLF)
 		data += "Content-Type: application/x-bittorrent%s" % CRLF
@@ -221,6 +282,17 @@ class uTorrent(HTTPConnection):
 	def webui_stop_torrent(self, torrent_hash):
 		return self.webui_action(r'/gui/?action=stop&hash=' + torrent_hash + r'&list=1')
 
+	#	runs an action (start, stop, pause, remove, ...) on a list of torrents
+	#	in a single request
+	def webui_action_hashes(self, action, torrent_hashes):
+		webui_cmd = r'/gui/?action=' + action
+
+		for torrent_hash in torrent_hashes:
+			webui_cmd += r'&hash='
+			webui_cmd += torrent_hash
+
+		return self.webui_action(webui_cmd)
+
 	#	set priority on a list of files
 	def webui_prio_file(self, torrent_hash, torrent_files, torrent_file_prio):
 		webui_cmd_prio = r'/gui/?action=setprio&hash='
@@ -0,0 +1,203 @@
+import urlparse
+from torrent_ui import TorrentUI, TorrentUIError
+from utorrent_client import uTorrent
+from utorrent_client import UT_TORRENT_PROP_HASH, UT_TORRENT_PROP_NAME, UT_TORRENT_PROP_LABEL, \
+    UT_TORRENT_PROP_STATE, UT_TORRENT_STAT_BYTES_SIZE, UT_TORRENT_STAT_BYTES_LEFT, \
+    UT_TORRENT_STAT_BYTES_RECV, UT_TORRENT_STAT_BYTES_SENT, UT_TORRENT_STAT_SPEED_UP, \
+    UT_TORRENT_STAT_SPEED_DOWN, UT_TORRENT_STAT_P1000_DONE, UT_TORRENT_STAT_ETA, UT_TORRENT_STAT_RATIO, \
+    UT_TORRENT_STAT_SEED_CONN, UT_TORRENT_STAT_PEER_CONN, UT_STATE_STARTED, \
+    UT_STATE_ERROR, UT_STATE_PAUSED, UT_FILE_PRIO_SKIP, UT_FILE_PRIO_LOW, \
+    UT_FILE_PRIO_NORMAL, UT_FILE_PRIO_HIGH
+
+
+class uTorrentUI(TorrentUI):
+    '''
+    TorrentUI subclass for the uTorrent client.
+    '''
+    # File priorities as reported by the WebUI getfiles action.
+    file_priorities = {0: 'skip', 1: 'low', 2: 'normal', 3: 'high'}
+    file_priority_values = {
+        'skip': UT_FILE_PRIO_SKIP,
+        'low': UT_FILE_PRIO_LOW,
+        'normal': UT_FILE_PRIO_NORMAL,
+        'high': UT_FILE_PRIO_HIGH
+    }
+    
+    
+    def __init__(self, connection, renderer=None, backend=False):
+        super(uTorrentUI, self).__init__(connection, renderer, backend)
+        # The WebUI only lists all torrents at once, the rows of the last listing
+        # are kept by hash so `get_details` does not fetch them again.
+        self.rows = {}
+        
+        
+    def get_status_name(self, state, progress):
+        if state & UT_STATE_ERROR:
+            return 'Unknown'
+        elif state & UT_STATE_PAUSED or not state & UT_STATE_STARTED:
+            return 'Paused'
+        elif progress == 1000:
+            return 'Seeding'
+        return 'Downloading'
+        
+        
+    def get_torrents(self):
+        return [self.format_torrent(torrent_data) for torrent_data in self.connection.webui_ls()]
+        
+        
+    def get_summary_snapshot(self):
+        self.rows = {}
+        torrents = []
+        rate_download = 0
+        rate_upload = 0
+        
+        for torrent_data in self.connection.webui_ls():
+            self.rows[torrent_data[UT_TORRENT_PROP_HASH]] = torrent_data
+            rate_download += torrent_data[UT_TORRENT_STAT_SPEED_DOWN]
+            rate_upload += torrent_data[UT_TORRENT_STAT_SPEED_UP]
+            torrents.append(self.format_summary(
+                str(torrent_data[UT_TORRENT_PROP_HASH]),
+                str(torrent_data[UT_TORRENT_PROP_NAME]),
+                self.get_status_name(torrent_data[UT_TORRENT_PROP_STATE],
+                                     torrent_data[UT_TORRENT_STAT_P1000_DONE]),
+                torrent_data[UT_TORRENT_STAT_P1000_DONE] / 10.0,
+                torrent_data[UT_TORRENT_STAT_SPEED_DOWN],
+                torrent_data[UT_TORRENT_STAT_SPEED_UP],
+                torrent_data[UT_TORRENT_STAT_BYTES_RECV],
+                torrent_data[UT_TORRENT_STAT_BYTES_SENT]
+            ))
+            
+        return torrents, self.format_status(rate_download, rate_upload)
+        
+        
+    def get_details(self, ids):
+        return [self.format_torrent(self.rows[id]) for id in ids if id in self.rows]
+        
+        
+    def format_torrent(self, torrent_data):
+        progress = torrent_data[UT_TORRENT_STAT_P1000_DONE]
+        total = torrent_data[UT_TORRENT_STAT_BYTES_SIZE]
+        completed = total - torrent_data[UT_TORRENT_STAT_BYTES_LEFT]
+        
+        estimated_time = ''
+        if torrent_data[UT_TORRENT_STAT_ETA] > 0:
+            estimated_time = self.format_time(torrent_data[UT_TORRENT_STAT_ETA])
+        
+        return {
+            'id': str(torrent_data[UT_TORRENT_PROP_HASH]),
+            'label': str(torrent_data[UT_TORRENT_PROP_NAME]),
+            'status': self.get_status_name(torrent_data[UT_TORRENT_PROP_STATE], progress),
+            'size_total': self.format_filesize(total),
+            'size_downloaded': self.format_filesize(completed),
+            'size_uploaded': self.format_filesize(torrent_data[UT_TORRENT_STAT_BYTES_SENT]),
+            'percent_done': progress / 10.0,
+            'estimated_time': estimated_time,
+            'peers_connected': torrent_data[UT_TORRENT_STAT_PEER_CONN] + torrent_data[UT_TORRENT_STAT_SEED_CONN],
+            'peers_incoming': torrent_data[UT_TORRENT_STAT_SEED_CONN],
+            'peers_outgoing': torrent_data[UT_TORRENT_STAT_PEER_CONN],
+            'rate_download': self.format_filesize(torrent_data[UT_TORRENT_STAT_SPEED_DOWN]),
+            'rate_upload': self.format_filesize(torrent_data[UT_TORRENT_STAT_SPEED_UP]),
+            'rate_download_bytes': torrent_data[UT_TORRENT_STAT_SPEED_DOWN],
+            'rate_upload_bytes': torrent_data[UT_TORRENT_STAT_SPEED_UP],
+            'size_left_bytes': torrent_data[UT_TORRENT_STAT_BYTES_LEFT],
+            'ratio': str(torrent_data[UT_TORRENT_STAT_RATIO] / 1000.0),
+            'category': torrent_data[UT_TORRENT_PROP_LABEL],
+            'downloaded_bytes': torrent_data[UT_TORRENT_STAT_BYTES_RECV],
+            'uploaded_bytes': torrent_data[UT_TORRENT_STAT_BYTES_SENT]
+        }
+        
+        
+    def action(self, action, ids):
+        '''
+        Runs a WebUI action on all `ids` in one request.
+        '''
+        if ids and self.connection.webui_action_hashes(action, ids) is None:
+            raise TorrentUIError("uTorrent rejected the %s action." % action)
+        
+        
+    def get_ids(self):
+        return [torrent[UT_TORRENT_PROP_HASH] for torrent in self.connection.webui_ls()]
+        
+        
+    def get_files(self, id):
+        files = []
+        for index, row in enumerate(self.connection.webui_ls_files(id)['files'][1]):
+            name, size, downloaded, priority = row[:4]
+            files.append(self.format_file(index, name, size, downloaded,
+                                          self.file_priorities.get(priority, 'normal')))
+        return files
+        
+        
+    def set_file_priorities(self, id, priorities):
+        # One request per distinct priority, each covering all its files.
+        indexes = {}
+        for index, priority in priorities.items():
+            indexes.setdefault(priority, []).append(str(index))
+        for priority, files in indexes.items():
+            if self.connection.webui_prio_file(id, files, self.file_priority_values[priority]) is None:
+                raise TorrentUIError("uTorrent rejected the file priorities.")
+        
+        
+    def start_torrent(self, id=False):
+        self.start_torrents(id and [id] or self.get_ids())
+        
+        
+    def stop_torrent(self, id=False):
+        self.stop_torrents(id and [id] or self.get_ids())
+        
+        
+    def delete_torrent(self, id, files=False):
+        self.delete_torrents(id and [id] or self.get_ids(), files)
+        
+        
+    def start_torrents(self, ids):
+        self.action('start', ids)
+        
+        
+    def stop_torrents(self, ids):
+        self.action('stop', ids)
+        
+        
+    def delete_torrents(self, ids, files=False):
+        self.action(files and 'removedata' or 'remove', ids)
+        
+        
+    def add_torrents(self, torrents):
+        # One upload per torrent, all over the WebUI's persistent connection.
+        for data in torrents:
+            if self.connection.webui_add_data(data) is None:
+                raise TorrentUIError("uTorrent rejected the torrent file.")
+        
+        
+    def set_priority(self, ids, priority):
+        # The WebUI has no per-torrent priority, the queue order is the closest
+        # thing to it.
+        if priority == 'high':
+            self.action('queuetop', ids)
+        elif priority == 'low':
+            self.action('queuebottom', ids)
+        
+        
+    def set_speed_limits(self, download=None, upload=None):
+        # The WebUI settings are in kB/s of 1024 bytes, 0 is unlimited.
+        if self.connection.webui_set_many([
+            ('max_dl_rate', int((download or 0) / 1024)),
+            ('max_ul_rate', int((upload or 0) / 1024))
+        ]) is None:
+            raise TorrentUIError("uTorrent rejected the speed limits.")
+        
+        
+    def set_torrent_speed_limits(self, limits):
+        # Torrent properties are in bytes per second, 0 is unlimited.
+        props = []
+        for id, (download, upload) in limits.items():
+            props.append((id, 'dlrate', download or 0))
+            props.append((id, 'ulrate', upload or 0))
+        if props and self.connection.webui_set_props(props) is None:
+            raise TorrentUIError("uTorrent rejected the torrent speed limits.")
+        
+        
+    @classmethod
+    def connect(cls, url, username='', password='', **options):
+        host, port = (urlparse.urlsplit(url)[1].split(':', 1) + ['8080'])[:2]
+        return cls(uTorrent(host, port, username or 'default', password or 'default'), **options)